@@ -84,6 +84,11 @@ def _register_views(app):
     from infiltrate.views.update_key import UpdateKeyView
     from infiltrate.views.faq import FaqView
     from infiltrate.views.raw_data import RawDataView
+    from infiltrate.views.stats_api import StatsAPI
+    from infiltrate.views.what_if import WhatIfView
+    from infiltrate.views.crafting_plan import CraftingPlanView
+    from infiltrate.views.reward_profile_view import RewardProfileView
+    from infiltrate.views.deck_search_weights import DeckSearchWeightsView
 
     CardsView.register(app)
     PurchasesView.register(app)
@@ -94,6 +99,11 @@ def _register_views(app):
     UpdateKeyView.register(app)
     FaqView.register(app)
     RawDataView.register(app)
+    StatsAPI.register(app)
+    WhatIfView.register(app)
+    CraftingPlanView.register(app)
+    RewardProfileView.register(app)
+    DeckSearchWeightsView.register(app)
 
     # Temporary dev page to see all routes
     @app.route("/site_map")
@@ -1,5 +1,7 @@
 """Selenium web scraping utilities"""
 import json
+import threading
+import time
 import typing as t
 import urllib.error
 import urllib.request
@@ -7,6 +9,8 @@ import urllib.request
 import bs4
 from mechanicalsoup import Browser
 
+URL_TIMEOUT_SECONDS = 30
+
 
 def get_texts_from_url_and_selector(url: str, selector: str) -> t.List[str]:
     """Get the texts of the elements found at the url and selector"""
@@ -43,8 +47,9 @@ def get_soup_from_url(url: str) -> bs4.BeautifulSoup:
     return response.soup
 
 
-def get_json_from_url(url: str):
-    """Returns the page at the given url as JSON"""
+def get_json_from_url(url: str, timeout: float = URL_TIMEOUT_SECONDS):
+    """Returns the page at the given url as JSON.
+    Raises an OSError if the page takes longer than timeout seconds to respond."""
     request = urllib.request.Request(
         url,
         data=None,
@@ -56,7 +61,7 @@ def get_json_from_url(url: str):
     )
 
     try:
-        page = urllib.request.urlopen(request)
+        page = urllib.request.urlopen(request, timeout=timeout)
         page_string = page.read().decode("utf-8")
         page_json = json.loads(page_string)
     except urllib.error.URLError:
@@ -66,3 +71,21 @@ def get_json_from_url(url: str):
     if page_json is None:
         raise ConnectionError(f"Got no content from {url}")
     return page_json
+
+
+class RateLimiter:
+    """Spaces out calls to wait, across threads, to at most the given rate."""
+
+    def __init__(self, calls_per_second: float):
+        self.interval = 1 / calls_per_second
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the next call is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
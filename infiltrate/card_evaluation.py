@@ -1,250 +1,479 @@
 """Contains Dataframe wrappers for additional analysis on card data.
 
 Class Dependencies:
-Play Counts (Weighted Deck Searches)
-Play Rates (Play Counts)
-Play Value (Play Rates, Collection Fit)
-Play Craft Efficiency (Play Value, Findability, Cost)
-Own Value (Play Value, Play Craft Efficiency)
+Base Values (Weighted Deck Searches, Findability, Cost)
+are shared by all users, and saved after each deck search update.
+Own Value (Base Values, Collection)
 
 Own Craft Efficiency (Own Value, Findability, Cost)
 Purchase Efficiency (Own Value, Cost)
 """
+import collections
+import concurrent.futures
+import hashlib
+import logging
 import typing as t
 
 import numpy as np
 import pandas as pd
 import werkzeug.local
+from boltons.cacheutils import LRU
 
 import infiltrate.card_frame_bases as card_frame_bases
-import infiltrate.df_types as df_types
-import infiltrate.models.card_set as card_set
+import infiltrate.card_value_table as card_value_table
+import infiltrate.models.card as card
+import infiltrate.models.card_base_value as card_base_value
 import infiltrate.models.deck_constants as deck_constants
+import infiltrate.models.deck_search as deck_search
+import infiltrate.models.rarity as rarities
+import infiltrate.pipeline_stats as pipeline_stats
 import infiltrate.rewards as rewards
-from infiltrate.models.deck_search import WeightedDeckSearch, get_weighted_deck_searches
-from infiltrate.models.rarity import Rarity
-from infiltrate.models.user import User, collection
+from infiltrate.models.user import User, collection, reward_profile
 
+# Collections are fetched in parallel when evaluating many users at once.
+MAX_CONCURRENT_COLLECTION_FETCHES = 8
 
-# TODO Important. Add card values to the database as a column on cards. Everyone has the
-#   same basic card values. Later mask with ownership to make individual.
 
+class BaseValueTable(card_value_table.CardValueTable):
+    """Has the values of each card copy which don't depend on the user,
+    so are the same for everyone:
+    -num_decks_with_count_or_less: the weighted number of decks in the deck searches
+    playing at least that many copies of the card,
+    -play_rate: the fraction of decks playing the card copy,
+    -play_value: how good it is to be able to play the card copy, on a scale of 0-100,
+    -craft_cost and sell_cost: the shiftstone to craft and from disenchanting it,
+    -findability: the chance of finding the card copy rather than crafting it,
+    -play_craft_efficiency: its play value divided by its craft cost,
+    scaled down by the findability.
 
-class PlayCountFrame(card_frame_bases.CardCopy):
-    """Has column play_count representing the number of decks containing
-     the weighted count of that card in decks of all deck searches"""
+    These are saved after each deck search update,
+    so that evaluating a user only needs to add their ownership.
+    Findability and craft efficiency are for the player_rewards they were made with,
+    the default rewards unless others are given."""
 
-    PLAY_COUNT_NAME = "num_decks_with_count_or_less"
+    VALUE_SCALE = 100
 
-    RARITY_NAME = "rarity"
-    IMAGE_URL_NAME = "image_url"
-    DETAILS_URL_NAME = "details_url"
-    IS_IN_DRAFT_PACK_NAME = "is_in_draft_pack"
+    PLAY_COUNT_NAME = "num_decks_with_count_or_less"
+    PLAY_RATE_NAME = "play_rate"
+    PLAY_VALUE_NAME = "play_value"
+    PLAY_CRAFT_EFFICIENCY_NAME = "play_craft_efficiency"
+    CRAFT_COST_NAME = "craft_cost"
+    FINDABILITY_NAME = "findability"
+    SELL_COST_NAME = "sell_cost"
 
-    def __init__(self, *args):
-        card_frame_bases.CardCopy.__init__(self, *args)
-        self.num_decks_with_count_or_less = self.num_decks_with_count_or_less
+    def __init__(
+        self, *args, player_rewards: t.Optional[rewards.PlayerRewards] = None,
+    ):
+        card_value_table.CardValueTable.__init__(self, *args)
+        self.player_rewards = player_rewards or rewards.DEFAULT_PLAYER_REWARD_RATE
+        self.craft_efficiency_ranking = CraftEfficiencyRanking(
+            self[self.PLAY_CRAFT_EFFICIENCY_NAME]
+        )
+        self._tables_by_player_rewards = LRU(max_size=100)
+
+    def for_player_rewards(
+        self, player_rewards: rewards.PlayerRewards
+    ) -> "BaseValueTable":
+        """Gets the values for a player finding cards at the given rates.
+
+        Values for rates other than this table's are calculated once for each
+        distinct rates and cached with these values, so users with the same rates
+        share them."""
+        content_key = player_rewards.content_key
+        if content_key == self.player_rewards.content_key:
+            return self
+
+        table = self._tables_by_player_rewards.get(content_key)
+        if table is None:
+            table = self.with_columns({})
+            self._add_play_craft_efficiency(
+                table, table[self.RARITY_CODE_NAME], player_rewards
+            )
+            table = BaseValueTable(
+                table.card_details,
+                table.card_index,
+                table._columns,
+                player_rewards=player_rewards,
+            )
+            self._tables_by_player_rewards[content_key] = table
+        return table
 
     @classmethod
-    def from_weighted_deck_searches(
+    def from_play_counts(
         cls,
-        weighted_deck_searches: t.List[WeightedDeckSearch],
-        card_details: card_frame_bases.CardDetails,
-    ):
-        """Build the dataframe from the list of weighted deck searches."""
-        play_count_dfs: t.List[pd.DataFrame] = []
-        for weighted_deck_search in weighted_deck_searches:
-            play_count_dfs.append(cls._get_count_df(weighted_deck_search))
-
-        play_count_dfs.append(PlayCountFrame._make_empty_base_frame(card_details))
-
-        index_keys = [cls.SET_NUM_NAME, cls.CARD_NUM_NAME]
-        combined_df = cls._sum_count_dfs(play_count_dfs).set_index(index_keys)
-
-        added_card_data_df = combined_df.join(card_details)
+        card_copies: card_value_table.CardValueTable,
+        play_counts: np.ndarray,
+        player_rewards: t.Optional[rewards.PlayerRewards] = None,
+    ) -> "BaseValueTable":
+        """Constructor deriving all user independent values from play counts
+        of the card copies, for the player rewards or else the default ones."""
+        player_rewards = player_rewards or rewards.DEFAULT_PLAYER_REWARD_RATE
+        table = card_copies.with_columns({cls.PLAY_COUNT_NAME: play_counts})
+
+        with pipeline_stats.stage("play_rate") as stage:
+            table[cls.PLAY_RATE_NAME] = (
+                play_counts
+                * deck_constants.AVG_COLLECTABLE_CARDS_IN_DECK
+                / play_counts.sum()
+            )
+            stage.rows = len(table)
+        with pipeline_stats.stage("play_value") as stage:
+            cls._add_play_value(table)
+            stage.rows = len(table)
+        with pipeline_stats.stage("play_craft_efficiency") as stage:
+            cls._add_costs_and_efficiency(table, player_rewards)
+            stage.rows = len(table)
+
+        return cls(
+            table.card_details,
+            table.card_index,
+            table._columns,
+            player_rewards=player_rewards,
+        )
 
-        return cls(added_card_data_df)
+    @classmethod
+    def _add_play_value(cls, table: card_value_table.CardValueTable):
+        """Adds the play value column, scaling the play counts to VALUE_SCALE."""
+        # todo account for collection fit.
+        play_counts = table[cls.PLAY_COUNT_NAME]
+        table[cls.PLAY_VALUE_NAME] = play_counts * cls.VALUE_SCALE / play_counts.max()
 
     @classmethod
-    def _make_empty_base_frame(cls, card_details):
-        base_frame_rows = []
-        for index, card in card_details.iterrows():
-            for copy_num in range(1, 5):
-                base_frame_rows.append(
-                    [0, card["set_num"], card["card_num"], copy_num, 0]
-                )
-        empty_base_frame = pd.DataFrame(
-            base_frame_rows,
-            columns=[
-                "decksearch_id",
-                "set_num",
-                "card_num",
-                "count_in_deck",
-                "num_decks_with_count_or_less",
-            ],
-        )
-        return empty_base_frame
+    def _add_costs_and_efficiency(
+        cls,
+        table: card_value_table.CardValueTable,
+        player_rewards: rewards.PlayerRewards,
+    ):
+        rarity_codes = table[cls.RARITY_CODE_NAME]
+        cls._add_play_craft_efficiency(table, rarity_codes, player_rewards)
+        table[cls.SELL_COST_NAME] = rarities.DISENCHANTS[rarity_codes]
 
     @classmethod
-    def _get_count_df(cls, weighted_deck_search: WeightedDeckSearch):
-        """Get a dataframe representing the number of times a card is seen in
-        decks in the deck search, times its weight."""
-        play_count_df = df_types.sqlalchemy_objects_to_df(
-            weighted_deck_search.deck_search.cards
+    def _add_play_craft_efficiency(
+        cls,
+        table: card_value_table.CardValueTable,
+        rarity_codes: np.ndarray,
+        player_rewards: t.Optional[rewards.PlayerRewards] = None,
+    ):
+        """Adds the craft cost, findability and craft efficiency columns."""
+        table[cls.CRAFT_COST_NAME] = rarities.ENCHANTS[rarity_codes]
+
+        table[cls.FINDABILITY_NAME] = cls.get_findability(
+            rarity_codes=rarity_codes,
+            set_num=table[cls.SET_NUM_NAME],
+            player_rewards=player_rewards,
         )
-        play_count_df.num_decks_with_count_or_less *= weighted_deck_search.weight
-        return play_count_df
 
-    @classmethod
-    def _sum_count_dfs(cls, play_count_dfs: t.List[pd.DataFrame]) -> pd.DataFrame:
-        combined = pd.concat(play_count_dfs).copy()
-        summed = (
-            combined.groupby(
-                [combined.set_num, combined.card_num, combined.count_in_deck]
-            )
-            .sum()
-            .reset_index()
+        table[cls.PLAY_CRAFT_EFFICIENCY_NAME] = cls.findability_scalar(
+            findability=table[cls.FINDABILITY_NAME],
+            craft_efficiency=table[cls.PLAY_VALUE_NAME] / table[cls.CRAFT_COST_NAME],
         )
-        return summed
 
+    @staticmethod
+    def get_findability(
+        rarity_codes: np.ndarray,
+        set_num,
+        player_rewards: t.Optional[rewards.PlayerRewards] = None,
+    ) -> np.ndarray:
+        """Get the chance that a player will find each given card.
+        Uses the default player rewards if none are given."""
+        player = player_rewards or rewards.DEFAULT_PLAYER_REWARD_RATE
+        findability = player.findability_table.get(
+            rarity_indices=rarity_codes, set_nums=np.asarray(set_num)
+        )
+        return findability
 
-class PlayRateFrame(PlayCountFrame):
-    """Has column play_rate representing the fraction of decks containing the card
- in relevant deck searches."""
+    @staticmethod
+    def findability_scalar(craft_efficiency, findability):
+        """Scales the craft efficiency based on the findability."""
+        return (1 - findability) * craft_efficiency
 
-    PLAY_RATE_NAME = "play_rate"
+    @classmethod
+    def from_weighted_play_counts(
+        cls,
+        weighted_play_counts: deck_search.WeightedPlayCounts,
+        card_details: card_frame_bases.CardDetails,
+    ) -> "BaseValueTable":
+        """Constructor performing the user independent part of the pipeline."""
+        with pipeline_stats.stage("play_count") as stage:
+            card_copies = card_value_table.CardValueTable.from_card_details(
+                card_details
+            )
+            positions = card_copies.get_positions(
+                weighted_play_counts.set_nums,
+                weighted_play_counts.card_nums,
+                weighted_play_counts.counts_in_deck,
+            )
+            play_counts = card_copies.sum_at_positions(
+                positions, weighted_play_counts.play_counts
+            )
+            stage.rows = len(card_copies)
 
-    def __init__(self, *args):
-        PlayCountFrame.__init__(self, *args)
-        self.play_rate = self.play_rate
+        return cls.from_play_counts(card_copies, play_counts)
 
     @classmethod
-    def from_play_counts(cls, play_count_frame: PlayCountFrame):
-        """Constructor deriving play rates from play counts"""
-        df = play_count_frame.copy()
-        total_card_inclusions = sum(df[cls.PLAY_COUNT_NAME])
-        df[cls.PLAY_RATE_NAME] = (
-            df[cls.PLAY_COUNT_NAME]
-            * deck_constants.AVG_COLLECTABLE_CARDS_IN_DECK
-            / total_card_inclusions
+    def from_db(
+        cls, version: int, card_details: card_frame_bases.CardDetails
+    ) -> "BaseValueTable":
+        """Constructor loading the saved values of the given version.
+        Cards without saved values, such as ones released since, get zero values
+        but still the costs of their rarity."""
+        card_copies = card_value_table.CardValueTable.from_card_details(card_details)
+        df = card_base_value.as_df(version)
+
+        positions = card_copies.get_positions(
+            df[cls.SET_NUM_NAME], df[cls.CARD_NUM_NAME], df[cls.COUNT_IN_DECK_NAME]
         )
-        return cls(df)
-
-
-class PlayValueFrame(PlayRateFrame):
-    """Has column play_value representing how good it is to be able to play that card,
-    on a scale of 0-100.
-    This is very similar to own value, but doesn't account for reselling."""
-
-    VALUE_SCALE = 100
-
-    PLAY_VALUE_NAME = "play_value"
-    IS_OWNED_NAME = "is_owned"
-    _metadata = ["user"]
-
-    def __init__(self, user: User, *args):
-        PlayRateFrame.__init__(self, *args)
-        self.user = user
-        self.play_value = self.play_value
+        is_found = positions >= 0
+        columns = {}
+        for name in card_base_value.VALUE_COLUMNS:
+            values = np.zeros(len(card_copies))
+            values[positions[is_found]] = df[name].to_numpy()[is_found]
+            columns[name] = values
+
+        table = card_copies.with_columns(columns)
+        table[cls.CRAFT_COST_NAME] = rarities.ENCHANTS[table[cls.RARITY_CODE_NAME]]
+        table[cls.SELL_COST_NAME] = rarities.DISENCHANTS[table[cls.RARITY_CODE_NAME]]
+        return cls(table.card_details, table.card_index, table._columns)
 
-    def __hash__(self):
-        return hash(self.user)
+    @classmethod
+    def get_latest(cls, card_details: card_frame_bases.CardDetails):
+        """Gets the most recently saved base values, cached until a newer version
+        is saved or the cards are updated.
+
+        If values were never saved, they are calculated instead."""
+        version = card_base_value.get_latest_version()
+        cache_key = (version, card.get_cards_version())
+        base_values = _base_values_cache.get(cache_key)
+        if base_values is None:
+            if version is None:
+                with pipeline_stats.stage("deck_search_load") as stage:
+                    weighted_play_counts = deck_search.get_weighted_play_counts()
+                    stage.rows = len(weighted_play_counts.play_counts)
+                base_values = cls.from_weighted_play_counts(
+                    weighted_play_counts, card_details
+                )
+            else:
+                with pipeline_stats.stage("base_values_load") as stage:
+                    base_values = cls.from_db(version, card_details)
+                    stage.rows = len(base_values)
+            _base_values_cache.clear()
+            _base_values_cache[cache_key] = base_values
+        return base_values
 
     @classmethod
-    def from_play_rates(
-        cls, user: User, play_rate_frame: PlayRateFrame, ownership: pd.DataFrame,
+    def get_for_user(
+        cls, user: User, card_details: card_frame_bases.CardDetails
+    ) -> "BaseValueTable":
+        """Gets the base values for the user's own deck search weights and reward
+        rates, if they have them."""
+        weights = deck_search.get_weights_for_user(user)
+        if weights is None:
+            base_values = cls.get_latest(card_details)
+        else:
+            deck_search_vectors = DeckSearchVectors.get_latest(card_details)
+            base_values = deck_search_vectors.get_base_values(weights)
+
+        player_rewards = reward_profile.get_player_rewards(user)
+        return base_values.for_player_rewards(player_rewards)
+
+    def save_to_db(self) -> int:
+        """Saves the values as the newest version."""
+        df = self.to_dataframe(include_details=False).reset_index(drop=True)
+        return card_base_value.save(df)
+
+
+_base_values_cache: t.Dict[t.Tuple[t.Optional[int], int], BaseValueTable] = {}
+
+
+class DeckSearchVectors:
+    """The play counts of each deck search, as columns over a fixed ordering of
+    card copies.
+
+    The play counts of any weighting of the deck searches are then a weighted sum
+    of these columns, so users' own weights don't need their own aggregation."""
+
+    def __init__(
+        self,
+        card_copies: card_value_table.CardValueTable,
+        deck_search_ids: t.List[int],
+        play_counts: np.ndarray,
     ):
-        """Constructor deriving values from play rates."""
-        # todo account for collection fit.
-        df: pd.DataFrame = play_rate_frame.copy()
-        df[cls.PLAY_VALUE_NAME] = (
-            df["num_decks_with_count_or_less"]
-            * cls.VALUE_SCALE
-            / df["num_decks_with_count_or_less"].max()
-        )
+        self.card_copies = card_copies
+        self.deck_search_ids = deck_search_ids
+        self.play_counts = play_counts
 
-        ownership_frame = collection.create_is_owned_series(play_rate_frame, ownership)
+        self._base_values_by_weights = LRU(max_size=100)
 
-        df = df.join(
-            ownership_frame.drop(
-                [cls.SET_NUM_NAME, cls.CARD_NUM_NAME, cls.COUNT_IN_DECK_NAME], axis=1
+    @classmethod
+    def from_db(cls, card_details: card_frame_bases.CardDetails) -> "DeckSearchVectors":
+        """Constructor loading every deck search's play counts."""
+        card_copies = card_value_table.CardValueTable.from_card_details(card_details)
+        play_counts_by_deck_search = deck_search.get_play_counts_by_deck_search()
+
+        deck_search_ids = sorted(play_counts_by_deck_search.keys())
+        play_counts = np.zeros((len(card_copies), len(deck_search_ids)))
+        for column, deck_search_id in enumerate(deck_search_ids):
+            search_play_counts = play_counts_by_deck_search[deck_search_id]
+            positions = card_copies.get_positions(
+                search_play_counts.set_nums,
+                search_play_counts.card_nums,
+                search_play_counts.counts_in_deck,
             )
-        )
-
-        return cls(user, df)
-
-
-class PlayCraftEfficiencyFrame(PlayValueFrame):
-    """Has columns craft_cost and play_craft_efficiency representing the card's
-    shiftstone cost to craft, and its play value divided by that cost.
-    This is very similar to own crafting efficiency, but doesn't account for reselling.
-    """
-
-    PLAY_CRAFT_EFFICIENCY_NAME = "play_craft_efficiency"
-    CRAFT_COST_NAME = "craft_cost"
-    FINDABILITY_NAME = "findability"
-
-    def __init__(self, user: User, *args):
-        PlayValueFrame.__init__(self, user, *args)
-
-        self.play_craft_efficiency = self.play_craft_efficiency
+            play_counts[:, column] = card_copies.sum_at_positions(
+                positions, search_play_counts.play_counts
+            )
+        return cls(card_copies, deck_search_ids, play_counts)
 
     @classmethod
-    def from_play_value(cls, play_value_frame: PlayValueFrame):
-        """Constructor for getting play craft efficiency from play value and cost."""
-        df: pd.DataFrame = play_value_frame.copy()
-
-        df[cls.CRAFT_COST_NAME] = df[cls.RARITY_NAME].apply(
-            lambda rarity: rarity.enchant
-        )
-
-        df[cls.FINDABILITY_NAME] = cls.get_findability(
-            rarity=df[cls.RARITY_NAME], set_num=df[cls.SET_NUM_NAME]
-        )
-
-        df[cls.PLAY_CRAFT_EFFICIENCY_NAME] = cls.findability_scalar(
-            findability=df[cls.FINDABILITY_NAME],
-            craft_efficiency=df[cls.PLAY_VALUE_NAME] / df[cls.CRAFT_COST_NAME],
-        )
-
-        return cls(play_value_frame.user, df)
-
-    @staticmethod
-    @np.vectorize
-    def get_findability(rarity: Rarity, set_num: int):
-        """Get the chance that a player will find the given card."""
-        # todo cost could be calculated once per card rather than once per count
-        # TODO allow custom player profiles to override this.
-        player: rewards.PlayerRewards = rewards.DEFAULT_PLAYER_REWARD_RATE
-        findability = player.get_chance_of_specific_card_drop_in_a_week(
-            rarity=rarity, card_set=card_set.CardSet(set_num)
+    def get_latest(
+        cls, card_details: card_frame_bases.CardDetails
+    ) -> "DeckSearchVectors":
+        """Gets the vectors for the current deck searches, cached until the base
+        values are next saved, which happens after each deck search update,
+        or the cards are updated."""
+        version = card_base_value.get_latest_version()
+        cache_key = (version, card.get_cards_version())
+        deck_search_vectors = _deck_search_vectors_cache.get(cache_key)
+        if deck_search_vectors is None:
+            with pipeline_stats.stage("deck_search_load") as stage:
+                deck_search_vectors = cls.from_db(card_details)
+                stage.rows = deck_search_vectors.play_counts.size
+            _deck_search_vectors_cache.clear()
+            _deck_search_vectors_cache[cache_key] = deck_search_vectors
+        return deck_search_vectors
+
+    def get_base_values(self, weights: t.Dict[int, float]) -> BaseValueTable:
+        """Gets the base values for the given weight of each deck search,
+        by deck search id. Cached for each distinct weights."""
+        weights_key = tuple(
+            sorted(
+                (deck_search_id, float(weight))
+                for deck_search_id, weight in weights.items()
+            )
         )
-        return findability
-
-    @staticmethod
-    @np.vectorize
-    def findability_scalar(craft_efficiency: float, findability: float):
-        """Scales the craft efficiency based on the findability."""
-        return (1 - findability) * craft_efficiency
-
-
-class OwnValueFrame(PlayCraftEfficiencyFrame):
-    """Has columns
-    -sell_cost: the amount of shiftstone from disenchanting,
+        base_values = self._base_values_by_weights.get(weights_key)
+        if base_values is None:
+            weight_vector = np.array(
+                [
+                    weights.get(deck_search_id, 0.0)
+                    for deck_search_id in self.deck_search_ids
+                ]
+            )
+            base_values = BaseValueTable.from_play_counts(
+                self.card_copies, self.play_counts @ weight_vector
+            )
+            self._base_values_by_weights[weights_key] = base_values
+        return base_values
+
+
+_deck_search_vectors_cache: t.Dict[
+    t.Tuple[t.Optional[int], int], DeckSearchVectors
+] = {}
+
+
+def update_base_values():
+    """Recalculates and saves the base values from the current deck searches."""
+    import infiltrate.global_data as global_data
+
+    base_values = BaseValueTable.from_weighted_play_counts(
+        deck_search.get_weighted_play_counts(), global_data.all_cards
+    )
+    version = base_values.save_to_db()
+    logging.info(f"Saved card base values version {version}")
+
+
+class CraftEfficiencyRanking:
+    """The rows of a frame ordered from highest to lowest play craft efficiency.
+
+    Efficiency doesn't depend on the user, so one ranking serves every user of the
+    same base values. Finding the best unowned options then only looks at the top
+    of the ranking, past any owned copies, rather than sorting the whole frame."""
+
+    def __init__(self, efficiencies: np.ndarray):
+        self.order = np.argsort(-efficiencies, kind="stable")
+        self.sorted_efficiencies = efficiencies[self.order]
+
+    def get_top_unowned(self, is_owned: np.ndarray, num_options: int) -> np.ndarray:
+        """Gets the highest num_options efficiencies of rows that aren't owned."""
+        top_unowned = []
+        num_found = 0
+        start = 0
+        chunk_size = max(2 * num_options, 1)
+        while num_found < num_options and start < len(self.order):
+            stop = start + chunk_size
+            is_chunk_owned = is_owned[self.order[start:stop]]
+            unowned = self.sorted_efficiencies[start:stop][~is_chunk_owned]
+            unowned = unowned[~np.isnan(unowned)][: num_options - num_found]
+
+            top_unowned.append(unowned)
+            num_found += len(unowned)
+            start = stop
+            chunk_size *= 2
+
+        if not top_unowned:
+            return np.array([])
+        return np.concatenate(top_unowned)
+
+    def get_top_unowned_sums(
+        self, is_owned: np.ndarray, num_options: int
+    ) -> np.ndarray:
+        """Gets the sum of the highest num_options efficiencies of rows that aren't
+        owned, for each column of a (rows x users) ownership matrix."""
+        num_users = is_owned.shape[1]
+        sums = np.zeros(num_users)
+        num_found = np.zeros(num_users, dtype=int)
+        start = 0
+        chunk_size = max(2 * num_options, 1)
+        while (num_found < num_options).any() and start < len(self.order):
+            stop = start + chunk_size
+            efficiencies = self.sorted_efficiencies[start:stop]
+            is_option = ~is_owned[self.order[start:stop]]
+            is_option &= ~np.isnan(efficiencies)[:, np.newaxis]
+
+            option_rank = num_found + np.cumsum(is_option, axis=0)
+            is_top = is_option & (option_rank <= num_options)
+            sums += np.where(is_top, efficiencies[:, np.newaxis], 0).sum(axis=0)
+
+            num_found = np.minimum(option_rank[-1], num_options)
+            start = stop
+            chunk_size *= 2
+
+        return sums
+
+
+class OwnValueFrame(card_frame_bases.CardCopy):
+    """Has the columns of BaseValueTable and the card details, along with columns
+    depending on the user's collection
+    -is_owned: if the user owns at least that many copies of the card,
     -resell_value: the amount of expected value the shiftstone from disenchanting has,
-    -own_value: the value of owning a card, including the possibility of reselling it.
+    -own_value: the value of owning a card, including the possibility of reselling it,
+    -num_owned: the number of copies of the card owned, which may be more than 4.
     """
 
-    SELL_COST_NAME = "sell_cost"
+    PLAY_VALUE_NAME = BaseValueTable.PLAY_VALUE_NAME
+    PLAY_CRAFT_EFFICIENCY_NAME = BaseValueTable.PLAY_CRAFT_EFFICIENCY_NAME
+    CRAFT_COST_NAME = BaseValueTable.CRAFT_COST_NAME
+    IS_OWNED_NAME = "is_owned"
+    SELL_COST_NAME = BaseValueTable.SELL_COST_NAME
     RESELL_VALUE_NAME = "resell_value"
     OWN_VALUE_NAME = "own_value"
+    NUM_OWNED_NAME = "num_owned"
+
+    _metadata = ["user", "craft_efficiency_ranking"]
 
     def __init__(self, user: User, *args):
         if not (isinstance(user, User) or isinstance(user, werkzeug.local.LocalProxy)):
             raise ValueError("Must be given user parameter of type User")
 
-        PlayCraftEfficiencyFrame.__init__(self, user, *args)
+        card_frame_bases.CardCopy.__init__(self, *args)
+        self.user = user
+
+        # Only valid while rows are in the same order as the ranked base values.
+        self.craft_efficiency_ranking: t.Optional[CraftEfficiencyRanking] = None
 
+        self.play_value = self.play_value
+        self.play_craft_efficiency = self.play_craft_efficiency
         self.sell_cost = self.sell_cost
         self.resell_value = self.resell_value
         self.own_value = self.own_value
@@ -261,60 +490,253 @@ class OwnValueFrame(PlayCraftEfficiencyFrame):
         return copy
 
     @classmethod
-    def from_play_craft_efficiency(
-        cls, play_craft_efficiency: PlayCraftEfficiencyFrame, num_options_considered=20
+    def from_base_values(
+        cls,
+        user: User,
+        base_values: BaseValueTable,
+        ownership: pd.DataFrame,
+        num_options_considered=20,
     ):
-        """Constructs the own_value """
-
-        df = play_craft_efficiency.copy()
-        df[cls.SELL_COST_NAME] = df[cls.RARITY_NAME].apply(
-            lambda rarity: rarity.disenchant
-        )
+        """Constructs the own_value by adding the user's ownership
+        to the shared base values."""
+        with pipeline_stats.stage("shiftstone") as stage:
+            own_values = OwnValueMatrix.from_ownerships(
+                base_values, [ownership], num_options_considered
+            )
+            stage.rows = len(base_values)
+        with pipeline_stats.stage("own_value_frame") as stage:
+            own_value = own_values.get_own_value_frame(user, 0)
+            stage.rows = len(own_value)
+        return own_value
 
+    @classmethod
+    def _add_own_value(
+        cls,
+        df: t.Union[pd.DataFrame, card_value_table.CardValueTable],
+        num_options_considered=20,
+        craft_efficiency_ranking: t.Optional[CraftEfficiencyRanking] = None,
+    ):
+        """Adds the resell value and own value columns, which depend on ownership
+        through the value of shiftstone."""
         value_of_shiftstone = cls._value_of_shiftstone(
-            play_craft_efficiency, num_options_considered
+            df, num_options_considered, craft_efficiency_ranking
         )
 
         df[cls.RESELL_VALUE_NAME] = df[cls.SELL_COST_NAME] * value_of_shiftstone
 
-        df[cls.OWN_VALUE_NAME] = df[[cls.PLAY_VALUE_NAME, cls.RESELL_VALUE_NAME]].max(
-            axis=1
+        # fmax ignores missing values, like taking the max across columns.
+        df[cls.OWN_VALUE_NAME] = np.fmax(
+            np.asarray(df[cls.PLAY_VALUE_NAME]), np.asarray(df[cls.RESELL_VALUE_NAME])
         )
 
-        return cls(play_craft_efficiency.user, df)
+    def apply_collection_delta(
+        self, delta: t.Dict[card.CardId, int], num_options_considered=20
+    ):
+        """Updates the frame in place for a change in the user's collection,
+        without repeating the rest of the pipeline.
+
+        The delta maps card ids to the change in the number of copies owned.
+        Only the rows of those cards have their ownership changed,
+        then the values depending on ownership are re-derived."""
+        if not delta:
+            return
+
+        card_ids = self.index.droplevel(self.COUNT_IN_DECK_NAME)
+        is_affected = card_ids.isin(list(delta.keys()))
+        affected = self.loc[is_affected, [self.NUM_OWNED_NAME]]
+
+        affected_ids = affected.index.droplevel(self.COUNT_IN_DECK_NAME)
+        changes = np.array([delta[card_id] for card_id in affected_ids])
+        new_counts = np.maximum(affected[self.NUM_OWNED_NAME].to_numpy() + changes, 0)
+
+        counts_in_deck = affected.index.get_level_values(self.COUNT_IN_DECK_NAME)
+        self.loc[is_affected, self.NUM_OWNED_NAME] = new_counts
+        self.loc[is_affected, self.IS_OWNED_NAME] = counts_in_deck <= new_counts
+        self._reward_value_index = None
+
+        self._add_own_value(self, num_options_considered, self.craft_efficiency_ranking)
+
+    def get_collection_hash(self) -> str:
+        """A hash of which card copies are owned, which changes with the collection."""
+        is_owned = np.asarray(self[self.IS_OWNED_NAME], dtype=bool)
+        return hashlib.sha1(np.packbits(is_owned).tobytes()).hexdigest()
+
+    def evaluate_collection_deltas(
+        self, deltas: t.List[t.Dict[card.CardId, int]], num_options_considered=20
+    ) -> "OwnValueMatrix":
+        """Evaluates hypothetical changes to the user's collection, such as crafting
+        some cards or opening a pack, all together and without changing the frame.
+
+        Each delta maps card ids to the change in the number of copies owned,
+        and becomes a column of the returned matrix, over the rows of this frame."""
+        if self.craft_efficiency_ranking is None:
+            self.craft_efficiency_ranking = CraftEfficiencyRanking(
+                np.asarray(self[self.PLAY_CRAFT_EFFICIENCY_NAME])
+            )
+
+        card_ids = self.index.droplevel(self.COUNT_IN_DECK_NAME)
+        card_codes, unique_card_ids = card_ids.factorize()
+        owned_counts = np.asarray(self[self.NUM_OWNED_NAME])
+
+        changes = np.zeros((len(unique_card_ids), len(deltas)))
+        for column, delta in enumerate(deltas):
+            if not delta:
+                continue
+            card_positions = unique_card_ids.get_indexer(list(delta.keys()))
+            is_found = card_positions >= 0
+            np.add.at(
+                changes[:, column],
+                card_positions[is_found],
+                np.array(list(delta.values()))[is_found],
+            )
+
+        new_counts = np.maximum(owned_counts[:, np.newaxis] + changes[card_codes], 0)
+        return OwnValueMatrix(self, new_counts, num_options_considered)
 
     @classmethod
     def from_user(cls, user: User, card_details: card_frame_bases.CardDetails):
-        """Creates from a user, performing the entire pipeline."""
-        weighted_deck_searches = get_weighted_deck_searches()
-        play_count = PlayCountFrame.from_weighted_deck_searches(
-            weighted_deck_searches=weighted_deck_searches, card_details=card_details
-        )
+        """Creates from a user, adding their ownership to the shared base values."""
+        with pipeline_stats.stage("from_user") as stage:
+            with pipeline_stats.stage("base_values"):
+                base_values = BaseValueTable.get_for_user(user, card_details)
 
-        play_rate = PlayRateFrame.from_play_counts(play_count)
+            with pipeline_stats.stage("collection_fetch") as fetch_stage:
+                ownership = collection.dataframe_for_user(user)
+                fetch_stage.rows = len(ownership)
 
-        ownership = collection.dataframe_for_user(user)
-        play_value = PlayValueFrame.from_play_rates(
-            user=user, play_rate_frame=play_rate, ownership=ownership
-        )
-        play_craft_efficiency = PlayCraftEfficiencyFrame.from_play_value(play_value)
-        own_value = cls.from_play_craft_efficiency(play_craft_efficiency)
+            own_value = cls.from_base_values(
+                user=user, base_values=base_values, ownership=ownership
+            )
+            stage.rows = len(own_value)
         return own_value
 
     @classmethod
     def _value_of_shiftstone(
-        cls, play_craft_efficiency: PlayCraftEfficiencyFrame, num_options_considered=20
+        cls,
+        play_craft_efficiency: t.Union[pd.DataFrame, card_value_table.CardValueTable],
+        num_options_considered=20,
+        craft_efficiency_ranking: t.Optional[CraftEfficiencyRanking] = None,
     ):
         """Gets the top num_options crafting efficiencies and averages them to predict
         how much value the user will get from crafting."""
-        efficiencies = play_craft_efficiency.query(
-            f"{cls.IS_OWNED_NAME} == False"
-        ).sort_values(cls.PLAY_CRAFT_EFFICIENCY_NAME, ascending=False)
-
-        top_efficiencies = efficiencies.head(num_options_considered)
-        avg_top_efficiency = (
-            sum(top_efficiencies[cls.PLAY_CRAFT_EFFICIENCY_NAME])
-            / num_options_considered
-        )
+        is_owned = np.asarray(play_craft_efficiency[cls.IS_OWNED_NAME], dtype=bool)
 
+        if craft_efficiency_ranking is not None:
+            top_efficiencies = craft_efficiency_ranking.get_top_unowned(
+                is_owned, num_options_considered
+            )
+        else:
+            efficiencies = play_craft_efficiency[cls.PLAY_CRAFT_EFFICIENCY_NAME]
+            efficiencies = np.asarray(efficiencies)[~is_owned]
+            efficiencies = efficiencies[~np.isnan(efficiencies)]
+            if len(efficiencies) > num_options_considered:
+                # Partial selection, as only the top values are needed, not their order
+                efficiencies = np.partition(efficiencies, -num_options_considered)
+            top_efficiencies = efficiencies[-num_options_considered:]
+
+        avg_top_efficiency = sum(top_efficiencies) / num_options_considered
         return avg_top_efficiency
+
+
+class OwnValueMatrix:
+    """The ownership dependent columns of OwnValueFrame for many users at once,
+    each held as a (card copies x users) matrix over the base values' rows.
+
+    The user independent values are shared, so evaluating a batch of users is a
+    few matrix operations rather than a pipeline per user.
+    The columns may also be hypothetical collections of one user."""
+
+    def __init__(
+        self,
+        base_values: t.Union[BaseValueTable, OwnValueFrame],
+        num_owned: np.ndarray,
+        num_options_considered=20,
+    ):
+        """num_owned is the number of copies of each row's card owned in each column."""
+        self.base_values = base_values
+        self.num_owned = num_owned
+
+        counts_in_deck = np.asarray(base_values[base_values.COUNT_IN_DECK_NAME])
+        self.is_owned = counts_in_deck[:, np.newaxis] <= num_owned
+
+        top_efficiency_sums = base_values.craft_efficiency_ranking.get_top_unowned_sums(
+            self.is_owned, num_options_considered
+        )
+        self.value_of_shiftstone = top_efficiency_sums / num_options_considered
+
+        sell_cost = np.asarray(base_values[OwnValueFrame.SELL_COST_NAME])
+        self.resell_value = np.outer(sell_cost, self.value_of_shiftstone)
+
+        play_value = np.asarray(base_values[OwnValueFrame.PLAY_VALUE_NAME])
+        self.own_value = np.fmax(play_value[:, np.newaxis], self.resell_value)
+
+    @classmethod
+    def from_ownerships(
+        cls,
+        base_values: BaseValueTable,
+        ownerships: t.List[pd.DataFrame],
+        num_options_considered=20,
+    ) -> "OwnValueMatrix":
+        """Constructor from each user's ownership, as from
+        collection.dataframe_for_user."""
+        owned_counts = np.zeros((len(base_values.card_index), len(ownerships)))
+        for column, ownership in enumerate(ownerships):
+            card_positions = base_values.get_card_positions(
+                ownership["set_num"], ownership["card_num"]
+            )
+            is_found = card_positions >= 0
+            owned_counts[card_positions[is_found], column] = ownership[
+                "count"
+            ].to_numpy()[is_found]
+
+        num_owned = np.repeat(owned_counts, base_values.COPIES_PER_CARD, axis=0)
+        return cls(base_values, num_owned, num_options_considered)
+
+    @classmethod
+    def from_users(
+        cls, users: t.List[User], card_details: card_frame_bases.CardDetails
+    ) -> t.List[t.Tuple["OwnValueMatrix", int]]:
+        """Evaluates many users at once, together for the users who share base values
+        by having the same deck search weights and reward rates.
+
+        Gets the matrix and column of each user."""
+        with pipeline_stats.stage("collection_fetch") as stage:
+            with concurrent.futures.ThreadPoolExecutor(
+                MAX_CONCURRENT_COLLECTION_FETCHES
+            ) as executor:
+                ownerships = list(executor.map(collection.dataframe_for_user, users))
+            stage.rows = sum(len(ownership) for ownership in ownerships)
+
+        base_values_by_id = {}
+        positions_by_base_values_id = collections.defaultdict(list)
+        for position, user in enumerate(users):
+            base_values = BaseValueTable.get_for_user(user, card_details)
+            base_values_by_id[id(base_values)] = base_values
+            positions_by_base_values_id[id(base_values)].append(position)
+
+        columns_by_position = {}
+        for base_values_id, positions in positions_by_base_values_id.items():
+            with pipeline_stats.stage("shiftstone") as stage:
+                own_values = cls.from_ownerships(
+                    base_values_by_id[base_values_id],
+                    [ownerships[position] for position in positions],
+                )
+                stage.rows = own_values.own_value.size
+            for column, position in enumerate(positions):
+                columns_by_position[position] = (own_values, column)
+
+        return [columns_by_position[position] for position in range(len(users))]
+
+    def get_own_value_frame(self, user: User, column: int) -> OwnValueFrame:
+        """Makes the OwnValueFrame of the user in the given column."""
+        table = self.base_values.with_columns(
+            {
+                OwnValueFrame.IS_OWNED_NAME: self.is_owned[:, column],
+                OwnValueFrame.RESELL_VALUE_NAME: self.resell_value[:, column],
+                OwnValueFrame.OWN_VALUE_NAME: self.own_value[:, column],
+                OwnValueFrame.NUM_OWNED_NAME: self.num_owned[:, column],
+            }
+        )
+        own_value = OwnValueFrame(user, table.to_dataframe())
+        own_value.craft_efficiency_ranking = self.base_values.craft_efficiency_ranking
+        return own_value
@@ -1,3 +1,5 @@
+import typing as t
+
 import pandas as pd
 
 import infiltrate.models.card as card
@@ -25,6 +27,8 @@ class CardDetails(pd.DataFrame):
     DETAILS_URL_NAME = "details_url"
     IS_IN_DRAFT_PACK_NAME = "is_in_draft_pack"
 
+    _metadata = ["_row_positions"]
+
     def __init__(self, *args):
         pd.DataFrame.__init__(self, *args)
         self.set_num = self.set_num
@@ -36,13 +40,23 @@ class CardDetails(pd.DataFrame):
         self.details_url = self.details_url
         self.is_in_draft_pack = self.is_in_draft_pack
 
-    def card_exists(self, card_id: card.CardId):
+        self._row_positions = self._make_row_positions()
+
+    def _make_row_positions(self) -> t.Dict[t.Tuple[int, int], int]:
+        """Maps each (set_num, card_num) to its row, for lookups without
+        scanning the frame."""
+        card_ids = zip(
+            self[self.SET_NUM_NAME].tolist(), self[self.CARD_NUM_NAME].tolist()
+        )
+        return {card_id: position for position, card_id in enumerate(card_ids)}
+
+    def card_exists(self, card_id: card.CardId) -> bool:
         """Return if the card_id is found."""
-        matching_card = self.loc[
-            (
-                (self[self.SET_NUM_NAME] == card_id.set_num)
-                & (self[self.CARD_NUM_NAME] == card_id.card_num)
-            )
-        ]
-        does_exist = len(matching_card) > 0
-        return does_exist
+        return card_id in self._row_positions
+
+    def get_card_row(self, card_id: card.CardId) -> t.Optional[pd.Series]:
+        """Return the row of the card_id, or None if it isn't found."""
+        position = self._row_positions.get(card_id)
+        if position is None:
+            return None
+        return self.iloc[position]
@@ -0,0 +1,154 @@
+"""An array backed table of values for every copy of every card."""
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+import infiltrate.card_frame_bases as card_frame_bases
+import infiltrate.models.card as card
+import infiltrate.models.rarity as rarities
+
+
+class CardValueTable:
+    """Columns of values for each copy of each card, each held as one contiguous
+    numpy array over a fixed ordering of card copies.
+
+    Card copies are ordered by the card details, with the copies of each card
+    counted 1 to 4 in consecutive rows.
+    Adding a column never copies the others, and tables made with with_columns share
+    the arrays of the table they came from."""
+
+    SET_NUM_NAME = "set_num"
+    CARD_NUM_NAME = "card_num"
+    COUNT_IN_DECK_NAME = "count_in_deck"
+    RARITY_CODE_NAME = "rarity_code"
+
+    COPIES_PER_CARD = 4
+
+    def __init__(
+        self,
+        card_details: card_frame_bases.CardDetails,
+        card_index: pd.MultiIndex,
+        columns: t.Dict[str, np.ndarray],
+    ):
+        self.card_details = card_details
+        self.card_index = card_index
+        self._columns: t.Dict[str, np.ndarray] = {}
+        for name, values in columns.items():
+            self[name] = values
+
+    @classmethod
+    def from_card_details(
+        cls, card_details: card_frame_bases.CardDetails
+    ) -> "CardValueTable":
+        """Makes a table of each copy of each card, without any values.
+
+        The card columns are built once per card details until the cards are
+        updated, and shared read only by the tables made from them."""
+        cards_version = card.get_cards_version()
+        cached = _card_columns_cache.get(cards_version)
+        if cached is not None and cached[0] is card_details:
+            _, card_index, columns = cached
+            return cls(card_details, card_index, columns)
+
+        set_nums = card_details[card_details.SET_NUM_NAME].to_numpy()
+        card_nums = card_details[card_details.CARD_NUM_NAME].to_numpy()
+        card_index = pd.MultiIndex.from_arrays([set_nums, card_nums])
+
+        num_cards = len(card_details)
+        counts_in_deck = np.tile(np.arange(1, cls.COPIES_PER_CARD + 1), num_cards)
+        rarity_codes = rarities.get_codes(card_details[card_details.RARITY_NAME])
+
+        columns = {
+            cls.SET_NUM_NAME: np.repeat(set_nums, cls.COPIES_PER_CARD),
+            cls.CARD_NUM_NAME: np.repeat(card_nums, cls.COPIES_PER_CARD),
+            cls.COUNT_IN_DECK_NAME: counts_in_deck,
+            cls.RARITY_CODE_NAME: np.repeat(rarity_codes, cls.COPIES_PER_CARD),
+        }
+        for values in columns.values():
+            values.flags.writeable = False
+
+        _card_columns_cache.clear()
+        _card_columns_cache[cards_version] = (card_details, card_index, columns)
+        return cls(card_details, card_index, columns)
+
+    def __len__(self):
+        return len(self.card_index) * self.COPIES_PER_CARD
+
+    def __contains__(self, name: str):
+        return name in self._columns
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._columns[name]
+
+    def __setitem__(self, name: str, values):
+        values = np.ascontiguousarray(values)
+        if values.shape != (len(self),):
+            raise ValueError(
+                f"Column {name} has shape {values.shape}, expected ({len(self)},)"
+            )
+        self._columns[name] = values
+
+    @property
+    def columns(self) -> t.List[str]:
+        return list(self._columns.keys())
+
+    def with_columns(self, columns: t.Dict[str, np.ndarray]) -> "CardValueTable":
+        """Makes a table sharing this table's arrays, with columns added or replaced.
+        This table is unchanged."""
+        return CardValueTable(
+            self.card_details, self.card_index, {**self._columns, **columns}
+        )
+
+    def get_card_positions(self, set_nums, card_nums) -> np.ndarray:
+        """Gets the position of each card in the card ordering, or -1 if missing."""
+        cards = pd.MultiIndex.from_arrays([np.asarray(set_nums), np.asarray(card_nums)])
+        return self.card_index.get_indexer(cards)
+
+    def get_positions(self, set_nums, card_nums, counts_in_deck) -> np.ndarray:
+        """Gets the row of each card copy, or -1 if missing."""
+        card_positions = self.get_card_positions(set_nums, card_nums)
+        counts_in_deck = np.asarray(counts_in_deck)
+        is_valid = np.logical_and.reduce(
+            [
+                card_positions >= 0,
+                counts_in_deck >= 1,
+                counts_in_deck <= self.COPIES_PER_CARD,
+            ]
+        )
+        positions = card_positions * self.COPIES_PER_CARD + counts_in_deck - 1
+        return np.where(is_valid, positions, -1)
+
+    def sum_at_positions(self, positions: np.ndarray, values) -> np.ndarray:
+        """Makes a column summing the values at their rows, ignoring missing rows."""
+        positions = np.asarray(positions)
+        is_found = positions >= 0
+        summed = np.zeros(len(self))
+        np.add.at(summed, positions[is_found], np.asarray(values)[is_found])
+        return summed
+
+    def to_dataframe(self, include_details=True) -> pd.DataFrame:
+        """Makes a dataframe of the table, indexed by card copy,
+        for templates and export."""
+        data = {}
+        if include_details and self.card_details is not None:
+            detail_rows = np.repeat(np.arange(len(self.card_index)), self.COPIES_PER_CARD)
+            for name in self.card_details.columns:
+                data[name] = self.card_details[name].array.take(detail_rows)
+        data.update(self._columns)
+
+        index = pd.MultiIndex.from_arrays(
+            [
+                self[self.SET_NUM_NAME],
+                self[self.CARD_NUM_NAME],
+                self[self.COUNT_IN_DECK_NAME],
+            ],
+            names=[self.SET_NUM_NAME, self.CARD_NUM_NAME, self.COUNT_IN_DECK_NAME],
+        )
+        return pd.DataFrame(data, index=index)
+
+
+_card_columns_cache: t.Dict[
+    int,
+    t.Tuple[card_frame_bases.CardDetails, pd.MultiIndex, t.Dict[str, np.ndarray]],
+] = {}
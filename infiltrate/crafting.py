@@ -0,0 +1,163 @@
+"""Plans which cards to craft with a budget of shiftstone."""
+import heapq
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+import infiltrate.card_evaluation as card_evaluation
+
+COPIES_PER_CARD = 4
+
+
+class CraftingPlan:
+    """The card copies to craft, in the order they were picked."""
+
+    def __init__(self, budget: int, crafts: pd.DataFrame):
+        self.budget = budget
+        self.crafts = crafts
+
+    @property
+    def spent(self) -> int:
+        return int(self.crafts[card_evaluation.OwnValueFrame.CRAFT_COST_NAME].sum())
+
+    @property
+    def play_value(self) -> float:
+        return float(self.crafts[card_evaluation.OwnValueFrame.PLAY_VALUE_NAME].sum())
+
+
+class _CardCopies:
+    """The craft value and cost of each copy of each card, as (cards x copies)
+    matrices, with the number of copies owned of each card.
+
+    The craft value of a copy is its play craft efficiency times its cost,
+    its play value scaled down by how likely the player is to find it anyway,
+    so plans rank cards the same way as the card pages."""
+
+    def __init__(self, own_values: card_evaluation.OwnValueFrame):
+        card_ids = pd.MultiIndex.from_arrays(
+            [
+                np.asarray(own_values[own_values.SET_NUM_NAME]),
+                np.asarray(own_values[own_values.CARD_NUM_NAME]),
+            ]
+        )
+        card_codes, unique_card_ids = pd.factorize(card_ids)
+        num_cards = len(unique_card_ids)
+        copy_indices = np.asarray(own_values[own_values.COUNT_IN_DECK_NAME]) - 1
+
+        self.rows = np.full((num_cards, COPIES_PER_CARD), -1)
+        self.rows[card_codes, copy_indices] = np.arange(len(own_values))
+        craft_costs = np.asarray(own_values[own_values.CRAFT_COST_NAME])
+        self.craft_values = np.zeros((num_cards, COPIES_PER_CARD))
+        self.craft_values[card_codes, copy_indices] = craft_costs * np.nan_to_num(
+            np.asarray(own_values[own_values.PLAY_CRAFT_EFFICIENCY_NAME], dtype=float)
+        )
+        self.craft_costs = np.zeros(num_cards)
+        self.craft_costs[card_codes] = craft_costs
+
+        is_owned = np.asarray(own_values[own_values.IS_OWNED_NAME], dtype=bool)
+        self.num_owned = np.bincount(card_codes[is_owned], minlength=num_cards)
+
+    def get_row_craft_values(self, num_rows: int) -> np.ndarray:
+        """Gets the craft value of each row of the frame the copies were made from."""
+        row_craft_values = np.zeros(num_rows)
+        is_row = self.rows >= 0
+        row_craft_values[self.rows[is_row]] = self.craft_values[is_row]
+        return row_craft_values
+
+    def get_bundle_efficiencies(
+        self, cards: np.ndarray, next_copies: np.ndarray
+    ) -> np.ndarray:
+        """Gets the best craft value per shiftstone of crafting the next copy of each
+        card along with any number of the copies after it.
+
+        A copy can only be crafted after those before it, so a weak copy followed by
+        a strong one is ranked by what crafting both gives."""
+        copies = np.arange(COPIES_PER_CARD)
+        is_craftable = copies >= next_copies[:, np.newaxis]
+        bundle_values = np.cumsum(
+            np.where(is_craftable, self.craft_values[cards], 0), axis=1
+        )
+        bundle_costs = (
+            np.cumsum(is_craftable, axis=1) * self.craft_costs[cards, np.newaxis]
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            efficiencies = np.where(
+                is_craftable & (bundle_costs > 0),
+                bundle_values / bundle_costs,
+                -np.inf,
+            )
+        return efficiencies.max(axis=1, initial=-np.inf)
+
+
+def plan_crafting(
+    own_values: card_evaluation.OwnValueFrame, budget: int
+) -> CraftingPlan:
+    """Picks unowned card copies to craft within the budget, greedily by play craft
+    efficiency, the play value per shiftstone of copies the player isn't likely to
+    find anyway.
+
+    Each card is a candidate only through its next unowned copy, ranked by the best
+    bundle of copies starting there. Crafting a copy only changes the rank of its
+    own card, so the heap holds one entry per card and is updated lazily as
+    copies are picked, rather than evaluating the collection again after each pick.
+    The plan is compared with crafting the single most valuable copy that fits,
+    as pure efficiency can leave most of a budget for weak cards."""
+    card_copies = _CardCopies(own_values)
+    next_copies = card_copies.num_owned.copy()
+
+    cards = np.flatnonzero(
+        (next_copies < COPIES_PER_CARD) & (card_copies.craft_costs > 0)
+    )
+    efficiencies = card_copies.get_bundle_efficiencies(cards, next_copies[cards])
+    heap = [
+        (-efficiency, card)
+        for efficiency, card in zip(efficiencies, cards)
+        if efficiency > 0
+    ]
+    heapq.heapify(heap)
+
+    remaining = budget
+    picked_rows = []
+    while heap:
+        _, card = heapq.heappop(heap)
+        cost = card_copies.craft_costs[card]
+        if cost > remaining:
+            continue
+
+        picked_rows.append(card_copies.rows[card, next_copies[card]])
+        remaining -= cost
+        next_copies[card] += 1
+        if next_copies[card] < COPIES_PER_CARD:
+            efficiency = card_copies.get_bundle_efficiencies(
+                np.array([card]), next_copies[[card]]
+            )[0]
+            if efficiency > 0:
+                heapq.heappush(heap, (-efficiency, card))
+
+    craft_values = card_copies.get_row_craft_values(len(own_values))
+    best_single_row = _get_best_single_row(card_copies, budget)
+    if (
+        best_single_row is not None
+        and craft_values[best_single_row] > craft_values[picked_rows].sum()
+    ):
+        picked_rows = [best_single_row]
+
+    crafts = own_values.iloc[picked_rows]
+    return CraftingPlan(budget, pd.DataFrame(crafts))
+
+
+def _get_best_single_row(card_copies: _CardCopies, budget: int) -> t.Optional[int]:
+    """The row of the next copy with the most craft value that fits the budget
+    alone."""
+    cards = np.flatnonzero(
+        (card_copies.num_owned < COPIES_PER_CARD)
+        & (card_copies.craft_costs <= budget)
+        & (card_copies.craft_costs > 0)
+    )
+    if len(cards) == 0:
+        return None
+    next_copies = card_copies.num_owned[cards]
+    values = card_copies.craft_values[cards, next_copies]
+    best = np.argmax(values)
+    return card_copies.rows[cards[best], next_copies[best]]
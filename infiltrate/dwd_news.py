@@ -41,6 +41,10 @@ def get_most_recent_league_article_url():
 
 def get_most_recent_league_article_packs_text():
     url = get_most_recent_league_article_url()
+    return get_league_article_packs_text(url)
+
+
+def get_league_article_packs_text(url: str):
     rows = browsers.get_texts_from_url_and_selector(url, LEAGUE_PACKS_SELECTOR)
     pack_texts = list(itertools.chain(*[row.split(",") for row in rows]))
     pack_texts = [pack_text.replace("\xa0", " ") for pack_text in pack_texts]
@@ -7,3 +7,9 @@ infiltrate.db.create_all()
 infiltrate.db.session.commit()
 
 all_cards = card_frame_bases.CardDetails(card.all_cards_df_from_db())
+
+
+def update_all_cards():
+    """Reloads the cards from the db, after the cards table changes."""
+    global all_cards
+    all_cards = card_frame_bases.CardDetails(card.all_cards_df_from_db())
@@ -74,9 +74,7 @@ def all_cards_df_from_db() -> pd.DataFrame:
         inplace=True,
     )
 
-    cards_df["rarity"] = cards_df.rarity.apply(
-        lambda rarity_name: rarity.rarity_from_name[rarity_name]
-    )
+    cards_df["rarity"] = cards_df.rarity.astype(rarity.RARITY_DTYPE)
 
     return cards_df
 
@@ -92,8 +90,19 @@ def get_card_ids_from_names(names: t.List[str]) -> t.List[CardId]:
     return card_ids
 
 
+_cards_version = 0
+
+
+def get_cards_version() -> int:
+    """A number which changes whenever update_cards changes the cards table,
+    for caches of values derived from the cards."""
+    return _cards_version
+
+
 def update_cards():
     """Updates the db to match the Warcry cards list."""
+    global _cards_version
+
     logging.info("Updating cards")
     card_json = _get_card_json()
     _make_cards_from_entries(card_json)
@@ -106,6 +115,16 @@ def update_cards():
 
     expedition.update_is_in_expedition()
 
+    _cards_version += 1
+
+    import infiltrate.models.card.pool_size as pool_size
+
+    pool_size.update()
+
+    import infiltrate.global_data as global_data
+
+    global_data.update_all_cards()
+
 
 def _get_card_json():
     card_json = browsers.get_json_from_url(
@@ -0,0 +1,76 @@
+"""The number of cards in each pool that rewards drop cards from,
+counted once per update of the cards table."""
+import collections
+import typing as t
+
+import infiltrate.models.card as card_mod
+import infiltrate.models.rarity as rarities
+from infiltrate import db
+
+
+class CardPoolSizes:
+    """Counts of cards by (set_num, rarity name) and by rarity name in draft packs."""
+
+    def __init__(
+        self,
+        by_set_and_rarity: t.Dict[t.Tuple[int, str], int],
+        by_draft_pack_rarity: t.Dict[str, int],
+    ):
+        self.by_set_and_rarity = by_set_and_rarity
+        self.by_draft_pack_rarity = by_draft_pack_rarity
+
+    @classmethod
+    def from_db(cls) -> "CardPoolSizes":
+        """Counts the cards in one grouped query."""
+        rows = (
+            db.session.query(
+                card_mod.Card.set_num,
+                card_mod.Card.rarity,
+                card_mod.Card.is_in_draft_pack,
+                db.func.count(),
+            )
+            .group_by(
+                card_mod.Card.set_num,
+                card_mod.Card.rarity,
+                card_mod.Card.is_in_draft_pack,
+            )
+            .all()
+        )
+
+        by_set_and_rarity = collections.Counter()
+        by_draft_pack_rarity = collections.Counter()
+        for set_num, rarity_name, is_in_draft_pack, count in rows:
+            by_set_and_rarity[(set_num, rarity_name)] += count
+            if is_in_draft_pack:
+                by_draft_pack_rarity[rarity_name] += count
+        return cls(dict(by_set_and_rarity), dict(by_draft_pack_rarity))
+
+    def get_num_cards(self, set_nums: t.Iterable[int], rarity: rarities.Rarity) -> int:
+        """The number of cards of the rarity in any of the sets."""
+        return sum(
+            self.by_set_and_rarity.get((set_num, rarity.name), 0)
+            for set_num in set_nums
+        )
+
+    def get_num_draft_pack_cards(self, rarity: rarities.Rarity) -> int:
+        """The number of cards of the rarity in draft packs."""
+        return self.by_draft_pack_rarity.get(rarity.name, 0)
+
+
+_pool_sizes: t.Optional[CardPoolSizes] = None
+_pool_sizes_version: t.Optional[int] = None
+
+
+def get_pool_sizes() -> CardPoolSizes:
+    """Gets the card pool sizes for the current cards,
+    counting them if the cards changed since they were last counted."""
+    if _pool_sizes is None or _pool_sizes_version != card_mod.get_cards_version():
+        update()
+    return _pool_sizes
+
+
+def update():
+    """Recounts the card pools."""
+    global _pool_sizes, _pool_sizes_version
+    _pool_sizes_version = card_mod.get_cards_version()
+    _pool_sizes = CardPoolSizes.from_db()
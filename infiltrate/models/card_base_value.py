@@ -0,0 +1,71 @@
+"""User independent card values, shared by all users.
+
+Recalculated after every deck search update, and versioned so that evaluations
+always read a complete set of values."""
+import contextlib
+import typing as t
+
+import pandas as pd
+
+from infiltrate import db
+
+
+class CardBaseValue(db.Model):
+    """A table of the values of each copy of each card,
+    before accounting for any user's collection."""
+
+    __tablename__ = "card_base_values"
+    version = db.Column("version", db.Integer, primary_key=True)
+    set_num = db.Column("set_num", db.Integer, primary_key=True)
+    card_num = db.Column("card_num", db.Integer, primary_key=True)
+    count_in_deck = db.Column("count_in_deck", db.Integer, primary_key=True)
+    num_decks_with_count_or_less = db.Column(
+        "num_decks_with_count_or_less", db.Float, nullable=False
+    )
+    play_rate = db.Column("play_rate", db.Float, nullable=False)
+    play_value = db.Column("play_value", db.Float, nullable=False)
+    craft_cost = db.Column("craft_cost", db.Integer, nullable=False)
+    findability = db.Column("findability", db.Float, nullable=False)
+    play_craft_efficiency = db.Column("play_craft_efficiency", db.Float, nullable=False)
+
+
+VALUE_COLUMNS = [
+    "num_decks_with_count_or_less",
+    "play_rate",
+    "play_value",
+    "craft_cost",
+    "findability",
+    "play_craft_efficiency",
+]
+KEY_COLUMNS = ["set_num", "card_num", "count_in_deck"]
+
+
+def get_latest_version() -> t.Optional[int]:
+    """The most recently saved version, or None if values were never saved."""
+    return db.session.query(db.func.max(CardBaseValue.version)).scalar()
+
+
+def as_df(version: int) -> pd.DataFrame:
+    """Gets all card base values of the given version."""
+    query = f"""\
+        SELECT {", ".join(KEY_COLUMNS + VALUE_COLUMNS)}
+        FROM card_base_values
+        WHERE version = {version}"""
+    with contextlib.closing(db.engine.raw_connection()) as connection:
+        df = pd.read_sql_query(query, connection)
+    return df
+
+
+def save(base_values: pd.DataFrame) -> int:
+    """Saves the base values as a new version, and removes older versions.
+
+    Returns the new version."""
+    latest_version = get_latest_version()
+    version = 1 if latest_version is None else latest_version + 1
+
+    rows = base_values[KEY_COLUMNS + VALUE_COLUMNS].assign(version=version)
+    db.session.bulk_insert_mappings(CardBaseValue, rows.to_dict("records"))
+
+    CardBaseValue.query.filter(CardBaseValue.version < version).delete()
+    db.session.commit()
+    return version
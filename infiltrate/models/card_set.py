@@ -1,6 +1,8 @@
 """Models for sets of cards."""
 import collections
+import datetime
 import logging
+import threading
 import typing as t
 
 import infiltrate.browsers as browsers
@@ -18,17 +20,85 @@ class CardSetName(db.Model):
     num_in_league = db.Column("num_in_league", db.Integer)
 
 
-def update():
-    """Updates the database with set names for all card sets"""
+class LeagueInfo(db.Model):
+    """The most recent league article, found by update along with the league's
+    pack counts, so that pages never read the news themselves."""
+
+    __tablename__ = "league_info"
+    id = db.Column("id", db.Integer, primary_key=True)
+    article_url = db.Column("article_url", db.String(length=200), nullable=False)
+    fetched_at = db.Column("fetched_at", db.DateTime, nullable=False)
+
+
+LEAGUE_INFO_ID = 1
+LEAGUE_INFO_TTL = datetime.timedelta(days=1)
+
+_refresh_lock = threading.Lock()
+
+
+def get_league_article_url() -> str:
+    """The url of the most recent league article, as of the last update.
+
+    If the stored league info is missing or older than LEAGUE_INFO_TTL,
+    the league info is updated in the background and the stored url is served
+    meanwhile, or the news page if there is none yet."""
+    league_info = LeagueInfo.query.get(LEAGUE_INFO_ID)
+    if league_info is None:
+        _update_in_background()
+        return dwd_news.NEWS_URL
+
+    if datetime.datetime.utcnow() - league_info.fetched_at > LEAGUE_INFO_TTL:
+        _update_in_background()
+    return league_info.article_url
+
+
+def get_league_info_version() -> t.Optional[datetime.datetime]:
+    """When the league info was last updated, which changes the league's packs,
+    or None if it never was."""
+    league_info = LeagueInfo.query.get(LEAGUE_INFO_ID)
+    if league_info is None:
+        return None
+    return league_info.fetched_at
+
+
+def _update_in_background():
+    """Starts a league info update in a thread, unless one is running already."""
+    if not _refresh_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            update(league_only=True)
+        except Exception:
+            logging.exception("Background league info update failed")
+        finally:
+            db.session.remove()
+            _refresh_lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def update(league_only=False):
+    """Updates the database with set names for all card sets,
+    and the pack counts and article of the most recent league.
+
+    With league_only, only the league is updated, for the sets already stored."""
 
     class _CardSetNameUpdater:
         def run(self):
+            league_url = dwd_news.get_most_recent_league_article_url()
+            league_counts = self._get_league_counts(league_url)
+            if league_only:
+                self._update_league_counts(league_counts)
+                self._save_league_info(league_url)
+                return
+
             set_name_strings = self._get_set_name_strings()
-            league_counts = self._get_league_counts()
             for set_name_string in set_name_strings:
                 set_num, name = self._parse_set_name_string(set_name_string)
                 league_count = league_counts.get(name, 0)
                 self._create_set_name(set_num, name, league_count)
+            self._save_league_info(league_url)
 
         def _get_set_name_strings(self):
             url = "https://eternalwarcry.com/cards"
@@ -48,8 +118,22 @@ def update():
             db.session.merge(card_set_name)
             db.session.commit()
 
-        def _get_league_counts(self) -> t.Dict[str, int]:
-            pack_texts = dwd_news.get_most_recent_league_article_packs_text()
+        def _update_league_counts(self, league_counts: t.Dict[str, int]):
+            for card_set_name in CardSetName.query.all():
+                card_set_name.num_in_league = league_counts.get(card_set_name.name, 0)
+            db.session.commit()
+
+        def _save_league_info(self, league_url: str):
+            league_info = LeagueInfo(
+                id=LEAGUE_INFO_ID,
+                article_url=league_url,
+                fetched_at=datetime.datetime.utcnow(),
+            )
+            db.session.merge(league_info)
+            db.session.commit()
+
+        def _get_league_counts(self, league_url: str) -> t.Dict[str, int]:
+            pack_texts = dwd_news.get_league_article_packs_text(league_url)
             set_name_counter = collections.defaultdict(int)
             for pack_text in pack_texts:
                 pack_text = pack_text.split(":")[-1]
@@ -1,10 +1,12 @@
 """The Deck model and related utilities"""
+import concurrent.futures
 import enum
 import logging
+import math
 import typing as t
-import urllib.error
-from datetime import datetime
+from datetime import datetime, timedelta
 
+import sqlalchemy
 import tqdm
 
 import infiltrate.browsers as browsers
@@ -14,6 +16,18 @@ import infiltrate.models.card as card
 # todo replace application with config injection
 from infiltrate import application, db
 
+# Deck details are fetched in parallel, politely, and written in batches.
+MAX_CONCURRENT_FETCHES = 8
+FETCHES_PER_SECOND = 10
+COMMIT_BATCH_SIZE = 50
+
+# Failed fetches are retried in later updates, waiting twice as long after each
+# attempt, until MAX_FETCH_ATTEMPTS.
+MAX_FETCH_ATTEMPTS = 5
+RETRY_BASE_DELAY = timedelta(hours=1)
+MAX_RETRY_DELAY = timedelta(days=1)
+JOURNAL_RETENTION = timedelta(days=30)
+
 
 class DeckHasCard(db.Model):
     """A table showing how many copies of a card a deck has."""
@@ -91,30 +105,214 @@ class Deck(db.Model):
         return Deck.query.filter_by(id=deck_id).first()
 
 
+class DeckListingScan(db.Model):
+    """A pass down the Warcry deck listing, journaling ids until reaching known
+    decks. next_page is committed with each page, so an interrupted scan resumes."""
+
+    __tablename__ = "deck_listing_scans"
+    id = db.Column("id", db.Integer, primary_key=True)
+    started_at = db.Column("started_at", db.DateTime, nullable=False)
+    next_page = db.Column("next_page", db.Integer, nullable=False)
+    is_complete = db.Column("is_complete", db.Boolean, nullable=False)
+
+    @classmethod
+    def get_unfinished(cls) -> t.List["DeckListingScan"]:
+        """Gets the scans yet to reach a known id, oldest first."""
+        return cls.query.filter_by(is_complete=False).order_by(cls.started_at).all()
+
+    @classmethod
+    def start(cls) -> "DeckListingScan":
+        scan = cls(started_at=datetime.utcnow(), next_page=0, is_complete=False)
+        db.session.add(scan)
+        db.session.commit()
+        return scan
+
+
+class IngestionStatus(enum.Enum):
+    """Enum for the progress of a journaled deck id"""
+
+    pending = 0
+    fetched = 1
+    failed = 2
+
+
+class DeckIngestion(db.Model):
+    """A journal entry for a deck id found on the Warcry listing,
+    tracking its fetch until the deck is saved or given up on."""
+
+    __tablename__ = "deck_ingestion_journal"
+    deck_id = db.Column("deck_id", db.String(length=100), primary_key=True)
+    scan_id = db.Column(
+        "scan_id", db.Integer, db.ForeignKey("deck_listing_scans.id"), nullable=False
+    )
+    status = db.Column("status", db.Enum(IngestionStatus), nullable=False)
+    attempts = db.Column("attempts", db.Integer, nullable=False)
+    journaled_at = db.Column("journaled_at", db.DateTime, nullable=False)
+    next_attempt_at = db.Column("next_attempt_at", db.DateTime, nullable=False)
+    last_error = db.Column("last_error", db.String(length=200), nullable=True)
+
+    @classmethod
+    def make_pending(cls, deck_id: str, scan_id: int, now: datetime):
+        return cls(
+            deck_id=deck_id,
+            scan_id=scan_id,
+            status=IngestionStatus.pending,
+            attempts=0,
+            journaled_at=now,
+            next_attempt_at=now,
+        )
+
+    def record_fetched(self):
+        self.status = IngestionStatus.fetched
+        self.attempts += 1
+        self.last_error = None
+
+    def record_failure(self, error: Exception, now: datetime):
+        """Schedules a retry with backoff, or gives up after MAX_FETCH_ATTEMPTS."""
+        self.attempts += 1
+        self.last_error = repr(error)[:200]
+        if self.attempts >= MAX_FETCH_ATTEMPTS:
+            self.status = IngestionStatus.failed
+        else:
+            self.next_attempt_at = now + get_retry_delay(self.attempts)
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    """The wait before fetching again after the given number of failed attempts."""
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def get_due_ingestions() -> t.List[DeckIngestion]:
+    """Gets the pending journal entries ready for an attempt, oldest first."""
+    return (
+        DeckIngestion.query.filter(
+            DeckIngestion.status == IngestionStatus.pending,
+            DeckIngestion.next_attempt_at <= datetime.utcnow(),
+        )
+        .order_by(DeckIngestion.journaled_at)
+        .all()
+    )
+
+
+def prune_ingestion_journal():
+    """Forgets finished journal entries and scans older than JOURNAL_RETENTION."""
+    cutoff = datetime.utcnow() - JOURNAL_RETENTION
+    DeckIngestion.query.filter(
+        DeckIngestion.status != IngestionStatus.pending,
+        DeckIngestion.journaled_at < cutoff,
+    ).delete(synchronize_session=False)
+    remaining_scan_ids = db.session.query(DeckIngestion.scan_id).distinct()
+    DeckListingScan.query.filter(
+        DeckListingScan.is_complete,
+        DeckListingScan.started_at < cutoff,
+        DeckListingScan.id.notin_(remaining_scan_ids),
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
 # noinspection PyMissingOrEmptyDocstring
 class _WarcryNewIdGetter:
     ITEMS_PER_PAGE = 50
 
-    def get_new_ids(self, max_decks=None):
+    def journal_new_ids(self, max_decks=None, prefetch=True):
+        """Journals ids from the listing pages as pending until reaching a known id.
+
+        Interrupted scans are finished first, from the page after the last one they
+        journaled. Decks added since only push their ids to later pages, so no ids
+        are skipped. A new scan then journals the ids above them.
+
+        At most max_decks ids worth of pages are read. A scan stopped by that limit
+        is left unfinished, and resumed by the next call."""
         if max_decks is not None:
-            max_pages = max_decks / self.ITEMS_PER_PAGE
+            max_pages = math.ceil(max_decks / self.ITEMS_PER_PAGE)
         else:
             max_pages = None
 
-        logging.info("Getting new deck ids")
-        new_ids = []
-        page = 0
-        while True:
-            ids_on_page = self.get_ids_from_page(page)
-            new_ids_on_page = self.remove_old_ids(ids_on_page)
-            new_ids += new_ids_on_page
-            if not new_ids_on_page or max_pages is not None and page >= max_pages:
-                # todo this may need testing.
+        for unfinished_scan in DeckListingScan.get_unfinished():
+            logging.info(
+                f"Resuming deck listing scan from page {unfinished_scan.next_page}"
+            )
+            num_pages = self.journal_scan(unfinished_scan, max_pages, prefetch)
+            if max_pages is not None:
+                max_pages -= num_pages
+                if max_pages <= 0:
+                    return
+
+        logging.info("Journaling new deck ids")
+        self.journal_scan(DeckListingScan.start(), max_pages, prefetch)
+
+    def journal_scan(
+        self, scan: DeckListingScan, max_pages: t.Optional[int], prefetch: bool
+    ) -> int:
+        """Journals the scan's pages from its next page, committing after each.
+        Returns the number of pages read.
+
+        Reaching a known id or an empty page completes the scan. Stopping after
+        max_pages leaves it unfinished, to be resumed from its next page."""
+        num_pages = 0
+        for page, ids_on_page in self.iter_pages(scan.next_page, prefetch):
+            is_at_known_id = self.journal_page(scan, ids_on_page)
+            scan.next_page = page + 1
+            scan.is_complete = is_at_known_id or not ids_on_page
+            db.session.commit()
+            num_pages += 1
+            if scan.is_complete or max_pages is not None and num_pages >= max_pages:
                 break
 
-            page += 1
-            logging.info(f"Pages of deck ids ready: {page}")
-        return new_ids
+            logging.info(f"Pages of deck ids journaled: {scan.next_page}")
+        return num_pages
+
+    @staticmethod
+    def journal_page(scan: DeckListingScan, ids: t.List[str]) -> bool:
+        """Journals the ids as pending up to the first saved deck or id journaled
+        by another scan, found with one query. Returns if it reached one.
+
+        Ids this scan journaled already are passed over, as pages shift down
+        when decks are added during the scan."""
+        saved = db.session.query(
+            Deck.id.label("deck_id"), sqlalchemy.null().label("scan_id")
+        ).filter(Deck.id.in_(ids))
+        journaled = db.session.query(
+            DeckIngestion.deck_id, DeckIngestion.scan_id
+        ).filter(DeckIngestion.deck_id.in_(ids))
+        saved_ids = set()
+        scan_ids = {}
+        for deck_id, scan_id in saved.union_all(journaled):
+            if scan_id is None:
+                saved_ids.add(deck_id)
+            else:
+                scan_ids[deck_id] = scan_id
+        now = datetime.utcnow()
+        for deck_id in ids:
+            if deck_id in saved_ids or scan_ids.get(deck_id, scan.id) != scan.id:
+                return True
+            if deck_id not in scan_ids:
+                db.session.add(DeckIngestion.make_pending(deck_id, scan.id, now))
+                scan_ids[deck_id] = scan.id
+        return False
+
+    def iter_pages(
+        self, start_page: int, prefetch=True
+    ) -> t.Iterator[t.Tuple[int, t.List[str]]]:
+        """Yields each page number and its ids from start_page onwards.
+        With prefetch, each next page is fetched while the current one is used."""
+        page = start_page
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            next_page_ids = executor.submit(self.get_ids_from_page, page)
+            try:
+                while True:
+                    ids_on_page = next_page_ids.result()
+                    if prefetch:
+                        next_page_ids = executor.submit(
+                            self.get_ids_from_page, page + 1
+                        )
+                    yield page, ids_on_page
+
+                    page += 1
+                    if not prefetch:
+                        next_page_ids = executor.submit(self.get_ids_from_page, page)
+            finally:
+                next_page_ids.cancel()
 
     def get_ids_from_page(self, page: int):
         url = (
@@ -134,104 +332,179 @@ class _WarcryNewIdGetter:
         ids = [deck["deck_id"] for deck in decks]
         return ids
 
-    @staticmethod
-    def remove_old_ids(ids: t.List[str]) -> t.List[str]:
-        new_ids = []
-        for deck_id in ids:
-            if not Deck.get_from_id(deck_id):
-                new_ids.append(deck_id)
-            else:
-                break
-        return new_ids
 
+class ParsedDeck(t.NamedTuple):
+    """Rows of the decks and deck_has_card tables for one deck."""
 
-def get_new_warcry_ids(max_decks=1_000):
-    """Return all Warcry deck IDs newer than any in the database."""
+    deck: t.Dict[str, t.Any]
+    cards: t.List[t.Dict[str, t.Any]]
 
-    id_getter = _WarcryNewIdGetter()
-    ids = id_getter.get_new_ids(max_decks=max_decks)
 
-    return ids
+def parse_deck_details(page_json: t.Dict) -> ParsedDeck:
+    """Parses the Warcry details of a deck into table rows."""
+    archetype = Archetype[page_json["archetype"].lower().replace(" ", "_")]
+    try:
+        deck_type = DeckType.__dict__[page_json["deck_type"].lower().replace(" ", "_")]
+    except KeyError:  # not sure this is the right exception
+        deck_type = DeckType(int(page_json["deck_type"]))
 
+    deck = {
+        "id": page_json["deck_id"],
+        "archetype": archetype,
+        "date_added": datetime.strptime(
+            page_json["date_added_full"][:19], "%Y-%m-%dT%H:%M:%S"
+        ),
+        "date_updated": datetime.strptime(
+            page_json["date_updated_full"][:19], "%Y-%m-%dT%H:%M:%S"
+        ),
+        "deck_type": deck_type,
+        "description": page_json["description"].encode("ascii", errors="ignore"),
+        "patch": page_json["patch"],
+        "username": page_json["username"],
+        "views": page_json["views"],
+        "rating": page_json["rating"],
+    }
+    return ParsedDeck(deck, _parse_deck_cards(page_json))
+
+
+def _parse_deck_cards(page_json: t.Dict) -> t.List[t.Dict[str, t.Any]]:
+    cards_json = (
+        page_json["deck_cards"]
+        + page_json["sideboard_cards"]
+        + page_json["market_cards"]
+    )
 
-def update_decks():
-    """Updates the database with all new Warcry decks"""
+    # A card listed twice keeps its last count, as merging the rows used to.
+    cards = {}
+    for card_json in cards_json:
+        set_num = card_json["set_number"]
+        card_num = card_json["eternal_id"]
+        card_id = card.CardId(set_num, card_num)
+
+        # todo better to pass all_cards to this than use the global
+        if global_data.all_cards.card_exists(card_id):
+            cards[card_id] = {
+                "deck_id": page_json["deck_id"],
+                "set_num": set_num,
+                "card_num": card_num,
+                "num_played": card_json["count"],
+            }
+    return list(cards.values())
+
+
+MAX_ROWS_PER_INSERT = 200
+
+
+def save_decks(parsed_decks: t.List[ParsedDeck]):
+    """Writes the decks and their cards with multi-row inserts, replacing any
+    saved versions of the same decks. Does not commit.
+
+    Postgres upserts the decks, other databases delete and re-insert them.
+    The cards of the decks are always replaced."""
+    parsed_decks = list({deck.deck["id"]: deck for deck in parsed_decks}.values())
+    if not parsed_decks:
+        return
+    deck_ids = [parsed_deck.deck["id"] for parsed_deck in parsed_decks]
+    deck_rows = [parsed_deck.deck for parsed_deck in parsed_decks]
+    card_rows = [row for parsed_deck in parsed_decks for row in parsed_deck.cards]
+
+    decks_table = Deck.__table__
+    db.session.execute(
+        DeckHasCard.__table__.delete().where(DeckHasCard.deck_id.in_(deck_ids))
+    )
+    if db.engine.dialect.name == "postgresql":
+        import sqlalchemy.dialects.postgresql as postgresql
+
+        insert = postgresql.insert(decks_table)
+        insert = insert.on_conflict_do_update(
+            index_elements=[decks_table.c.id],
+            set_={
+                column.name: insert.excluded[column.name]
+                for column in decks_table.columns
+                if column.name != "id"
+            },
+        )
+    else:
+        db.session.execute(decks_table.delete().where(decks_table.c.id.in_(deck_ids)))
+        insert = decks_table.insert()
 
-    # noinspection PyMissingOrEmptyDocstring
-    class _WarcyDeckUpdater:
-        def run(self):
-            ids = get_new_warcry_ids(1_000)
+    _insert_in_chunks(insert, deck_rows)
+    _insert_in_chunks(DeckHasCard.__table__.insert(), card_rows)
 
-            for deck_id in tqdm.tqdm(ids, desc="Updating decks"):
-                self.update_deck(deck_id)
 
-        def update_deck(self, deck_id: str):
-            url = (
-                "https://api.eternalwarcry.com/v1/decks/details"
-                + f"?key={application.config['WARCRY_KEY']}"
-                + f"&deck_id={deck_id}"
-            )
-            try:
-                page_json = browsers.get_json_from_url(url)
-            except (ConnectionError, urllib.error.HTTPError):
-                return
+def _insert_in_chunks(insert, rows: t.List[t.Dict[str, t.Any]]):
+    """Executes the insert with up to MAX_ROWS_PER_INSERT rows per statement,
+    keeping under database limits on bound parameters."""
+    for start in range(0, len(rows), MAX_ROWS_PER_INSERT):
+        db.session.execute(insert.values(rows[start : start + MAX_ROWS_PER_INSERT]))
 
-            self.make_deck_from_details_json(page_json)
 
-        def make_deck_from_details_json(self, page_json: t.Dict):
+def update_decks(max_decks=1_000):
+    """Updates the database with all new Warcry decks.
 
-            archetype = Archetype[page_json["archetype"].lower().replace(" ", "_")]
-            try:
-                deck_type = DeckType.__dict__[
-                    page_json["deck_type"].lower().replace(" ", "_")
-                ]
-            except KeyError:  # not sure this is the right exception
-                deck_type = DeckType(int(page_json["deck_type"]))
-
-            deck = Deck(
-                id=page_json["deck_id"],
-                archetype=archetype,
-                date_added=datetime.strptime(
-                    page_json["date_added_full"][:19], "%Y-%m-%dT%H:%M:%S"
-                ),
-                date_updated=datetime.strptime(
-                    page_json["date_updated_full"][:19], "%Y-%m-%dT%H:%M:%S"
-                ),
-                deck_type=deck_type,
-                description=page_json["description"].encode("ascii", errors="ignore"),
-                patch=page_json["patch"],
-                username=page_json["username"],
-                views=page_json["views"],
-                rating=page_json["rating"],
-            )
+    Ids are journaled before any deck is fetched, and each batch of decks is
+    committed along with their journal entries, so an interrupted update is
+    resumed by the next one. Failed fetches are retried with backoff."""
+
+    # noinspection PyMissingOrEmptyDocstring
+    class _WarcyDeckUpdater:
+        def run(self, ingestions: t.List[DeckIngestion]):
+            rate_limiter = browsers.RateLimiter(FETCHES_PER_SECOND)
+
+            # Only this thread writes to the database, the pool only fetches.
+            with concurrent.futures.ThreadPoolExecutor(
+                MAX_CONCURRENT_FETCHES
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        self.get_deck_details, ingestion.deck_id, rate_limiter
+                    ): ingestion
+                    for ingestion in ingestions
+                }
+                parsed_decks = []
+                num_unsaved = 0
+                for future in tqdm.tqdm(
+                    concurrent.futures.as_completed(futures),
+                    total=len(futures),
+                    desc="Updating decks",
+                ):
+                    ingestion = futures[future]
+                    # Any error is a failed attempt at this deck, whether in the
+                    # fetch or the parse, so it can't abort the rest of the update.
+                    try:
+                        parsed_decks.append(parse_deck_details(future.result()))
+                    except Exception as e:
+                        logging.warning(f"Failed to get deck {ingestion.deck_id}: {e}")
+                        ingestion.record_failure(e, datetime.utcnow())
+                    else:
+                        ingestion.record_fetched()
+
+                    num_unsaved += 1
+                    if num_unsaved >= COMMIT_BATCH_SIZE:
+                        self.save(parsed_decks)
+                        parsed_decks = []
+                        num_unsaved = 0
+            self.save(parsed_decks)
 
-            self.add_cards_to_deck(deck, page_json)
-            db.session.merge(deck)
+        @staticmethod
+        def save(parsed_decks: t.List[ParsedDeck]):
+            save_decks(parsed_decks)
             db.session.commit()
 
         @staticmethod
-        def add_cards_to_deck(deck: Deck, page_json: t.Dict):
-            cards_json = (
-                page_json["deck_cards"]
-                + page_json["sideboard_cards"]
-                + page_json["market_cards"]
+        def get_deck_details(
+            deck_id: str, rate_limiter: browsers.RateLimiter
+        ) -> t.Dict:
+            url = (
+                "https://api.eternalwarcry.com/v1/decks/details"
+                + f"?key={application.config['WARCRY_KEY']}"
+                + f"&deck_id={deck_id}"
             )
-
-            for card_json in cards_json:
-                set_num = card_json["set_number"]
-                card_num = card_json["eternal_id"]
-                card_id = card.CardId(set_num, card_num)
-
-                # todo better to pass all_cards to this than use the global
-                if global_data.all_cards.card_exists(card_id):
-                    deck_has_card = DeckHasCard(
-                        deck_id=page_json["deck_id"],
-                        set_num=set_num,
-                        card_num=card_num,
-                        num_played=card_json["count"],
-                    )
-                    deck.cards.append(deck_has_card)
+            rate_limiter.wait()
+            return browsers.get_json_from_url(url)
 
     logging.info("Updating decks")
+    _WarcryNewIdGetter().journal_new_ids(max_decks=max_decks)
     updater = _WarcyDeckUpdater()
-    updater.run()
+    updater.run(get_due_ingestions())
+    prune_ingestion_journal()
@@ -1,11 +1,13 @@
 """Specifies groups of decks"""
 from __future__ import annotations
 
+import contextlib
 import dataclasses
 import datetime
 import logging
 import typing as t
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
@@ -167,6 +169,10 @@ def update_deck_searches():
         deck_search = weighted.deck_search
         deck_search.update_playrates()
 
+    import infiltrate.card_evaluation as card_evaluation
+
+    card_evaluation.update_base_values()
+
 
 def make_weighted_deck_search(deck_search: DeckSearch, weight: float, name: str):
     """Creates a weighted deck search."""
@@ -185,6 +191,131 @@ def get_weighted_deck_searches(profile=1):
     return WeightedDeckSearch.query.filter_by(profile_id=profile).all()
 
 
+@dataclasses.dataclass
+class WeightedPlayCounts:
+    """The weighted sum of play counts over a profile's weighted deck searches,
+    with one entry per copy of each card."""
+
+    set_nums: np.ndarray
+    card_nums: np.ndarray
+    counts_in_deck: np.ndarray
+    play_counts: np.ndarray
+
+    @classmethod
+    def from_df(cls, df: pd.DataFrame) -> "WeightedPlayCounts":
+        """Constructor from a frame of play counts, as in DeckSearchHasCard."""
+        return cls(
+            set_nums=df["set_num"].to_numpy(dtype=np.int64),
+            card_nums=df["card_num"].to_numpy(dtype=np.int64),
+            counts_in_deck=df["count_in_deck"].to_numpy(dtype=np.int64),
+            play_counts=df["num_decks_with_count_or_less"].to_numpy(dtype=np.float64),
+        )
+
+
+def get_weighted_play_counts(profile=1) -> WeightedPlayCounts:
+    """Sums the play counts of the profile's weighted deck searches, times their
+    weights, in a single query."""
+    weighted_play_count = db.func.sum(
+        DeckSearchHasCard.num_decks_with_count_or_less * WeightedDeckSearch.weight
+    )
+    rows = (
+        db.session.query(
+            DeckSearchHasCard.set_num,
+            DeckSearchHasCard.card_num,
+            DeckSearchHasCard.count_in_deck,
+            weighted_play_count,
+        )
+        .join(
+            WeightedDeckSearch,
+            WeightedDeckSearch.deck_search_id == DeckSearchHasCard.decksearch_id,
+        )
+        .filter(WeightedDeckSearch.profile_id == profile)
+        .group_by(
+            DeckSearchHasCard.set_num,
+            DeckSearchHasCard.card_num,
+            DeckSearchHasCard.count_in_deck,
+        )
+        .all()
+    )
+
+    columns = list(zip(*rows)) if rows else [[], [], [], []]
+    return WeightedPlayCounts(
+        set_nums=np.array(columns[0], dtype=np.int64),
+        card_nums=np.array(columns[1], dtype=np.int64),
+        counts_in_deck=np.array(columns[2], dtype=np.int64),
+        play_counts=np.array(columns[3], dtype=np.float64),
+    )
+
+
+def get_play_counts_by_deck_search() -> t.Dict[int, WeightedPlayCounts]:
+    """Gets the unweighted play counts of every deck search, in a single query."""
+    query = """\
+        SELECT decksearch_id, set_num, card_num, count_in_deck,
+            num_decks_with_count_or_less
+        FROM deck_search_has_card"""
+    with contextlib.closing(db.engine.raw_connection()) as connection:
+        df = pd.read_sql_query(query, connection)
+    return {
+        deck_search_id: WeightedPlayCounts.from_df(search_df)
+        for deck_search_id, search_df in df.groupby("decksearch_id")
+    }
+
+
+class UserDeckSearchWeight(db.Model):
+    """A table of users' own weights for deck searches,
+    replacing the weights of the default profile."""
+
+    __tablename__ = "user_deck_search_weights"
+    user_id = db.Column(
+        "user_id", db.Integer, db.ForeignKey("users.id"), primary_key=True
+    )
+    deck_search_id = db.Column(
+        "deck_search_id",
+        db.Integer,
+        db.ForeignKey("deck_searches.id"),
+        primary_key=True,
+    )
+    weight = db.Column("weight", db.Float, nullable=False)
+
+
+def get_default_weights(profile=1) -> t.Dict[int, float]:
+    """Gets the weight of each deck search in the profile, by deck search id."""
+    return {
+        weighted.deck_search_id: weighted.weight
+        for weighted in get_weighted_deck_searches(profile)
+    }
+
+
+def get_weights_for_user(user) -> t.Optional[t.Dict[int, float]]:
+    """Gets the user's own weight for each deck search by deck search id,
+    or None if they use the default profile."""
+    if not user.is_authenticated:
+        return None
+    rows = UserDeckSearchWeight.query.filter_by(user_id=user.id).all()
+    if not rows:
+        return None
+    return {row.deck_search_id: row.weight for row in rows}
+
+
+def set_weights_for_user(user, weights: t.Dict[int, float]):
+    """Saves the user's own deck search weights, by deck search id,
+    replacing any previous weights."""
+    total_weight = sum(weights.values())
+    if total_weight <= 0:
+        raise ValueError("Deck search weights must have a positive total.")
+
+    UserDeckSearchWeight.query.filter_by(user_id=user.id).delete()
+    for deck_search_id, weight in weights.items():
+        db.session.add(
+            UserDeckSearchWeight(
+                user_id=user.id,
+                deck_search_id=deck_search_id,
+                weight=weight / total_weight,
+            )
+        )
+    db.session.commit()
+
+
 def _normalize_deck_search_weights(weighted_deck_searches: t.List[WeightedDeckSearch]):
     """Ensures that a user's saved weights are approximately normalized
     to 1.
@@ -2,6 +2,9 @@
 import logging
 import typing as t
 
+import numpy as np
+import pandas as pd
+
 from infiltrate import db
 
 
@@ -77,6 +80,27 @@ RARITIES: t.List[Rarity] = [COMMON, UNCOMMON, RARE, LEGENDARY, PROMO]
 
 rarity_from_name = {r.name: r for r in RARITIES}
 
+# Card frames store rarity as a categorical of names, whose codes index RARITIES
+#   and the per rarity arrays below.
+RARITY_DTYPE = pd.CategoricalDtype(categories=[r.name for r in RARITIES])
+
+NUMS_IN_PACK = np.array([r.num_in_pack for r in RARITIES])
+ENCHANTS = np.array([r.enchant for r in RARITIES])
+DISENCHANTS = np.array([r.disenchant for r in RARITIES])
+FOIL_ENCHANTS = np.array([r.foil_enchant for r in RARITIES])
+FOIL_DISENCHANTS = np.array([r.foil_disenchant for r in RARITIES])
+
+
+def get_codes(rarity_column: pd.Series) -> np.ndarray:
+    """Gets the index in RARITIES of each rarity in a column of rarity names.
+    Raises ValueError for names not in RARITIES."""
+    codes = rarity_column.astype(RARITY_DTYPE).cat.codes.to_numpy()
+    is_unknown = codes < 0
+    if is_unknown.any():
+        unknown_names = sorted(set(map(str, rarity_column[is_unknown])))
+        raise ValueError(f"Unknown rarities: {unknown_names}")
+    return codes
+
 
 def create_rarities():
     logging.info("Setting up rarities")
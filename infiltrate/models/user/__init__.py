@@ -3,6 +3,7 @@
 import sqlalchemy_utils
 from sqlalchemy_utils.types.encrypted.encrypted_type import FernetEngine
 import infiltrate.models.user.collection as collection
+import infiltrate.models.user.reward_profile as reward_profile
 from infiltrate import application, db
 from flask_login import UserMixin
 
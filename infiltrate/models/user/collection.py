@@ -1,6 +1,9 @@
 """The cards a user owns"""
 
+import re
 import typing as t
+from collections import defaultdict
+
 import pandas as pd
 
 import infiltrate.browsers as browsers
@@ -22,6 +25,21 @@ def get_collection_from_ew(user: "User") -> t.Dict[card.CardId, int]:
     return collection
 
 
+_IMPORT_LINE_PATTERN = re.compile(r"^\s*(\d+)\s+.*\(Set(\d+) #(\d+)\)")
+
+
+def get_collection_delta_from_import(card_import: str) -> t.Dict[card.CardId, int]:
+    """Gets the change in collection from text in the Eternal import format,
+    such as '4 Torch (Set1 #6)'. Lines that don't match are ignored."""
+    delta = defaultdict(int)
+    for line in card_import.splitlines():
+        match = _IMPORT_LINE_PATTERN.match(line)
+        if match:
+            count, set_num, card_num = (int(group) for group in match.groups())
+            delta[card.CardId(set_num=set_num, card_num=card_num)] += count
+    return delta
+
+
 def dataframe_for_user(user: "User") -> pd.DataFrame:  # todo, consider just using dict.
     collection_dict = get_collection_from_ew(user)
     rows = [
@@ -30,26 +48,3 @@ def dataframe_for_user(user: "User") -> pd.DataFrame:  # todo, consider just usi
     ]
     frame = pd.DataFrame(rows, columns=["set_num", "card_num", "count"])
     return frame
-
-
-def create_is_owned_series(
-    card_details: pd.DataFrame, ownership: pd.DataFrame
-) -> pd.Series:
-    """Makes a series matching the card copies in card_details for if that many copies
-    are owned."""
-    full_ownership = pd.concat(
-        [ownership.assign(count_in_deck=i) for i in range(1, 5)], axis=0
-    ).set_index(["set_num", "card_num", "count_in_deck"])
-
-    details_with_total_owned = card_details.join(full_ownership)
-
-    ownership_frame = details_with_total_owned[
-        ["set_num", "card_num", "count_in_deck"]
-    ].copy()
-
-    # noinspection PyTypeChecker
-    is_owned = (
-        details_with_total_owned["count_in_deck"] <= details_with_total_owned["count"]
-    )
-    ownership_frame.loc[:, "is_owned"] = is_owned
-    return ownership_frame
@@ -0,0 +1,65 @@
+"""How often a user plays, for estimating how likely they are to find cards"""
+import typing as t
+
+from infiltrate import db
+
+if t.TYPE_CHECKING:
+    import infiltrate.rewards as rewards
+    from infiltrate.models.user import User
+
+
+class RewardProfile(db.Model):
+    """A table of the rates at which users collect rewards.
+    Users without a row use the default rates."""
+
+    __tablename__ = "reward_profiles"
+    user_id = db.Column(
+        "user_id", db.Integer, db.ForeignKey("users.id"), primary_key=True
+    )
+    first_wins_per_week = db.Column("first_wins_per_week", db.Float, nullable=False)
+    drafts_per_week = db.Column("drafts_per_week", db.Float, nullable=False)
+    ranked_wins_per_day = db.Column("ranked_wins_per_day", db.Float, nullable=False)
+    unranked_wins_per_day = db.Column(
+        "unranked_wins_per_day", db.Float, nullable=False
+    )
+
+    def get_player_rewards(self) -> "rewards.PlayerRewards":
+        import infiltrate.rewards as rewards
+
+        return rewards.get_player_rewards(
+            first_wins_per_week=self.first_wins_per_week,
+            drafts_per_week=self.drafts_per_week,
+            ranked_wins_per_day=self.ranked_wins_per_day,
+            unranked_wins_per_day=self.unranked_wins_per_day,
+        )
+
+
+def get_player_rewards(user: "User") -> "rewards.PlayerRewards":
+    """Gets the rewards of the user's profile, or the default if they have none."""
+    import infiltrate.rewards as rewards
+
+    if not user.is_authenticated:
+        return rewards.DEFAULT_PLAYER_REWARD_RATE
+    profile = RewardProfile.query.filter_by(user_id=user.id).first()
+    if profile is None:
+        return rewards.DEFAULT_PLAYER_REWARD_RATE
+    return profile.get_player_rewards()
+
+
+def set_for_user(
+    user: "User",
+    first_wins_per_week: float,
+    drafts_per_week: float,
+    ranked_wins_per_day: float,
+    unranked_wins_per_day: float,
+):
+    """Saves the user's reward profile, replacing any previous one."""
+    profile = RewardProfile(
+        user_id=user.id,
+        first_wins_per_week=first_wins_per_week,
+        drafts_per_week=drafts_per_week,
+        ranked_wins_per_day=ranked_wins_per_day,
+        unranked_wins_per_day=unranked_wins_per_day,
+    )
+    db.session.merge(profile)
+    db.session.commit()
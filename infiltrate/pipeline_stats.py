@@ -0,0 +1,138 @@
+"""Timing, row counts and peak allocations of the stages of card evaluation.
+
+Each run of a stage is logged as a json line, and kept in a rolling window
+from which percentiles are served to the admin stats endpoint.
+
+Allocations are only tracked when TRACK_PIPELINE_MEMORY is set in the
+environment, as tracemalloc slows down everything while tracing."""
+import collections
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import typing as t
+
+import numpy as np
+
+TRACK_MEMORY = bool(os.environ.get("TRACK_PIPELINE_MEMORY"))
+WINDOW_SIZE = 1000
+PERCENTILES = (50, 90, 99)
+
+_logger = logging.getLogger(__name__)
+
+
+class StageRun:
+    """A single run of a stage. Set rows to record how many rows it produced."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: t.Optional[int] = None
+        self.seconds = 0.0
+        self.peak_bytes: t.Optional[int] = None
+
+        self._start_time = 0.0
+        self._start_bytes = 0
+        self._peak_so_far = 0
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        return {
+            "stage": self.name,
+            "seconds": round(self.seconds, 6),
+            "rows": self.rows,
+            "peak_bytes": self.peak_bytes,
+        }
+
+
+_runs_by_stage: t.Dict[str, t.Deque[StageRun]] = collections.defaultdict(
+    lambda: collections.deque(maxlen=WINDOW_SIZE)
+)
+_open_runs = threading.local()
+
+
+def _get_open_runs() -> t.List[StageRun]:
+    if not hasattr(_open_runs, "stack"):
+        _open_runs.stack = []
+    return _open_runs.stack
+
+
+def _is_tracking_memory() -> bool:
+    if TRACK_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return tracemalloc.is_tracing()
+
+
+@contextlib.contextmanager
+def stage(name: str) -> t.Iterator[StageRun]:
+    """Records the wall time and peak allocation of the enclosed code as a run of
+    the named stage.
+
+    Stages may be nested. Memory is traced for the whole process, so allocations
+    by concurrent requests are included.
+
+    Before Python 3.9, tracemalloc can't reset the peak, so each top level stage
+    clears the traces instead. The peaks of nested stages are then upper bounds,
+    including the peaks of earlier stages in the same top level stage."""
+    run = StageRun(name)
+    open_runs = _get_open_runs()
+    is_tracking_memory = _is_tracking_memory()
+
+    if is_tracking_memory:
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        if open_runs:
+            parent = open_runs[-1]
+            parent._peak_so_far = max(parent._peak_so_far, peak_bytes)
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        elif not open_runs:
+            tracemalloc.clear_traces()
+        run._start_bytes = tracemalloc.get_traced_memory()[0]
+    open_runs.append(run)
+    run._start_time = time.perf_counter()
+    try:
+        yield run
+    finally:
+        run.seconds = time.perf_counter() - run._start_time
+        open_runs.pop()
+        if is_tracking_memory:
+            peak_bytes = max(run._peak_so_far, tracemalloc.get_traced_memory()[1])
+            # Clearing by another thread's stage can leave less than at the start.
+            run.peak_bytes = max(peak_bytes - run._start_bytes, 0)
+            if open_runs:
+                parent = open_runs[-1]
+                parent._peak_so_far = max(parent._peak_so_far, peak_bytes)
+
+        _runs_by_stage[name].append(run)
+        _logger.info(json.dumps({"event": "pipeline_stage", **run.as_dict()}))
+
+
+def _get_percentiles(values: t.List[float]) -> t.Optional[t.Dict[str, float]]:
+    if not values:
+        return None
+    percentiles = np.percentile(values, PERCENTILES)
+    return {f"p{p}": float(value) for p, value in zip(PERCENTILES, percentiles)}
+
+
+def get_summary() -> t.Dict[str, t.Dict[str, t.Any]]:
+    """Gets percentiles of the recent runs of each stage."""
+    summary = {}
+    for name, runs in list(_runs_by_stage.items()):
+        runs = list(runs)
+        summary[name] = {
+            "count": len(runs),
+            "seconds": _get_percentiles([run.seconds for run in runs]),
+            "rows": _get_percentiles(
+                [run.rows for run in runs if run.rows is not None]
+            ),
+            "peak_bytes": _get_percentiles(
+                [run.peak_bytes for run in runs if run.peak_bytes is not None]
+            ),
+        }
+    return summary
+
+
+def clear():
+    """Forgets all recorded runs."""
+    _runs_by_stage.clear()
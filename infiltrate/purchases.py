@@ -1,13 +1,13 @@
 """Handles things that can be bought, such as packs, draft, and league."""
 import abc
 import collections
+import itertools
 import logging
 import typing as t
 
 import pandas as pd
 
 import infiltrate.card_evaluation as card_evaluation
-import infiltrate.dwd_news as dwd_news
 import infiltrate.models.card.draft as card_draft
 import infiltrate.models.card_set as models_card_set
 import infiltrate.models.rarity as rarity
@@ -15,6 +15,8 @@ import infiltrate.rewards as rewards
 from infiltrate.models.user import User
 
 PurchaseRow = t.Tuple[str, str, str, int, float, float]
+# A purchase's name, info link, and the expected card drops from its rewards.
+RewardRow = t.Tuple[str, str, rewards.SlotWeights]
 
 
 class PurchaseEvaluator(abc.ABC):
@@ -39,32 +41,54 @@ class PurchaseEvaluator(abc.ABC):
         return row
 
 
-class PackEvaluator(PurchaseEvaluator):
+class RewardPurchaseEvaluator(PurchaseEvaluator, abc.ABC):
+    """ABC for purchases valued by the cards of their rewards.
+
+    Rows are given as slot weights, so that the rows of all such purchases can
+    be valued together in one matrix product."""
+
+    def get_reward_rows(self) -> t.List[RewardRow]:
+        """Gets the name, info link and slot weights of each row."""
+        raise NotImplementedError
+
+    def get_df_rows(self) -> t.List[PurchaseRow]:
+        reward_rows = self.get_reward_rows()
+        matrix = rewards.RewardMatrix([weights for _, _, weights in reward_rows])
+        return self.make_df_rows(reward_rows, matrix.get_values(self.card_data))
+
+    def make_df_rows(
+        self, reward_rows: t.List[RewardRow], values: t.Iterable[float]
+    ) -> t.List[PurchaseRow]:
+        """Makes the dataframe rows of the reward rows, given their values."""
+        return [
+            self._make_row(name, info_link, value)
+            for (name, info_link, _), value in zip(reward_rows, values)
+        ]
+
+    def _get_value(self, weights: rewards.SlotWeights) -> float:
+        return rewards.RewardMatrix([weights]).get_values(self.card_data)[0]
+
+
+class PackEvaluator(RewardPurchaseEvaluator):
     """Evaluates all packs"""
 
     def __init__(self, card_data):
         super().__init__(card_data, cost=1_000, purchase_type="Card Pack")
 
-    def get_values(self) -> t.Dict[models_card_set.CardSet, int]:
-        values = {
-            card_set: card_pack.get_value(self.card_data)
-            for card_set, card_pack in rewards.CARD_PACKS.items()
-        }
+    def get_values(self) -> t.Dict[models_card_set.CardSet, float]:
+        card_packs = rewards.CARD_PACKS
+        matrix = rewards.RewardMatrix(
+            [card_pack.slot_weights for card_pack in card_packs.values()]
+        )
+        values = dict(zip(card_packs.keys(), matrix.get_values(self.card_data)))
         logging.info(f"Pack values: {values}")
         return values
 
-    def get_df_rows(self) -> t.List[PurchaseRow]:
-        pack_values = self.get_values()
-
-        rows = [
-            self._make_row(
-                name=card_set.name,
-                info_link=self._make_info_link(card_set),
-                value=pack_values[card_set],
-            )
-            for card_set in pack_values.keys()
+    def get_reward_rows(self) -> t.List[RewardRow]:
+        return [
+            (card_set.name, self._make_info_link(card_set), card_pack.slot_weights)
+            for card_set, card_pack in rewards.CARD_PACKS.items()
         ]
-        return rows
 
     def _make_info_link(self, card_set: models_card_set.CardSet) -> str:
         return f"https://eternalwarcry.com/cards?CardSet={card_set.set_num}"
@@ -109,7 +133,7 @@ class CampaignEvaluator(PurchaseEvaluator):
         return f"https://eternalwarcry.com/cards?CardSet={card_set.set_num}"
 
 
-class DraftEvaluator(PurchaseEvaluator, abc.ABC):
+class DraftEvaluator(RewardPurchaseEvaluator, abc.ABC):
     """ABC for evaluating drafts."""
 
     BASE_COST = 5_000
@@ -121,12 +145,11 @@ class DraftEvaluator(PurchaseEvaluator, abc.ABC):
             purchase_type="Draft",
         )
 
-    def _get_packs_value(self):
+    def _get_packs_slot_weights(self) -> rewards.SlotWeights:
         newest_set = models_card_set.get_newest_main_set()
-        newest_pack_value = rewards.CARD_PACKS[newest_set].get_value(self.card_data)
-        draft_pack_value = rewards.DRAFT_PACK.get_value(self.card_data)
-        value = 2 * newest_pack_value + 2 * draft_pack_value
-        return value
+        return rewards.get_slot_weights(
+            [(rewards.CARD_PACKS[newest_set], 2), (rewards.DRAFT_PACK, 2)]
+        )
 
     def _get_win_chances_and_rewards(
         self,
@@ -174,23 +197,22 @@ class LoseAllGamesDraftEvaluator(DraftEvaluator):
         super().__init__(card_data, no_wins_gold)
 
     def get_values(self) -> float:
-        packs_value = self._get_packs_value()
-        no_wins_value = self._get_no_wins_value()
-        value = packs_value + no_wins_value
+        value = self._get_value(self._get_slot_weights())
         logging.info(f"Lose all games draft value: {value}")
         return value
 
-    def get_df_rows(self) -> t.List[PurchaseRow]:
-        draft_value = self.get_values()
+    def get_reward_rows(self) -> t.List[RewardRow]:
         return [
-            self._make_row(
-                "No Wins", card_draft.get_draft_pack_root_url(), draft_value,
-            )
+            ("No Wins", card_draft.get_draft_pack_root_url(), self._get_slot_weights())
         ]
 
-    def _get_no_wins_value(self):
+    def _get_slot_weights(self) -> rewards.SlotWeights:
+        weights = self._get_packs_slot_weights()
         _, no_win_reward = list(self._get_win_chances_and_rewards())[0]
-        return sum([reward.get_value(self.card_data) for reward in no_win_reward])
+        rewards.add_slot_weights(
+            weights, rewards.get_slot_weights((reward, 1) for reward in no_win_reward)
+        )
+        return weights
 
     def _get_no_wins_gold(self):
         _, no_win_reward = list(self._get_win_chances_and_rewards())[0]
@@ -205,24 +227,19 @@ class AverageDraftEvaluator(DraftEvaluator):
         super().__init__(card_data, average_win_gold)
 
     def get_values(self) -> float:
-        packs_value = self._get_packs_value()
-        logging.info(f"Average draft packs value: {packs_value}")
-        average_wins_value = self._get_average_wins_value()
-        logging.info(f"Average draft average wins value: {average_wins_value}")
-
-        value = packs_value + average_wins_value
+        value = self._get_value(self._get_slot_weights())
         logging.info(f"Average draft value: {value}")
         return value
 
-    def _get_average_wins_value(self) -> float:
-        average_win_value = 0
-        for chance, win_rewards in self._get_win_chances_and_rewards():
-            win_value = sum(
-                [reward.get_value(self.card_data) for reward in win_rewards]
-            )
-
-            average_win_value += win_value * chance
-        return average_win_value
+    def _get_slot_weights(self) -> rewards.SlotWeights:
+        weights = self._get_packs_slot_weights()
+        average_win_weights = rewards.get_slot_weights(
+            (reward, chance)
+            for chance, win_rewards in self._get_win_chances_and_rewards()
+            for reward in win_rewards
+        )
+        rewards.add_slot_weights(weights, average_win_weights)
+        return weights
 
     def _get_average_win_gold(self) -> float:
         average_win_gold = 0
@@ -231,41 +248,39 @@ class AverageDraftEvaluator(DraftEvaluator):
             average_win_gold += win_gold * chance
         return average_win_gold
 
-    def get_df_rows(self) -> t.List[PurchaseRow]:
-        draft_value = self.get_values()
+    def get_reward_rows(self) -> t.List[RewardRow]:
         return [
-            self._make_row(
-                "Average Draft", card_draft.get_draft_pack_root_url(), draft_value,
+            (
+                "Average Draft",
+                card_draft.get_draft_pack_root_url(),
+                self._get_slot_weights(),
             )
         ]
 
 
-class LeagueEvaluator(PurchaseEvaluator, abc.ABC):
+class LeagueEvaluator(RewardPurchaseEvaluator, abc.ABC):
     """ABC for league purchases."""
 
     def __init__(self, card_data):
         super().__init__(card_data, cost=12_500, purchase_type="League")
 
-    def get_league_packs_value(self) -> float:
-        pack_counts = get_league_packs()
-
-        pack_values = PackEvaluator(self.card_data).get_values()
-
-        total_value = 0
-        for pack, count in pack_counts.items():
-            count = pack_counts[pack]
-            value_per_pack = pack_values.get(pack, 0)
-            total_value += count * value_per_pack
-
-        return total_value
+    def get_league_packs_slot_weights(self) -> rewards.SlotWeights:
+        return rewards.get_slot_weights(
+            (rewards.CARD_PACKS[pack], count)
+            for pack, count in get_league_packs().items()
+            if pack in rewards.CARD_PACKS
+        )
 
 
 class FirstLeagueEvaluator(LeagueEvaluator):
     """Evaluates the first league of a given month."""
 
     def get_value(self):
-        packs_value = self.get_league_packs_value()
+        value = self._get_value(self.get_slot_weights())
+        logging.info(f"First league value: {value}")
+        return value
 
+    def get_slot_weights(self) -> rewards.SlotWeights:
         # Win rewards
         """
 #wins      chance      Ranks
@@ -315,7 +330,6 @@ Top 1000 has been at 21 wins, top 500 at 25 wins and top 100 at 30 wins
         36 - 2e-07
         """
 
-        average_win_value = 0
         chances_of_rank = [
             4.4e-06,
             1.95e-05,
@@ -325,136 +339,43 @@ Top 1000 has been at 21 wins, top 500 at 25 wins and top 100 at 30 wins
             0.3602328,
             0.5627655,
         ]
+        packs_and_premium_rarities_of_rank = [
+            (20, rarity.LEGENDARY),
+            (17, rarity.LEGENDARY),
+            (15, rarity.LEGENDARY),
+            (13, rarity.LEGENDARY),
+            (12, rarity.RARE),
+            (9, rarity.RARE),
+            (8, rarity.RARE),
+        ]
 
-        rewards_of_rank = [
-            20
-            * [
-                rewards.Reward(
-                    card_classes=rewards.get_pack_contents_for_sets(
-                        [models_card_set.get_newest_main_set()]
-                    )
-                )
-            ]
-            + [
-                rewards.Reward(
-                    card_classes=[
-                        rewards.CardClass(rarity=rarity.LEGENDARY, is_premium=True)
-                    ]
-                )
-            ],
-            17
-            * [
-                rewards.Reward(
-                    card_classes=rewards.get_pack_contents_for_sets(
-                        [models_card_set.get_newest_main_set()]
-                    )
-                )
-            ]
-            + [
-                rewards.Reward(
-                    card_classes=[
-                        rewards.CardClass(rarity=rarity.LEGENDARY, is_premium=True)
-                    ]
-                )
-            ],
-            15
-            * [
-                rewards.Reward(
-                    card_classes=rewards.get_pack_contents_for_sets(
-                        [models_card_set.get_newest_main_set()]
-                    )
-                )
-            ]
-            + [
-                rewards.Reward(
-                    card_classes=[
-                        rewards.CardClass(rarity=rarity.LEGENDARY, is_premium=True)
-                    ]
-                )
-            ],
-            13
-            * [
-                rewards.Reward(
-                    card_classes=rewards.get_pack_contents_for_sets(
-                        [models_card_set.get_newest_main_set()]
-                    )
-                )
-            ]
-            + [
-                rewards.Reward(
-                    card_classes=[
-                        rewards.CardClass(rarity=rarity.LEGENDARY, is_premium=True)
-                    ]
-                )
-            ],
-            12
-            * [
-                rewards.Reward(
-                    card_classes=rewards.get_pack_contents_for_sets(
-                        [models_card_set.get_newest_main_set()]
-                    )
-                )
-            ]
-            + [
-                rewards.Reward(
-                    card_classes=[
-                        rewards.CardClass(rarity=rarity.RARE, is_premium=True)
-                    ]
-                )
-            ],
-            9
-            * [
-                rewards.Reward(
-                    card_classes=rewards.get_pack_contents_for_sets(
-                        [models_card_set.get_newest_main_set()]
-                    )
-                )
-            ]
-            + [
-                rewards.Reward(
-                    card_classes=[
-                        rewards.CardClass(rarity=rarity.RARE, is_premium=True)
-                    ]
-                )
-            ],
-            8
-            * [
-                rewards.Reward(
-                    card_classes=rewards.get_pack_contents_for_sets(
-                        [models_card_set.get_newest_main_set()]
-                    )
-                )
+        newest_pack = rewards.Reward(
+            card_classes=rewards.get_pack_contents_for_sets(
+                [models_card_set.get_newest_main_set()]
+            )
+        )
+        rewards_with_counts = []
+        for chance, (num_packs, premium_rarity) in zip(
+            chances_of_rank, packs_and_premium_rarities_of_rank
+        ):
+            premium_card = rewards.Reward(
+                card_classes=[rewards.CardClass(rarity=premium_rarity, is_premium=True)]
+            )
+            rewards_with_counts += [
+                (newest_pack, chance * num_packs),
+                (premium_card, chance),
             ]
-            + [
-                rewards.Reward(
-                    card_classes=[
-                        rewards.CardClass(rarity=rarity.RARE, is_premium=True)
-                    ]
-                )
-            ],
-        ]
 
-        for win_num in range(len(rewards_of_rank)):
-            chance = chances_of_rank[win_num]
-            win_rewards = rewards_of_rank[win_num]
-            win_value = 0
-            for reward in win_rewards:
-                reward_value = reward.get_value(self.card_data)
-                win_value += reward_value
-            weighted_win_value = chance * win_value
-            average_win_value += weighted_win_value
-
-        value = packs_value + average_win_value
-        logging.info(f"First league value: {value}")
-        return value
+        weights = self.get_league_packs_slot_weights()
+        rewards.add_slot_weights(weights, rewards.get_slot_weights(rewards_with_counts))
+        return weights
 
-    def get_df_rows(self):
-        first_league_value = self.get_value()
+    def get_reward_rows(self) -> t.List[RewardRow]:
         return [
-            self._make_row(
+            (
                 "First of the Month",
-                dwd_news.get_most_recent_league_article_url(),
-                first_league_value,
+                models_card_set.get_league_article_url(),
+                self.get_slot_weights(),
             )
         ]
 
@@ -463,17 +384,16 @@ class AdditionalLeagueEvaluator(LeagueEvaluator):
     """Evaluates any league in a month after the first."""
 
     def get_value(self):
-        value = self.get_league_packs_value()
+        value = self._get_value(self.get_league_packs_slot_weights())
         logging.info(f"Additional league value: {value}")
         return value
 
-    def get_df_rows(self):
-        additional_league_value = self.get_value()
+    def get_reward_rows(self) -> t.List[RewardRow]:
         return [
-            self._make_row(
+            (
                 "Additional in the Month",
-                dwd_news.get_most_recent_league_article_url(),
-                additional_league_value,
+                models_card_set.get_league_article_url(),
+                self.get_league_packs_slot_weights(),
             )
         ]
 
@@ -512,9 +432,24 @@ class _PurchasesValueDataframeGetter:
         """Gets a dataframe of all purchase options
         with values based on card values."""
         columns = ["type", "name", "info_url", "gold_cost", "value", "value_per_gold"]
+        reward_rows = {
+            purchase_evaluator: purchase_evaluator.get_reward_rows()
+            for purchase_evaluator in self.purchase_evaluators
+            if isinstance(purchase_evaluator, RewardPurchaseEvaluator)
+        }
+        matrix = rewards.RewardMatrix(
+            [weights for rows in reward_rows.values() for _, _, weights in rows]
+        )
+        reward_values = iter(matrix.get_values(self.card_data))
+
         df_constructor = []
         for purchase_evaluator in self.purchase_evaluators:
-            df_constructor += purchase_evaluator.get_df_rows()
+            if purchase_evaluator in reward_rows:
+                rows = reward_rows[purchase_evaluator]
+                values = itertools.islice(reward_values, len(rows))
+                df_constructor += purchase_evaluator.make_df_rows(rows, values)
+            else:
+                df_constructor += purchase_evaluator.get_df_rows()
 
         values_df = pd.DataFrame(df_constructor, columns=columns)
         return values_df
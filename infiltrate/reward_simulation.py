@@ -0,0 +1,264 @@
+"""Monte Carlo simulation of opening rewards, for the spread of their values
+rather than only the expected value given by Reward.get_value.
+
+Openings are drawn in batches of NumPy arrays, so millions of openings take
+seconds, and batches may be spread across a process pool.
+Each batch has its own seed spawned from the simulation's seed, so results
+depend only on the seed and not on the number of processes."""
+import concurrent.futures
+import dataclasses
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+import infiltrate.models.card_set as card_sets
+import infiltrate.rewards as rewards
+
+if t.TYPE_CHECKING:
+    import infiltrate.card_evaluation as card_evaluation
+
+COPIES_PER_CARD = 4
+BATCH_SIZE = 100_000
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@dataclasses.dataclass
+class DropSlot:
+    """Drops of one card class in an opening.
+
+    Each drop picks one of the pools uniformly, then a card of that pool uniformly.
+    The drop appears with the given chance, for fractional amounts."""
+
+    pool_starts: np.ndarray
+    pool_sizes: np.ndarray
+    num_drops: int
+    chance: float = 1.0
+
+
+@dataclasses.dataclass
+class CompiledReward:
+    """A reward and a user's ownership as plain arrays, cheap to send to workers.
+
+    drop_values[card, n] is the value of finding n more copies of the card before
+    this one, so duplicates found in the same opening are worth their next copy."""
+
+    drop_values: np.ndarray
+    pool_cards: np.ndarray
+    slots: t.List[DropSlot]
+
+
+class RewardSimulator:
+    """Opens rewards against the ownership and values of one card evaluation.
+
+    Drops are valued as in rewards.RewardValueIndex, at the own value of the
+    next unowned copy, or the resell value once all copies are owned.
+    Gold and shiftstone are not counted, matching Reward.get_value."""
+
+    def __init__(self, card_data: "card_evaluation.OwnValueFrame"):
+        card_ids = pd.MultiIndex.from_arrays(
+            [np.asarray(card_data["set_num"]), np.asarray(card_data["card_num"])]
+        )
+        card_codes, unique_ids = pd.factorize(card_ids)
+        num_cards = len(unique_ids)
+        copy_indices = np.asarray(card_data["count_in_deck"]) - 1
+
+        own_values = np.zeros((num_cards, COPIES_PER_CARD))
+        own_values[card_codes, copy_indices] = np.asarray(card_data["own_value"])
+        resell_values = np.zeros(num_cards)
+        resell_values[card_codes] = np.asarray(card_data["resell_value"])
+        is_owned = np.asarray(card_data["is_owned"] == True)
+        num_owned = np.bincount(card_codes[is_owned], minlength=num_cards)
+
+        copy_numbers = num_owned[:, np.newaxis] + np.arange(COPIES_PER_CARD + 1)
+        self._drop_values = np.where(
+            copy_numbers < COPIES_PER_CARD,
+            np.take_along_axis(
+                own_values, copy_numbers.clip(max=COPIES_PER_CARD - 1), axis=1
+            ),
+            resell_values[:, np.newaxis],
+        )
+
+        first_rows = np.unique(card_codes, return_index=True)[1]
+        set_nums = unique_ids.get_level_values(0).to_numpy()
+        rarity_names = np.asarray(card_data["rarity"], dtype=object)[first_rows]
+        is_in_draft_pack = np.asarray(card_data["is_in_draft_pack"] == True)[first_rows]
+
+        draft_cards = np.flatnonzero(is_in_draft_pack)
+        pool_members = pd.DataFrame(
+            {
+                "pool": list(set_nums) + [rewards.DRAFT_POOL] * len(draft_cards),
+                "rarity": np.concatenate([rarity_names, rarity_names[draft_cards]]),
+                "card": np.concatenate([np.arange(num_cards), draft_cards]),
+            }
+        )
+        members_by_pool = pool_members.groupby(["pool", "rarity"], sort=False).indices
+
+        pool_cards = [
+            pool_members["card"].to_numpy()[members]
+            for members in members_by_pool.values()
+        ]
+        pool_sizes = [len(cards) for cards in pool_cards]
+        pool_starts = np.cumsum([0] + pool_sizes[:-1])
+        self._pool_cards = (
+            np.concatenate(pool_cards) if pool_cards else np.zeros(0, dtype=int)
+        )
+        self._pools = {
+            key: (start, size)
+            for key, start, size in zip(members_by_pool.keys(), pool_starts, pool_sizes)
+        }
+
+    def compile(self, reward: rewards.Reward) -> CompiledReward:
+        """Compiles the card classes of the reward into slots of pools."""
+        slots = []
+        for card_class_amount in reward.card_class_amounts:
+            slots += self._compile_card_class_amount(card_class_amount)
+        return CompiledReward(self._drop_values, self._pool_cards, slots)
+
+    def _compile_card_class_amount(
+        self, card_class_amount: rewards.CardClassWithAmount
+    ) -> t.List[DropSlot]:
+        card_class = card_class_amount.card_class
+        if isinstance(card_class, rewards.DraftPackCardClass):
+            pool_set_nums = [rewards.DRAFT_POOL]
+        else:
+            pool_set_nums = card_sets.get_set_nums_from_sets(card_class.sets)
+        pools = [
+            self._pools.get((set_num, card_class.rarity.name), (0, 0))
+            for set_num in pool_set_nums
+        ]
+        pool_starts = np.array([start for start, _ in pools], dtype=int)
+        pool_sizes = np.array([size for _, size in pools], dtype=int)
+
+        amount = card_class_amount.amount
+        num_drops = int(amount)
+        chance = amount - num_drops
+
+        slots = []
+        if num_drops > 0:
+            slots.append(DropSlot(pool_starts, pool_sizes, num_drops))
+        if chance > 0:
+            slots.append(DropSlot(pool_starts, pool_sizes, 1, chance))
+        return slots
+
+    def simulate(
+        self,
+        reward: rewards.Reward,
+        num_trials: int,
+        openings_per_trial: int = 1,
+        seed: t.Optional[int] = None,
+        processes: t.Optional[int] = None,
+    ) -> "SimulationResult":
+        """Opens the reward openings_per_trial times in each trial, and values the
+        drops of each trial. Duplicates within a trial are valued as further copies.
+
+        With processes, batches of trials are spread over a process pool."""
+        return simulate(
+            self.compile(reward), num_trials, openings_per_trial, seed, processes
+        )
+
+
+class SimulationResult:
+    """The values of each trial of a simulation."""
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+
+    @property
+    def mean(self) -> float:
+        return float(np.mean(self.values))
+
+    @property
+    def std(self) -> float:
+        return float(np.std(self.values))
+
+    def get_percentiles(
+        self, percentiles: t.Sequence[float] = DEFAULT_PERCENTILES
+    ) -> t.Dict[str, float]:
+        values = np.percentile(self.values, percentiles)
+        return {f"p{p}": float(value) for p, value in zip(percentiles, values)}
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        return {
+            "num_trials": len(self.values),
+            "mean": self.mean,
+            "std": self.std,
+            **self.get_percentiles(),
+        }
+
+
+def simulate(
+    compiled_reward: CompiledReward,
+    num_trials: int,
+    openings_per_trial: int = 1,
+    seed: t.Optional[int] = None,
+    processes: t.Optional[int] = None,
+) -> SimulationResult:
+    """Simulates trials of a compiled reward in batches, see RewardSimulator.simulate."""
+    batch_sizes = [BATCH_SIZE] * (num_trials // BATCH_SIZE)
+    if num_trials % BATCH_SIZE:
+        batch_sizes.append(num_trials % BATCH_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    batches = [
+        (compiled_reward, batch_size, openings_per_trial, batch_seed)
+        for batch_size, batch_seed in zip(batch_sizes, seeds)
+    ]
+
+    if processes and len(batches) > 1:
+        with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+            values = list(executor.map(_simulate_batch, *zip(*batches)))
+    else:
+        values = [_simulate_batch(*batch) for batch in batches]
+    return SimulationResult(np.concatenate(values) if values else np.zeros(0))
+
+
+def _simulate_batch(
+    compiled_reward: CompiledReward,
+    num_trials: int,
+    openings_per_trial: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    drawn_cards = [
+        _draw_cards(rng, compiled_reward.pool_cards, slot, num_trials)
+        for _ in range(openings_per_trial)
+        for slot in compiled_reward.slots
+    ]
+    if not drawn_cards:
+        return np.zeros(num_trials)
+    drawn_cards = np.concatenate(drawn_cards, axis=1)
+
+    drawn_cards.sort(axis=1)
+    num_drops = drawn_cards.shape[1]
+    positions = np.arange(num_drops)
+    is_first_of_card = np.ones(drawn_cards.shape, dtype=bool)
+    is_first_of_card[:, 1:] = drawn_cards[:, 1:] != drawn_cards[:, :-1]
+    first_positions = np.maximum.accumulate(
+        np.where(is_first_of_card, positions, 0), axis=1
+    )
+    num_found_before = (positions - first_positions).clip(max=COPIES_PER_CARD)
+
+    is_found = drawn_cards >= 0
+    values = (
+        compiled_reward.drop_values[drawn_cards.clip(min=0), num_found_before]
+        * is_found
+    )
+    return values.sum(axis=1)
+
+
+def _draw_cards(
+    rng: np.random.Generator, pool_cards: np.ndarray, slot: DropSlot, num_trials: int
+) -> np.ndarray:
+    """Draws the cards of a slot in each trial, or -1 for no card."""
+    shape = (num_trials, slot.num_drops)
+    pool_choices = rng.integers(len(slot.pool_sizes), size=shape)
+    pool_sizes = slot.pool_sizes[pool_choices]
+    offsets = (rng.random(shape) * pool_sizes).astype(int)
+    cards = pool_cards[
+        (slot.pool_starts[pool_choices] + offsets).clip(max=len(pool_cards) - 1)
+    ]
+
+    is_dropped = pool_sizes > 0
+    if slot.chance < 1:
+        is_dropped &= rng.random(shape) < slot.chance
+    return np.where(is_dropped, cards, -1)
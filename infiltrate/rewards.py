@@ -1,11 +1,12 @@
 import collections
-import functools
 import typing as t
 
 import numpy as np
+import pandas as pd
+from boltons.cacheutils import LRU
 
-import infiltrate.caches as caches
 import infiltrate.models.card as card
+import infiltrate.models.card.pool_size as pool_size
 import infiltrate.models.card_set as card_sets
 import infiltrate.models.rarity as rarities
 
@@ -13,6 +14,26 @@ if t.TYPE_CHECKING:
     import infiltrate.card_evaluation as card_evaluation
 
 DAYS_IN_WEEK = 7
+DRAFT_POOL = "DRAFT"
+
+
+class RewardSlot(t.NamedTuple):
+    """A pool that a card drop comes from. The pool is a set num, or DRAFT_POOL
+    for the cards of draft packs."""
+
+    pool: t.Union[int, str]
+    rarity_name: str
+    is_premium: bool
+
+
+# The expected number of drops from each slot.
+SlotWeights = t.Dict[RewardSlot, float]
+
+
+def add_slot_weights(total: SlotWeights, weights: SlotWeights, scale: float = 1):
+    """Adds the scaled weights to the total, in place."""
+    for slot, weight in weights.items():
+        total[slot] = total.get(slot, 0) + scale * weight
 
 
 class CardClass:
@@ -33,21 +54,10 @@ class CardClass:
         self.is_premium = is_premium
 
     @property
-    @functools.lru_cache(maxsize=1)
-    def num_cards(self) -> int:  # todo cache this
+    def num_cards(self) -> int:
         """The total number of cards in the pool."""
-        session = card.db.session
-
-        sets = self.sets
-
-        set_nums = card_sets.get_set_nums_from_sets(sets)
-        count = (
-            session.query(card.Card)
-            .filter(card.Card.set_num.in_(set_nums))
-            .filter(card.Card.rarity == self.rarity.name)
-            .count()
-        )
-        return count
+        set_nums = card_sets.get_set_nums_from_sets(self.sets)
+        return pool_size.get_pool_sizes().get_num_cards(set_nums, self.rarity)
 
     def __eq__(self, other):
         is_equal = (
@@ -70,45 +80,101 @@ class CardClass:
         avg_set_value = sum(set_values) / len(set_values)
         return avg_set_value
 
+    def get_slot_weights(self, amount: float = 1) -> SlotWeights:
+        """The expected drops from each slot, for the amount of drops from the pool.
+        Drops are split evenly between the sets of the pool."""
+        set_nums = card_sets.get_set_nums_from_sets(self.sets)
+        return {
+            RewardSlot(set_num, self.rarity.name, self.is_premium): amount
+            / len(set_nums)
+            for set_num in set_nums
+        }
+
     def _get_value_for_set(self, card_data, card_set: card_sets.CardSet) -> float:
-        return _get_value_for_set_and_rarity(card_data, card_set, self.rarity)
+        reward_value_index = get_reward_value_index(card_data)
+        return reward_value_index.get_value_for_set_and_rarity(card_set, self.rarity)
 
     def __str__(self):
         return f"{tuple(self.sets)} {self.rarity}, premium {self.is_premium}"
 
 
-@functools.lru_cache(maxsize=200)
-def _get_value_for_set_and_rarity(
-    card_data: "card_evaluation.OwnValueFrame",
-    card_set: card_sets.CardSet,
-    rarity: rarities.Rarity,
-) -> float:
-    cards_in_set_and_rarity = card_data[
-        np.logical_and(
-            card_data["set_num"] == card_set.set_num, card_data["rarity"] == rarity,
+class RewardValueIndex:
+    """The average value of a card drop from each pool of cards, for the cards of
+    one evaluation.
+
+    Pools are the cards of a set and rarity, or the cards of a rarity in draft
+    packs. A drop is worth the own value of its next unowned copy, or the resell
+    value of a copy if all four are owned.
+    Every pool is valued in one grouped pass, so valuing a card class is a lookup
+    rather than a scan of all cards."""
+
+    def __init__(self, card_data: "card_evaluation.OwnValueFrame"):
+        is_owned = np.asarray(card_data["is_owned"] == True)
+        card_ids = pd.DataFrame(
+            {
+                "set_num": np.asarray(card_data["set_num"]),
+                "card_num": np.asarray(card_data["card_num"]),
+            }
+        )
+        unowned_rows = np.flatnonzero(~is_owned)
+        is_first_unowned = ~card_ids.iloc[unowned_rows].duplicated().to_numpy()
+        is_next_unowned_copy = np.zeros(len(card_ids), dtype=bool)
+        is_next_unowned_copy[unowned_rows[is_first_unowned]] = True
+        is_fully_owned = is_owned & (np.asarray(card_data["count_in_deck"]) == 4)
+
+        drop_values = pd.DataFrame(
+            {
+                "set_num": card_ids["set_num"],
+                "rarity": np.asarray(card_data["rarity"], dtype=object),
+                "is_in_draft_pack": np.asarray(card_data["is_in_draft_pack"] == True),
+                "value": np.where(
+                    is_next_unowned_copy, np.asarray(card_data["own_value"]), 0
+                )
+                + np.where(is_fully_owned, np.asarray(card_data["resell_value"]), 0),
+            }
         )
-    ]
 
-    value = get_value(cards_in_set_and_rarity)
-    return value
+        self._set_and_rarity_values = self._get_pool_values(
+            drop_values, ["set_num", "rarity"]
+        )
+        self._draft_pack_values = self._get_pool_values(
+            drop_values[drop_values["is_in_draft_pack"]], "rarity"
+        )
 
+    @staticmethod
+    def _get_pool_values(drop_values: pd.DataFrame, pool_keys) -> t.Dict:
+        """Gets the average drop value of each pool, by pool key."""
+        pools = drop_values.groupby(pool_keys)["value"].agg(["sum", "size"])
+        pool_values = pools["sum"] / (pools["size"] / 4)
+        return pool_values.to_dict()
 
-def get_value(card_pool):  # called many times and slow
-    is_owned = card_pool["is_owned"] == True
-    unowned_cards = card_pool[~is_owned]
-    findable_copies = unowned_cards.drop_duplicates(["set_num", "card_num"])
-    unowned_value = sum(findable_copies["own_value"])
+    def get_value_for_set_and_rarity(
+        self, card_set: card_sets.CardSet, rarity: rarities.Rarity
+    ) -> float:
+        return self._set_and_rarity_values.get((card_set.set_num, rarity.name), 0)
 
-    fully_owned_cards = card_pool[
-        np.logical_and(is_owned, card_pool["count_in_deck"] == 4)
-    ]
-    owned_value = sum(fully_owned_cards["resell_value"])
+    def get_value_for_draft_pack_rarity(self, rarity: rarities.Rarity) -> float:
+        return self._draft_pack_values.get(rarity.name, 0)
+
+    def get_slot_values(self, slots: t.Iterable[RewardSlot]) -> np.ndarray:
+        """Gets the average drop value of each slot.
+        Premium drops are valued as regular drops."""
+        return np.array([self._get_slot_value(slot) for slot in slots], dtype=float)
 
-    try:
-        average_value = (owned_value + unowned_value) / (len(card_pool) / 4)
-        return average_value
-    except ZeroDivisionError:
-        return 0
+    def _get_slot_value(self, slot: RewardSlot) -> float:
+        if slot.pool == DRAFT_POOL:
+            return self._draft_pack_values.get(slot.rarity_name, 0)
+        return self._set_and_rarity_values.get((slot.pool, slot.rarity_name), 0)
+
+
+def get_reward_value_index(card_data) -> RewardValueIndex:
+    """Gets the reward value index of the card data, built on first use and kept
+    with the card data."""
+    reward_value_index = getattr(card_data, "_reward_value_index", None)
+    if reward_value_index is None:
+        reward_value_index = RewardValueIndex(card_data)
+        card_data._reward_value_index = reward_value_index
+    return reward_value_index
 
 
 class DraftPackCardClass(CardClass):
@@ -116,21 +182,12 @@ class DraftPackCardClass(CardClass):
 
     def __init__(self, rarity: rarities.Rarity):
         super().__init__(rarity, None, False)
-        self.sets = ["DRAFT"]
+        self.sets = [DRAFT_POOL]
 
     @property
-    @functools.lru_cache(maxsize=1)
     def num_cards(self) -> int:
         """The total number of cards in the pool."""
-        session = card.db.session
-
-        count = (
-            session.query(card.Card)
-            .filter(card.Card.is_in_draft_pack is True)
-            .filter(card.Card.rarity == self.rarity)
-            .count()
-        )  # Check that the rarity equality is correct
-        return count
+        return pool_size.get_pool_sizes().get_num_draft_pack_cards(self.rarity)
 
     def __eq__(self, other):
         is_equal = (
@@ -145,14 +202,11 @@ class DraftPackCardClass(CardClass):
         return hash_value
 
     def get_value(self, card_data) -> float:
-        cards_in_draft_pack_and_rarity = card_data[
-            np.logical_and(
-                card_data["is_in_draft_pack"] == True,
-                card_data["rarity"] == self.rarity,
-            )
-        ]
-        value = get_value(cards_in_draft_pack_and_rarity)
-        return value
+        reward_value_index = get_reward_value_index(card_data)
+        return reward_value_index.get_value_for_draft_pack_rarity(self.rarity)
+
+    def get_slot_weights(self, amount: float = 1) -> SlotWeights:
+        return {RewardSlot(DRAFT_POOL, self.rarity.name, self.is_premium): amount}
 
 
 class CardClassWithAmount:
@@ -184,6 +238,8 @@ class CardClassWithAmountPerWeek:
         """The probability of a specific card from the pool being found
          in a week."""
         num_cards = self.card_class.num_cards
+        if num_cards == 0:
+            return 0
         one_chance = 1 / num_cards
 
         chance_of_none = (1 - one_chance) ** self.amount_per_week
@@ -191,7 +247,10 @@ class CardClassWithAmountPerWeek:
         return chance_of_at_least_one
 
 
-class PlayerRewards:  # TODO Make into model to persist
+class PlayerRewards:
+    """How often a player plays, and the rewards they find from it.
+    Persisted per user by models.user.reward_profile."""
+
     def __init__(
         self,
         first_wins_per_week,
@@ -210,6 +269,19 @@ class PlayerRewards:  # TODO Make into model to persist
         self.card_classes_with_amounts_per_week = (
             self.get_card_classes_with_amounts_per_week()
         )
+        self._findability_table: t.Optional[FindabilityTable] = None
+        self._findability_table_version: t.Optional[int] = None
+
+    @property
+    def content_key(self) -> t.Tuple[float, float, float, float]:
+        """The values defining the rewards. Players with equal keys find cards
+        at the same rates."""
+        return (
+            float(self.first_wins_per_week),
+            float(self.drafts_per_week),
+            float(self.ranked_wins_per_day),
+            float(self.unranked_wins_per_day),
+        )
 
     def get_rewards_per_week(self):
         """Get the rewards the player will find in a week on avg."""
@@ -261,24 +333,75 @@ class PlayerRewards:  # TODO Make into model to persist
 
         return card_classes_with_amounts_per_week
 
-    @caches.mem_cache.cache(f"player_rewards_findabilities", expires=120)
+    @property
+    def findability_table(self) -> "FindabilityTable":
+        """The chance of finding a specific card in a week for each rarity and set.
+        Built on first use, and again after the cards are updated,
+        as the chances depend on the number of cards in each pool."""
+        cards_version = card.get_cards_version()
+        if (
+            self._findability_table is None
+            or self._findability_table_version != cards_version
+        ):
+            self._findability_table = FindabilityTable(
+                self.card_classes_with_amounts_per_week
+            )
+            self._findability_table_version = cards_version
+        return self._findability_table
+
     def get_chance_of_specific_card_drop_in_a_week(
         self, rarity: rarities.Rarity, card_set: card_sets.CardSet
     ):
-        chances = []
-        for card_class_with_amount in self.card_classes_with_amounts_per_week:
-            rarity_match = rarity == card_class_with_amount.card_class.rarity
+        chance = self.findability_table.get(
+            rarity_indices=np.array([rarities.RARITIES.index(rarity)]),
+            set_nums=np.array([card_set.set_num]),
+        )[0]
+        return chance
 
-            set_nums = card_sets.get_set_nums_from_sets(
-                card_class_with_amount.card_class.sets
+
+class FindabilityTable:
+    """A matrix of the chance of finding a specific card in a week,
+    indexed by rarity and set."""
+
+    def __init__(
+        self, card_classes_with_amounts_per_week: t.List[CardClassWithAmountPerWeek]
+    ):
+        set_nums_per_card_class = [
+            card_sets.get_set_nums_from_sets(card_class_with_amount.card_class.sets)
+            for card_class_with_amount in card_classes_with_amounts_per_week
+        ]
+        all_set_nums = {
+            set_num for set_nums in set_nums_per_card_class for set_num in set_nums
+        }
+        self.set_nums = np.array(sorted(all_set_nums), dtype=int)
+
+        chances_of_none = np.ones((len(rarities.RARITIES), len(self.set_nums)))
+        for card_class_with_amount, set_nums in zip(
+            card_classes_with_amounts_per_week, set_nums_per_card_class
+        ):
+            rarity_index = rarities.RARITIES.index(
+                card_class_with_amount.card_class.rarity
             )
+            set_indices = np.searchsorted(self.set_nums, set_nums)
+            chance = card_class_with_amount.chance_of_specific_card_drop_per_week
+            chances_of_none[rarity_index, set_indices] *= 1 - chance
 
-            set_match = card_set.set_num in set_nums
-            if rarity_match and set_match:
-                chance = card_class_with_amount.chance_of_specific_card_drop_per_week
-                chances.append(chance)
-        chance_of_at_least_one = get_chance_of_at_least_one(chances)
-        return chance_of_at_least_one
+        self.chances = 1 - chances_of_none
+
+    def get(self, rarity_indices: np.ndarray, set_nums: np.ndarray) -> np.ndarray:
+        """Gets the findability of each card, given as the index of its rarity in
+        RARITIES and its set num."""
+        set_nums = np.asarray(set_nums)
+        if len(self.set_nums) == 0:
+            return np.zeros(len(set_nums))
+
+        set_nums = np.where(set_nums == 0, 1, set_nums)  # Matches CardSet
+        set_indices = np.searchsorted(self.set_nums, set_nums)
+        set_indices = set_indices.clip(max=len(self.set_nums) - 1)
+        is_findable = self.set_nums[set_indices] == set_nums
+
+        findabilities = self.chances[np.asarray(rarity_indices), set_indices]
+        return np.where(is_findable, findabilities, 0.0)
 
 
 def get_chance_of_at_least_one(probabilities):
@@ -339,6 +462,52 @@ class Reward:
 
         return total_value
 
+    @property
+    def slot_weights(self) -> SlotWeights:
+        """The expected drops from each slot in one of this reward."""
+        weights: SlotWeights = {}
+        for card_class_with_amount in self.card_class_amounts:
+            add_slot_weights(
+                weights,
+                card_class_with_amount.card_class.get_slot_weights(
+                    card_class_with_amount.amount
+                ),
+            )
+        return weights
+
+
+def get_slot_weights(
+    rewards_with_counts: t.Iterable[t.Tuple[Reward, float]]
+) -> SlotWeights:
+    """The expected drops from each slot in the given number of each reward.
+    Counts may be fractional, such as the chance of getting the reward."""
+    weights: SlotWeights = {}
+    for reward, count in rewards_with_counts:
+        add_slot_weights(weights, reward.slot_weights, count)
+    return weights
+
+
+class RewardMatrix:
+    """Rows of slot weights, such as one per purchase, as a dense matrix over the
+    slots used by any row, so that all rows are valued in one product."""
+
+    def __init__(self, rows: t.List[SlotWeights]):
+        slot_positions: t.Dict[RewardSlot, int] = {}
+        for row in rows:
+            for slot in row:
+                slot_positions.setdefault(slot, len(slot_positions))
+        self.slots = list(slot_positions.keys())
+
+        self.weights = np.zeros((len(rows), len(self.slots)))
+        for row_num, row in enumerate(rows):
+            positions = [slot_positions[slot] for slot in row]
+            self.weights[row_num, positions] = list(row.values())
+
+    def get_values(self, card_data) -> np.ndarray:
+        """Gets the value of each row for the card data."""
+        slot_values = get_reward_value_index(card_data).get_slot_values(self.slots)
+        return self.weights @ slot_values
+
 
 def get_pack_contents_for_sets(sets: t.List[card_sets.CardSet]):
     card_classes_with_amounts = [
@@ -398,7 +567,33 @@ FIRST_WIN_OF_THE_DAY = Reward(
     card_classes=get_pack_contents_for_sets([card_sets.get_newest_main_set()])
 )
 
-DEFAULT_PLAYER_REWARD_RATE = PlayerRewards(
+_player_rewards_by_content = LRU(max_size=100)
+
+
+def get_player_rewards(
+    first_wins_per_week: float,
+    drafts_per_week: float,
+    ranked_wins_per_day: float,
+    unranked_wins_per_day: float,
+) -> PlayerRewards:
+    """Gets the PlayerRewards for the given rates.
+
+    Equal rates share one PlayerRewards, so its findability table is only built
+    once however many players have those rates."""
+    content_key = (
+        float(first_wins_per_week),
+        float(drafts_per_week),
+        float(ranked_wins_per_day),
+        float(unranked_wins_per_day),
+    )
+    player_rewards = _player_rewards_by_content.get(content_key)
+    if player_rewards is None:
+        player_rewards = PlayerRewards(*content_key)
+        _player_rewards_by_content[content_key] = player_rewards
+    return player_rewards
+
+
+DEFAULT_PLAYER_REWARD_RATE = get_player_rewards(
     first_wins_per_week=6.3,
     drafts_per_week=0.3,
     ranked_wins_per_day=3.5,
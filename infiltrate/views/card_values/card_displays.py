@@ -1,13 +1,15 @@
 """This is where the routes are defined."""
-import functools
+import time
 import typing as t
 
 import numpy as np
 import pandas as pd
+from boltons.cacheutils import LRU
 
 import infiltrate.global_data as global_data
 import infiltrate.models.card as card
-from infiltrate.card_evaluation import OwnValueFrame
+import infiltrate.models.card_base_value as card_base_value
+from infiltrate.card_evaluation import OwnValueFrame, OwnValueMatrix
 from infiltrate.card_frame_bases import CardDetails
 from infiltrate.models.user import User
 from infiltrate.views.card_values import display_filters
@@ -21,6 +23,14 @@ class CardDisplays:
 
     CARDS_PER_PAGE = 24
 
+    # Collections can also change in Eternal Warcry, outside of this app,
+    # so a user's collection is read again once their cards are this old.
+    COLLECTION_TTL_SECONDS = 10 * 60
+
+    _own_value_frames = LRU(max_size=50)
+    # Columns of users evaluated together, made into frames when next needed.
+    _precomputed_own_values = LRU(max_size=50)
+
     def __init__(self, value_info: OwnValueFrame):
         self.value_info = value_info
 
@@ -39,15 +49,73 @@ class CardDisplays:
         return cls(own_value)
 
     @classmethod
-    @functools.lru_cache(maxsize=50)
     def make_own_value_frame_for_user(
         cls, user: User, card_details: CardDetails = None
     ):
-        """Makes the cards for a user, cached for immediate reuse."""
+        """Makes the cards for a user, cached for immediate reuse
+        until the deck searches or cards are updated,
+        or the collection is older than COLLECTION_TTL_SECONDS."""
+        cache_key = cls._get_cache_key(user)
+        own_value, fetched_at = cls._own_value_frames.get(cache_key, (None, None))
+        if own_value is None and cache_key in cls._precomputed_own_values:
+            own_values, column, fetched_at = cls._precomputed_own_values.pop(cache_key)
+            own_value = own_values.get_own_value_frame(user, column)
+            cls._own_value_frames[cache_key] = (own_value, fetched_at)
+        if own_value is None or (
+            time.monotonic() - fetched_at > cls.COLLECTION_TTL_SECONDS
+        ):
+            if card_details is None:
+                card_details = global_data.all_cards
+            own_value = OwnValueFrame.from_user(user, card_details)
+            cls._own_value_frames[cache_key] = (own_value, time.monotonic())
+        return own_value
+
+    @classmethod
+    def precompute_for_recent_users(cls, card_details: CardDetails = None):
+        """Evaluates together the users with cached cards, such as after the deck
+        searches update, so their next request doesn't wait on it."""
+        cache_keys = list(cls._own_value_frames.keys())
+        cache_keys += list(cls._precomputed_own_values.keys())
+        user_ids = {int(cache_key[0]) for cache_key in cache_keys}
+        if not user_ids:
+            return
+        users = User.query.filter(User.id.in_(user_ids)).all()
+
         if card_details is None:
             card_details = global_data.all_cards
-        own_value = OwnValueFrame.from_user(user, card_details)
-        return own_value
+        fetched_at = time.monotonic()
+        columns = OwnValueMatrix.from_users(users, card_details)
+        for user, (own_values, column) in zip(users, columns):
+            cls._precomputed_own_values[cls._get_cache_key(user)] = (
+                own_values,
+                column,
+                fetched_at,
+            )
+
+    @staticmethod
+    def get_data_version() -> t.Tuple[t.Optional[int], int]:
+        """The versions of the deck search values and of the cards,
+        which change whenever every user's cards need to be evaluated again."""
+        return card_base_value.get_latest_version(), card.get_cards_version()
+
+    @classmethod
+    def _get_cache_key(cls, user: User) -> tuple:
+        return (user.get_id(),) + cls.get_data_version()
+
+    @classmethod
+    def update_collection_for_user(cls, user: User, delta: t.Dict[card.CardId, int]):
+        """Updates the user's cached cards, if any, for a change in their collection."""
+        # Precomputed columns share their matrix, so are evaluated again instead.
+        cls._precomputed_own_values.pop(cls._get_cache_key(user), None)
+        own_value, _ = cls._own_value_frames.get(cls._get_cache_key(user), (None, None))
+        if own_value is not None:
+            own_value.apply_collection_delta(delta)
+
+    @classmethod
+    def clear_for_user(cls, user: User):
+        """Drops the user's cached cards, for a change in how they are valued."""
+        cls._own_value_frames.pop(cls._get_cache_key(user), None)
+        cls._precomputed_own_values.pop(cls._get_cache_key(user), None)
 
     @property
     def sort_method(self) -> t.Optional[display_filters.CardDisplaySort]:
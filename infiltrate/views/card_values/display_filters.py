@@ -144,10 +144,12 @@ class RarityFilter(OwnershipFilter):
     """Excludes the given rarity."""
 
     def __init__(self, rarity_name: str):
-        self.rarity = rarity_mod.rarity_from_name[rarity_name]
+        if rarity_name not in rarity_mod.rarity_from_name:
+            raise KeyError(f"Rarity {rarity_name} not recognized.")
+        self.rarity_name = rarity_name
 
     def filter(self, cards):
-        filtered_df = cards[cards["rarity"] != self.rarity]
+        filtered_df = cards[cards["rarity"] != self.rarity_name]
         return OwnValueFrame(cards.user, filtered_df)
 
 
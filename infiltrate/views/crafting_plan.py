@@ -0,0 +1,37 @@
+"""Plans what a user should craft with the shiftstone they have."""
+import flask
+import flask_login
+from flask_classful import FlaskView
+
+import infiltrate.crafting as crafting
+import infiltrate.views.card_values.card_displays as card_displays
+
+CRAFT_COLUMNS = ["set_num", "card_num", "count_in_deck", "craft_cost", "play_value"]
+
+
+# noinspection PyMethodMayBeStatic
+class CraftingPlanView(FlaskView):
+    """View planning the cards to craft with a budget of shiftstone,
+    given as the budget query argument."""
+
+    @flask_login.login_required
+    def index(self):
+        budget = flask.request.args.get("budget", type=int)
+        if budget is None or budget < 0:
+            flask.abort(400, "budget must be a whole, non-negative amount of shiftstone")
+
+        own_value = card_displays.CardDisplays.make_own_value_frame_for_user(
+            flask_login.current_user
+        )
+        plan = crafting.plan_crafting(own_value, budget)
+
+        crafts = plan.crafts.reset_index(drop=True)
+        columns = [column for column in ["name"] + CRAFT_COLUMNS if column in crafts]
+        return flask.jsonify(
+            {
+                "budget": plan.budget,
+                "spent": plan.spent,
+                "play_value": plan.play_value,
+                "crafts": crafts[columns].to_dict("records"),
+            }
+        )
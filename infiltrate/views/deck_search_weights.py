@@ -0,0 +1,49 @@
+"""Sets how much each deck search counts towards a user's card values."""
+import flask
+import flask_login
+from flask_classful import FlaskView
+
+import infiltrate.models.deck_search as deck_search
+import infiltrate.views.card_values.card_displays as card_displays
+
+
+# noinspection PyMethodMayBeStatic
+class DeckSearchWeightsView(FlaskView):
+    """View for the user's own weight of each deck search.
+
+    Weights are posted as form fields named weight-<deck search id>,
+    for each deck search of the default profile."""
+
+    @flask_login.login_required
+    def index(self):
+        weights = deck_search.get_weights_for_user(flask_login.current_user)
+        if weights is None:
+            weights = deck_search.get_default_weights()
+        return flask.jsonify(
+            [
+                {
+                    "deck_search_id": weighted.deck_search_id,
+                    "name": weighted.name,
+                    "weight": weights.get(weighted.deck_search_id, 0.0),
+                }
+                for weighted in deck_search.get_weighted_deck_searches()
+            ]
+        )
+
+    @flask_login.login_required
+    def post(self):
+        weights = {}
+        for deck_search_id in deck_search.get_default_weights():
+            name = f"weight-{deck_search_id}"
+            weight = flask.request.form.get(name, type=float)
+            if weight is None or not 0 <= weight < float("inf"):
+                flask.abort(400, f"{name} must be a non-negative number")
+            weights[deck_search_id] = weight
+
+        user = flask_login.current_user
+        try:
+            deck_search.set_weights_for_user(user, weights)
+        except ValueError as e:
+            flask.abort(400, str(e))
+        card_displays.CardDisplays.clear_for_user(user)
+        return ""
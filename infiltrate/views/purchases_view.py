@@ -1,10 +1,45 @@
 import flask
 import flask_classful
 import flask_login
+import pandas as pd
+from boltons.cacheutils import LRU
 
-import infiltrate.card_evaluation as card_evaluation
-import infiltrate.global_data as global_data
+import infiltrate.models.card_set as card_set
+import infiltrate.models.deck_search as deck_search
+import infiltrate.models.user.reward_profile as reward_profile
 import infiltrate.purchases as purchases
+import infiltrate.views.card_values.card_displays as card_displays
+from infiltrate.models.user import User
+
+_purchase_values_cache = LRU(max_size=50)
+
+
+def get_purchase_values_for_user(user: User) -> pd.DataFrame:
+    """Gets the purchases worth anything to the user, cached until their collection,
+    the deck searches, the cards, the league info, or the user's reward profile or
+    deck search weights change.
+
+    The collection is the one in the user's cached cards, which is read again
+    once older than CardDisplays.COLLECTION_TTL_SECONDS, so changes made outside
+    this app show up after at most that long."""
+    own_values = card_displays.CardDisplays.make_own_value_frame_for_user(user)
+    weights = deck_search.get_weights_for_user(user)
+    cache_key = (
+        (user.get_id(), own_values.get_collection_hash())
+        + card_displays.CardDisplays.get_data_version()
+        + (card_set.get_league_info_version(),)
+        + (reward_profile.get_player_rewards(user).content_key,)
+        + (tuple(sorted(weights.items())) if weights is not None else None,)
+    )
+
+    purchase_values = _purchase_values_cache.get(cache_key)
+    if purchase_values is None:
+        purchase_values = purchases.get_purchase_values(
+            user=user, own_values=own_values
+        )
+        purchase_values = purchase_values.query("value > 0")
+        _purchase_values_cache[cache_key] = purchase_values
+    return purchase_values
 
 
 class PurchasesView(flask_classful.FlaskView):
@@ -20,13 +55,7 @@ class PurchasesView(flask_classful.FlaskView):
         """A table loaded into the card values page."""
         page_num = int(page_num)
 
-        purchase_values = purchases.get_purchase_values(
-            user=flask_login.current_user,
-            own_values=card_evaluation.OwnValueFrame.from_user(
-                user=flask_login.current_user, card_details=global_data.all_cards
-            ),
-        )
-        purchase_values = purchase_values.query("value > 0")
+        purchase_values = get_purchase_values_for_user(flask_login.current_user)
 
         if sort_str == "efficiency":
             displays = purchase_values.sort_values("value_per_gold", ascending=False)
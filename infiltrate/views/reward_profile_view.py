@@ -0,0 +1,40 @@
+"""Sets how often a user plays, which changes how likely they are to find cards."""
+import flask
+import flask_login
+from flask_classful import FlaskView
+
+import infiltrate.models.user.reward_profile as reward_profile
+import infiltrate.views.card_values.card_displays as card_displays
+
+RATE_NAMES = [
+    "first_wins_per_week",
+    "drafts_per_week",
+    "ranked_wins_per_day",
+    "unranked_wins_per_day",
+]
+
+
+# noinspection PyMethodMayBeStatic
+class RewardProfileView(FlaskView):
+    """View for the rates at which the user collects rewards."""
+
+    @flask_login.login_required
+    def index(self):
+        player_rewards = reward_profile.get_player_rewards(flask_login.current_user)
+        return flask.jsonify(
+            {name: getattr(player_rewards, name) for name in RATE_NAMES}
+        )
+
+    @flask_login.login_required
+    def post(self):
+        rates = {}
+        for name in RATE_NAMES:
+            rate = flask.request.form.get(name, type=float)
+            if rate is None or not 0 <= rate < float("inf"):
+                flask.abort(400, f"{name} must be a non-negative number")
+            rates[name] = rate
+
+        user = flask_login.current_user
+        reward_profile.set_for_user(user, **rates)
+        card_displays.CardDisplays.clear_for_user(user)
+        return ""
@@ -0,0 +1,22 @@
+"""Private API to see how the site is performing while live."""
+import flask
+from flask_classful import FlaskView
+
+import infiltrate.pipeline_stats as pipeline_stats
+from infiltrate import application
+
+
+# Local run api is http://127.0.0.1:5000/secret_stats/pipeline/KEY
+
+
+# noinspection PyMethodMayBeStatic
+class StatsAPI(FlaskView):
+    """View for timing and memory percentiles of the card evaluation stages"""
+
+    route_base = "/secret_stats"
+    key = application.config["UPDATE_KEY"]
+
+    def pipeline(self, key):
+        if key != self.key:
+            return "Bad Key"
+        return flask.jsonify(pipeline_stats.get_summary())
@@ -6,6 +6,7 @@ import infiltrate.caches as caches
 import infiltrate.models.card as card
 import infiltrate.models.deck as deck
 import infiltrate.models.deck_search as deck_search
+import infiltrate.views.card_values.card_displays as card_displays
 from infiltrate import application
 
 NO_KEY_GIVEN = "no_key_given"
@@ -49,4 +50,5 @@ class UpdateAPI(FlaskView):
         self.refuse_bad_key(key)
         deck_search.update_deck_searches()
         caches.invalidate()
+        card_displays.CardDisplays.precompute_for_recent_users()
         return "Updated Deck Searches"
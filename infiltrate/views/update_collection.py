@@ -6,6 +6,8 @@ import flask_login
 
 # noinspection PyMethodMayBeStatic
 import infiltrate.models.user
+import infiltrate.models.user.collection as collection
+import infiltrate.views.card_values.card_displays as card_displays
 
 
 class UpdateCollectionView(FlaskView):
@@ -22,7 +24,10 @@ class UpdateCollectionView(FlaskView):
             # Import
             url = f"https://api.eternalwarcry.com/v1/useraccounts/updatecollection"
             data = {"key": user_model.ew_key, "cards": card_import}
-            requests.post(url=url, data=data)
+            response = requests.post(url=url, data=data)
+            if response.ok:
+                delta = collection.get_collection_delta_from_import(card_import)
+                card_displays.CardDisplays.update_collection_for_user(user, delta)
         except KeyError:
             pass
         return ""
@@ -0,0 +1,66 @@
+"""Answers how a user's card values would change with their collection."""
+import flask
+import flask_login
+import numpy as np
+from flask_classful import FlaskView
+
+import infiltrate.models.user.collection as collection
+import infiltrate.views.card_values.card_displays as card_displays
+
+
+# noinspection PyMethodMayBeStatic
+class WhatIfView(FlaskView):
+    """View evaluating hypothetical changes to the user's collection.
+
+    Posted json has "scenarios", a list of card lists in the Eternal import format,
+    such as the cards the user might craft or find in a pack."""
+
+    @flask_login.login_required
+    def post(self):
+        body = flask.request.get_json(force=True, silent=True)
+        if not isinstance(body, dict):
+            flask.abort(400, "Body must be a json object")
+        card_imports = body.get("scenarios", [])
+        if not isinstance(card_imports, list) or not all(
+            isinstance(card_import, str) for card_import in card_imports
+        ):
+            flask.abort(400, "scenarios must be a list of card lists")
+        deltas = [
+            collection.get_collection_delta_from_import(card_import)
+            for card_import in card_imports
+        ]
+
+        own_value = card_displays.CardDisplays.make_own_value_frame_for_user(
+            flask_login.current_user
+        )
+        # The first column is the collection as it is, to compare against.
+        own_values = own_value.evaluate_collection_deltas([{}] + deltas)
+
+        current_value_of_shiftstone = own_values.value_of_shiftstone[0]
+        results = []
+        for column in range(1, own_values.is_owned.shape[1]):
+            is_changed = own_values.is_owned[:, column] != own_values.is_owned[:, 0]
+            changed_rows = np.flatnonzero(is_changed)
+            cards = [
+                {
+                    "set_num": int(set_num),
+                    "card_num": int(card_num),
+                    "count_in_deck": int(count_in_deck),
+                    "is_owned": bool(own_values.is_owned[row, column]),
+                    "own_value": float(own_values.own_value[row, column]),
+                }
+                for row, (set_num, card_num, count_in_deck) in zip(
+                    changed_rows, own_value.index[changed_rows]
+                )
+            ]
+            value_of_shiftstone = own_values.value_of_shiftstone[column]
+            results.append(
+                {
+                    "value_of_shiftstone": float(value_of_shiftstone),
+                    "value_of_shiftstone_change": float(
+                        value_of_shiftstone - current_value_of_shiftstone
+                    ),
+                    "changed_cards": cards,
+                }
+            )
+        return flask.jsonify(results)
@@ -0,0 +1,20 @@
+import pytest
+
+from infiltrate import db
+
+
+@pytest.fixture
+def clean_db():
+    """The app's database with every table emptied before and after the test.
+    Only for the test database, as every row is deleted."""
+    db.create_all()
+    _delete_all_rows()
+    yield db
+    db.session.rollback()
+    _delete_all_rows()
+
+
+def _delete_all_rows():
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
@@ -0,0 +1,56 @@
+import concurrent.futures
+import io
+import threading
+import types
+
+import infiltrate.browsers as browsers
+
+
+class FakeClock:
+    """A clock that stands still, recording when each sleeping caller wakes."""
+
+    def __init__(self, now: float):
+        self.now = now
+        self.wake_times = []
+        self._lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        with self._lock:
+            self.wake_times.append(self.now + seconds)
+
+
+def test_rate_limiter_spaces_concurrent_calls(monkeypatch):
+    clock = FakeClock(now=100.0)
+    monkeypatch.setattr(
+        browsers,
+        "time",
+        types.SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep),
+    )
+    calls_per_second = 10
+    num_calls = 25
+    sut = browsers.RateLimiter(calls_per_second)
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: sut.wait(), range(num_calls)))
+
+    # The one call that doesn't sleep is made immediately.
+    call_times = sorted([clock.now] + clock.wake_times)
+    assert len(call_times) == num_calls
+    for first, later in zip(call_times, call_times[calls_per_second:]):
+        assert later - first >= 1 - 1e-9
+
+
+def test_get_json_from_url_passes_timeout(monkeypatch):
+    timeouts = []
+
+    def urlopen(request, timeout):
+        timeouts.append(timeout)
+        return io.BytesIO(b'{"decks": []}')
+
+    monkeypatch.setattr(browsers.urllib.request, "urlopen", urlopen)
+
+    assert browsers.get_json_from_url("https://example.com") == {"decks": []}
+    assert timeouts == [browsers.URL_TIMEOUT_SECONDS]
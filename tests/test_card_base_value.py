@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+
+import infiltrate.card_evaluation as card_evaluation
+import infiltrate.card_frame_bases as card_frame_bases
+import infiltrate.models.card as card
+import infiltrate.models.card_base_value as card_base_value
+import infiltrate.models.rarity as rarity
+
+
+@pytest.fixture
+def empty_base_values(clean_db):
+    card_evaluation._base_values_cache.clear()
+    yield
+    card_evaluation._base_values_cache.clear()
+
+
+def _make_base_values(play_value: float) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "set_num": [0, 0],
+            "card_num": [0, 0],
+            "count_in_deck": [1, 2],
+            "num_decks_with_count_or_less": [2.0, 1.0],
+            "play_rate": [0.2, 0.1],
+            "play_value": [play_value, play_value / 2],
+            "craft_cost": [50, 50],
+            "findability": [0.5, 0.25],
+            "play_craft_efficiency": [play_value / 50, play_value / 100],
+        }
+    )
+
+
+def _make_card_details():
+    return card_frame_bases.CardDetails(
+        [
+            {
+                "set_num": 0,
+                "card_num": 0,
+                "rarity": rarity.COMMON.name,
+                "image_url": "image_url",
+                "details_url": "details_url",
+                "is_in_draft_pack": True,
+            }
+        ]
+    )
+
+
+def test_save_makes_new_version_and_removes_older(empty_base_values):
+    assert card_base_value.get_latest_version() is None
+
+    first_version = card_base_value.save(_make_base_values(10.0))
+    second_version = card_base_value.save(_make_base_values(20.0))
+
+    assert second_version == first_version + 1
+    assert card_base_value.get_latest_version() == second_version
+    assert card_base_value.as_df(first_version).empty
+    loaded = card_base_value.as_df(second_version)
+    assert list(loaded["play_value"]) == [20.0, 10.0]
+    assert list(loaded["count_in_deck"]) == [1, 2]
+
+
+def test_get_latest_base_values_reloads_after_cards_update(
+    empty_base_values, monkeypatch
+):
+    card_base_value.save(_make_base_values(10.0))
+    card_details = _make_card_details()
+
+    sut = card_evaluation.BaseValueTable.get_latest(card_details)
+
+    assert list(sut["play_value"]) == [10.0, 5.0, 0.0, 0.0]
+    assert card_evaluation.BaseValueTable.get_latest(card_details) is sut
+    monkeypatch.setattr(card, "_cards_version", card.get_cards_version() + 1)
+    assert card_evaluation.BaseValueTable.get_latest(card_details) is not sut
+
+
+def test_from_db_gives_unsaved_cards_the_costs_of_their_rarity(empty_base_values):
+    version = card_base_value.save(_make_base_values(10.0))
+    card_details = card_frame_bases.CardDetails(
+        _make_card_details().to_dict("records")
+        + [
+            {
+                "set_num": 0,
+                "card_num": 1,
+                "rarity": rarity.LEGENDARY.name,
+                "image_url": "image_url",
+                "details_url": "details_url",
+                "is_in_draft_pack": True,
+            }
+        ]
+    )
+
+    sut = card_evaluation.BaseValueTable.from_db(version, card_details)
+
+    is_new = sut["card_num"] == 1
+    assert list(sut["craft_cost"][is_new]) == [rarity.LEGENDARY.enchant] * 4
+    assert list(sut["sell_cost"][is_new]) == [rarity.LEGENDARY.disenchant] * 4
+    assert list(sut["play_value"][is_new]) == [0.0] * 4
@@ -0,0 +1,83 @@
+import pytest
+
+import infiltrate.views.card_values.card_displays as card_displays
+from infiltrate.models.user import User
+
+
+@pytest.fixture
+def own_values_from_user(monkeypatch):
+    """Makes a new object for each collection read, counting the reads."""
+    reads = []
+
+    def from_user(user, card_details):
+        reads.append(user)
+        return object()
+
+    monkeypatch.setattr(card_displays.OwnValueFrame, "from_user", from_user)
+    monkeypatch.setattr(
+        card_displays.CardDisplays,
+        "get_data_version",
+        staticmethod(lambda: (1, 1)),
+    )
+    monkeypatch.setattr(card_displays.CardDisplays, "_own_value_frames", {})
+    return reads
+
+
+def test_own_value_frame_is_cached_for_user(own_values_from_user):
+    user = User(id=1, name="")
+
+    first = card_displays.CardDisplays.make_own_value_frame_for_user(user, [])
+    second = card_displays.CardDisplays.make_own_value_frame_for_user(user, [])
+
+    assert second is first
+    assert len(own_values_from_user) == 1
+
+
+def test_own_value_frame_rereads_old_collection(own_values_from_user, monkeypatch):
+    user = User(id=1, name="")
+    now = 1000.0
+    monkeypatch.setattr(card_displays.time, "monotonic", lambda: now)
+
+    first = card_displays.CardDisplays.make_own_value_frame_for_user(user, [])
+    now += card_displays.CardDisplays.COLLECTION_TTL_SECONDS
+    assert card_displays.CardDisplays.make_own_value_frame_for_user(user, []) is first
+    now += 1
+    second = card_displays.CardDisplays.make_own_value_frame_for_user(user, [])
+
+    assert second is not first
+    assert len(own_values_from_user) == 2
+
+
+def test_precomputed_own_values_are_used_until_collection_changes(
+    own_values_from_user, clean_db, monkeypatch
+):
+    monkeypatch.setattr(card_displays.CardDisplays, "_precomputed_own_values", {})
+    first, second = User(id=1, name=""), User(id=2, name="")
+    clean_db.session.add_all([first, second])
+    clean_db.session.commit()
+    for user in (first, second):
+        card_displays.CardDisplays.make_own_value_frame_for_user(user, [])
+
+    class FakeOwnValueMatrix:
+        def get_own_value_frame(self, user, column):
+            return user.id, column
+
+    def from_users(users, card_details):
+        return [(FakeOwnValueMatrix(), column) for column in range(len(users))]
+
+    monkeypatch.setattr(card_displays.OwnValueMatrix, "from_users", from_users)
+    monkeypatch.setattr(
+        card_displays.CardDisplays,
+        "get_data_version",
+        staticmethod(lambda: (2, 1)),
+    )
+    card_displays.CardDisplays.precompute_for_recent_users([])
+
+    first_own_value = card_displays.CardDisplays.make_own_value_frame_for_user(
+        first, []
+    )
+    card_displays.CardDisplays.update_collection_for_user(second, {})
+    card_displays.CardDisplays.make_own_value_frame_for_user(second, [])
+
+    assert first_own_value[0] == 1
+    assert len(own_values_from_user) == 3
@@ -1,12 +1,19 @@
+import types
+
 import pytest
+import numpy as np
 import pandas as pd
 
 import infiltrate.card_frame_bases as card_frame_bases
 import infiltrate.models.card as card
+import infiltrate.models.card_set as card_set
 import infiltrate.models.deck as deck
 import infiltrate.models.rarity as rarity
 import infiltrate.card_evaluation as card_evaluation
+import infiltrate.global_data as global_data
 import infiltrate.models.deck_search as deck_search
+import infiltrate.rewards as rewards
+from infiltrate.models.user import User, reward_profile
 
 
 def test_card_copy_creates_index():
@@ -29,7 +36,7 @@ def test_card_details():
             {
                 "set_num": 0,
                 "card_num": 0,
-                "rarity": rarity.COMMON,
+                "rarity": rarity.COMMON.name,
                 "image_url": "image_url",
                 "details_url": "details_url",
                 "is_in_draft_pack": "is_in_draft_pack",
@@ -42,162 +49,431 @@ def test_card_details():
     assert len(sut.columns) == 6
 
 
-def test_play_count_frame_from_weighted_deck_searches():
-    sut = card_evaluation.PlayCountFrame.from_weighted_deck_searches(
-        weighted_deck_searches=[
-            deck_search.WeightedDeckSearch(
-                deck_search_id=0,
-                user_id=0,
-                name="",
-                weight=1,
-                deck_search=deck_search.DeckSearch(
-                    id=0,
-                    cards=[
-                        deck_search.DeckSearchHasCard(
-                            decksearch_id=0,
-                            set_num=0,
-                            card_num=0,
-                            count_in_deck=1,
-                            num_decks_with_count_or_less=2,
-                        ),
-                        deck_search.DeckSearchHasCard(
-                            decksearch_id=0,
-                            set_num=0,
-                            card_num=0,
-                            count_in_deck=2,
-                            num_decks_with_count_or_less=1,
-                        ),
-                        deck_search.DeckSearchHasCard(
-                            decksearch_id=0,
-                            set_num=0,
-                            card_num=1,
-                            count_in_deck=1,
-                            num_decks_with_count_or_less=1,
-                        ),
-                    ],
-                ),
-            )
-        ],
-        card_details=card_frame_bases.CardDetails(
-            [
-                {
-                    "set_num": 0,
-                    "card_num": 0,
-                    "rarity": rarity.COMMON,
-                    "image_url": "image_url",
-                    "details_url": "details_url",
-                    "is_in_draft_pack": "is_in_draft_pack",
-                },
-                {
-                    "set_num": 0,
-                    "card_num": 1,
-                    "rarity": rarity.LEGENDARY,
-                    "image_url": "image_url",
-                    "details_url": "details_url",
-                    "is_in_draft_pack": "is_in_draft_pack",
-                },
-            ]
-        ),
+def test_craft_efficiency_ranking_get_top_unowned():
+    sut = card_evaluation.CraftEfficiencyRanking(
+        np.array([0.5, 0.9, 0.1, 0.8, 0.7, 0.3])
     )
-    assert len(sut) == 3
-    # todo should probably assert entire output
 
+    top = sut.get_top_unowned(
+        is_owned=np.array([False, True, False, True, False, False]), num_options=3
+    )
 
-def test_play_rate_frame_from_play_counts():
-    sut = card_evaluation.PlayRateFrame.from_play_counts(
-        play_count_frame=card_evaluation.PlayCountFrame(
-            {
-                "count_in_deck": [1, 2, 1],
-                "decksearch_id": [0, 0, 0],
-                "num_decks_with_count_or_less": [2, 1, 1],
-                "card_num": [0, 0, 1],
-                "details_url": ["details_url"] * 3,
-                "image_url": ["image_url"] * 3,
-                "is_in_draft_pack": [True] * 3,
-                "rarity": [rarity.COMMON, rarity.COMMON, rarity.LEGENDARY,],
-                "set_num": [0, 0, 0],
-            }
+    assert list(top) == [0.7, 0.5, 0.3]
+
+
+def test_craft_efficiency_ranking_get_top_unowned_sums():
+    sut = card_evaluation.CraftEfficiencyRanking(
+        np.array([0.5, 0.9, np.nan, 0.8, 0.7, 0.3])
+    )
+    is_owned = np.array(
+        [
+            [False, True, False],
+            [True, True, False],
+            [False, False, False],
+            [True, False, False],
+            [False, True, True],
+            [False, False, True],
+        ]
+    )
+
+    sums = sut.get_top_unowned_sums(is_owned, num_options=2)
+
+    assert np.allclose(sums, [1.2, 1.1, 1.7])
+
+
+def _make_player_rewards(findability: float):
+    """Player rewards finding every common and legendary of set 0 with the given
+    chance, without reading the card sets from the db."""
+    card_classes = [
+        types.SimpleNamespace(
+            card_class=types.SimpleNamespace(
+                rarity=card_rarity, sets=[card_set.CardSet(0)]
+            ),
+            chance_of_specific_card_drop_per_week=findability,
         )
+        for card_rarity in (rarity.COMMON, rarity.LEGENDARY)
+    ]
+    return types.SimpleNamespace(
+        content_key=(findability,),
+        findability_table=rewards.FindabilityTable(card_classes),
     )
-    _ = sut.play_count
-    assert len(sut) == 3
 
 
-def test_play_value_frame_from_play_rates():
-    sut = card_evaluation.PlayValueFrame.from_play_rates(
-        play_rate_frame=card_evaluation.PlayRateFrame(
+def _make_base_values(player_rewards=None):
+    card_details = card_frame_bases.CardDetails(
+        [
             {
-                "count_in_deck": [1, 2, 1],
-                "decksearch_id": [0, 0, 0],
-                "num_decks_with_count_or_less": [2, 1, 1],
-                "card_num": [0, 0, 1],
-                "details_url": ["details_url"] * 3,
-                "image_url": ["image_url"] * 3,
-                "is_in_draft_pack": [True] * 3,
-                "rarity": [rarity.COMMON, rarity.COMMON, rarity.LEGENDARY,],
-                "set_num": [0, 0, 0],
-                "play_rate": [16.25, 32.5, 16.25],
-            }
-        ),
-        ownership=pd.DataFrame(
+                "set_num": 0,
+                "card_num": 0,
+                "rarity": rarity.COMMON.name,
+                "image_url": "image_url",
+                "details_url": "details_url",
+                "is_in_draft_pack": True,
+            },
             {
-                "set_num": {0: 0, 1: 0,},
-                "card_num": {0: 0, 1: 1,},
-                "count": {0: 1, 1: 0},
-            }
+                "set_num": 0,
+                "card_num": 1,
+                "rarity": rarity.LEGENDARY.name,
+                "image_url": "image_url",
+                "details_url": "details_url",
+                "is_in_draft_pack": True,
+            },
+        ]
+    )
+    card_copies = card_evaluation.card_value_table.CardValueTable.from_card_details(
+        card_details
+    )
+    return card_evaluation.BaseValueTable.from_play_counts(
+        card_copies,
+        play_counts=np.array([4.0, 2, 0, 0, 1, 0, 0, 0]),
+        player_rewards=player_rewards or _make_player_rewards(0.5),
+    )
+
+
+def test_base_value_table_uses_given_player_rewards():
+    sut = _make_base_values(_make_player_rewards(0.5))
+
+    assert np.allclose(sut["findability"], 0.5)
+    assert sut.for_player_rewards(_make_player_rewards(0.5)) is sut
+    other_rewards = sut.for_player_rewards(_make_player_rewards(0.25))
+    assert np.allclose(other_rewards["findability"], 0.25)
+    assert np.allclose(
+        other_rewards["play_craft_efficiency"], sut["play_craft_efficiency"] * 1.5
+    )
+
+
+def test_base_values_for_user_use_their_reward_profile(clean_db, monkeypatch):
+    base_values = _make_base_values(_make_player_rewards(0.5))
+    monkeypatch.setattr(
+        card_evaluation.BaseValueTable,
+        "get_latest",
+        classmethod(lambda cls, card_details: base_values),
+    )
+    monkeypatch.setattr(
+        rewards, "DEFAULT_PLAYER_REWARD_RATE", base_values.player_rewards
+    )
+    monkeypatch.setattr(
+        rewards,
+        "get_player_rewards",
+        lambda drafts_per_week, **rates: _make_player_rewards(drafts_per_week / 4),
+    )
+    user = User(id=1, name="")
+    clean_db.session.add(user)
+    clean_db.session.commit()
+
+    default_values = card_evaluation.BaseValueTable.get_for_user(user, None)
+    reward_profile.set_for_user(
+        user,
+        first_wins_per_week=7,
+        drafts_per_week=1,
+        ranked_wins_per_day=2,
+        unranked_wins_per_day=0,
+    )
+    sut = card_evaluation.BaseValueTable.get_for_user(user, None)
+
+    assert default_values is base_values
+    assert np.allclose(sut["findability"], 0.25)
+
+
+def test_base_value_table_from_weighted_play_counts(monkeypatch):
+    monkeypatch.setattr(
+        rewards, "DEFAULT_PLAYER_REWARD_RATE", _make_player_rewards(0.5)
+    )
+    card_details = _make_base_values().card_details
+    weighted_play_counts = deck_search.WeightedPlayCounts(
+        set_nums=np.array([0, 0, 0, 0]),
+        card_nums=np.array([0, 0, 1, 0]),
+        counts_in_deck=np.array([1, 2, 1, 1]),
+        play_counts=np.array([1.5, 1.0, 1.0, 0.5]),
+    )
+
+    sut = card_evaluation.BaseValueTable.from_weighted_play_counts(
+        weighted_play_counts, card_details
+    )
+
+    assert len(sut) == 8
+    assert list(sut["num_decks_with_count_or_less"]) == [2, 1, 0, 0, 1, 0, 0, 0]
+
+
+def test_base_value_table_from_play_counts():
+    sut = _make_base_values(_make_player_rewards(0.5))
+
+    play_counts = np.array([4.0, 2, 0, 0, 1, 0, 0, 0])
+    assert np.allclose(
+        sut["play_rate"],
+        play_counts
+        * card_evaluation.deck_constants.AVG_COLLECTABLE_CARDS_IN_DECK
+        / play_counts.sum(),
+    )
+    assert list(sut["play_value"]) == [100, 50, 0, 0, 25, 0, 0, 0]
+    card_rarities = [rarity.COMMON] * 4 + [rarity.LEGENDARY] * 4
+    assert list(sut["craft_cost"]) == [r.enchant for r in card_rarities]
+    assert list(sut["sell_cost"]) == [r.disenchant for r in card_rarities]
+    assert np.allclose(
+        sut["play_craft_efficiency"], 0.5 * sut["play_value"] / sut["craft_cost"]
+    )
+
+
+def test_own_value_frame_from_base_values():
+    sut = card_evaluation.OwnValueFrame.from_base_values(
+        user=User(id=0, name=""),
+        base_values=_make_base_values(),
+        ownership=pd.DataFrame({"set_num": [0], "card_num": [0], "count": [1]}),
+    )
+
+    assert len(sut) == 8
+    assert list(sut.is_owned) == [True] + [False] * 7
+    assert sut.play_value.max() == 100
+    assert sut.own_value.loc[0, 0, 1] == 100
+
+
+def test_own_value_frame_apply_collection_delta_matches_full_recompute(monkeypatch):
+    user = User(id=0, name="")
+    base_values = _make_base_values()
+    sut = card_evaluation.OwnValueFrame.from_base_values(
+        user=user,
+        base_values=base_values,
+        ownership=pd.DataFrame({"set_num": [0], "card_num": [0], "count": [1]}),
+    )
+    own_value_before = sut.own_value.to_numpy().copy()
+
+    sut.apply_collection_delta({card.CardId(0, 0): 1, card.CardId(0, 1): 1})
+
+    monkeypatch.setattr(
+        card_evaluation.BaseValueTable,
+        "get_for_user",
+        classmethod(lambda cls, user, card_details: base_values),
+    )
+    monkeypatch.setattr(
+        card_evaluation.collection,
+        "dataframe_for_user",
+        lambda user: pd.DataFrame(
+            {"set_num": [0, 0], "card_num": [0, 1], "count": [2, 1]}
         ),
     )
+    recomputed = card_evaluation.OwnValueFrame.from_user(user, card_details=None)
 
-    _ = sut.play_value
-    assert len(sut) == 3
+    assert list(sut.is_owned) == [True, True, False, False, True, False, False, False]
+    assert list(sut.is_owned) == list(recomputed.is_owned)
+    assert not np.allclose(sut.own_value, own_value_before)
+    assert np.allclose(sut.own_value, np.fmax(sut.play_value, sut.resell_value))
+    assert np.allclose(sut.resell_value, recomputed.resell_value)
+    assert np.allclose(sut.own_value, recomputed.own_value)
 
-    # todo should probably assert entire output
 
+def test_own_value_frame_evaluate_collection_deltas():
+    base_values = _make_base_values()
 
-def test_play_craft_efficency_from_play_value():
-    sut = card_evaluation.PlayCraftEfficiencyFrame.from_play_value(
-        card_evaluation.PlayValueFrame(
-            {
-                "count_in_deck": [1, 2, 1],
-                "decksearch_id": [0, 0, 0],
-                "num_decks_with_count_or_less": [2, 1, 1],
-                "card_num": [0, 0, 1],
-                "details_url": ["details_url"] * 3,
-                "image_url": ["image_url"] * 3,
-                "is_in_draft_pack": [True] * 3,
-                "rarity": [rarity.COMMON, rarity.COMMON, rarity.LEGENDARY,],
-                "set_num": [0, 0, 0],
-                "play_rate": [16.25, 32.5, 16.25],
-                "play_value": [100, 50, 50],
-                "is_owned": [True] * 3,
-            }
+    def make_own_value():
+        return card_evaluation.OwnValueFrame.from_base_values(
+            user=User(id=0, name=""),
+            base_values=base_values,
+            ownership=pd.DataFrame({"set_num": [0], "card_num": [0], "count": [1]}),
+        )
+
+    own_value = make_own_value()
+    deltas = [
+        {},
+        {card.CardId(0, 0): 2, card.CardId(0, 1): 1},
+        {card.CardId(0, 0): -3},
+    ]
+
+    sut = own_value.evaluate_collection_deltas(deltas)
+
+    assert sut.is_owned.shape == (8, 3)
+    assert list(sut.is_owned[:, 0]) == list(own_value.is_owned)
+    assert list(sut.is_owned[:, 1]) == [True] * 3 + [False] + [True] + [False] * 3
+    assert not sut.is_owned[:, 2].any()
+    assert list(own_value.is_owned) == [True] + [False] * 7
+    for column, delta in enumerate(deltas):
+        applied = make_own_value()
+        applied.apply_collection_delta(delta)
+        assert list(sut.is_owned[:, column]) == list(applied.is_owned)
+        assert np.allclose(sut.resell_value[:, column], applied.resell_value)
+        assert np.allclose(sut.own_value[:, column], applied.own_value)
+
+
+def test_own_value_frame_deltas_keep_copies_owned_beyond_a_playset():
+    def make_own_value():
+        return card_evaluation.OwnValueFrame.from_base_values(
+            user=User(id=0, name=""),
+            base_values=_make_base_values(),
+            ownership=pd.DataFrame({"set_num": [0], "card_num": [0], "count": [6]}),
         )
+
+    own_value = make_own_value()
+    sut = own_value.evaluate_collection_deltas([{card.CardId(0, 0): -1}])
+    own_value.apply_collection_delta({card.CardId(0, 0): -1})
+
+    assert list(sut.is_owned[:4, 0]) == [True] * 4
+    assert list(sut.num_owned[:4, 0]) == [5] * 4
+    assert list(own_value.is_owned[:4]) == [True] * 4
+    assert list(own_value.num_owned[:4]) == [5] * 4
+    own_value.apply_collection_delta({card.CardId(0, 0): -2})
+    assert list(own_value.is_owned[:4]) == [True, True, True, False]
+
+
+def test_own_value_matrix_from_users_matches_each_user(monkeypatch):
+    base_values = _make_base_values()
+    other_base_values = _make_base_values(_make_player_rewards(0.25))
+    counts_by_user_id = {1: [1, 0], 2: [4, 2], 3: [7, 1], 4: [0, 3]}
+    monkeypatch.setattr(
+        card_evaluation.BaseValueTable,
+        "get_for_user",
+        classmethod(
+            lambda cls, user, card_details: other_base_values
+            if user.id == 3
+            else base_values
+        ),
     )
-    _ = sut.play_craft_efficiency
-    assert len(sut) == 3
+    monkeypatch.setattr(
+        card_evaluation.collection,
+        "dataframe_for_user",
+        lambda user: pd.DataFrame(
+            {"set_num": [0, 0], "card_num": [0, 1], "count": counts_by_user_id[user.id]}
+        ),
+    )
+    users = [User(id=user_id, name="") for user_id in counts_by_user_id]
 
+    sut = card_evaluation.OwnValueMatrix.from_users(users, card_details=None)
 
-def test_own_value_frame_from_play_craft_efficency():
-    sut = card_evaluation.OwnValueFrame.from_play_craft_efficiency(
-        card_evaluation.PlayCraftEfficiencyFrame(
-            {
-                "count_in_deck": [1, 2, 1],
-                "decksearch_id": [0, 0, 0],
-                "num_decks_with_count_or_less": [2, 1, 1],
-                "card_num": [0, 0, 1],
-                "details_url": ["details_url"] * 3,
-                "image_url": ["image_url"] * 3,
-                "is_in_draft_pack": [True] * 3,
-                "rarity": [rarity.COMMON, rarity.COMMON, rarity.LEGENDARY,],
-                "set_num": [0, 0, 0],
-                "play_rate": [16.25, 32.5, 16.25],
-                "play_value": [100, 50, 50],
-                "is_owned": [True] * 3,
-                "craft_cost": [50, 50, 3200],
-                "findability": [0.02623, 0.02623, 0],
-                "play_craft_efficiency": [1.94755, 0.97377, 0.01562],
-            }
+    assert [column for _, column in sut] == [0, 1, 0, 2]
+    assert sut[0][0] is sut[1][0] is sut[3][0]
+    for user, (own_values, column) in zip(users, sut):
+        expected = card_evaluation.OwnValueFrame.from_user(user, card_details=None)
+        assert list(own_values.is_owned[:, column]) == list(expected.is_owned)
+        assert list(own_values.num_owned[:, column]) == list(expected.num_owned)
+        assert np.allclose(own_values.resell_value[:, column], expected.resell_value)
+        assert np.allclose(own_values.own_value[:, column], expected.own_value)
+
+
+def test_own_value_frame_collection_hash_changes_with_collection():
+    sut = card_evaluation.OwnValueFrame.from_base_values(
+        user=User(id=0, name=""),
+        base_values=_make_base_values(),
+        ownership=pd.DataFrame({"set_num": [0], "card_num": [0], "count": [1]}),
+    )
+    collection_hash = sut.get_collection_hash()
+
+    sut.apply_collection_delta({card.CardId(0, 1): 1})
+    assert sut.get_collection_hash() != collection_hash
+
+    sut.apply_collection_delta({card.CardId(0, 1): -1})
+    assert sut.get_collection_hash() == collection_hash
+
+
+def _add_weighted_deck_searches():
+    """Two deck searches weighted in profile 1, and one in another profile."""
+    play_counts_by_search = {
+        1: {(0, 0, 1): 4, (0, 0, 2): 2, (0, 1, 1): 1},
+        2: {(0, 0, 1): 2, (0, 1, 1): 3, (0, 1, 2): 1},
+    }
+    for deck_search_id, play_counts in play_counts_by_search.items():
+        deck_search.db.session.add(
+            deck_search.DeckSearch(id=deck_search_id, maximum_age_days=10)
+        )
+        for (set_num, card_num, count_in_deck), count in play_counts.items():
+            deck_search.db.session.add(
+                deck_search.DeckSearchHasCard(
+                    decksearch_id=deck_search_id,
+                    set_num=set_num,
+                    card_num=card_num,
+                    count_in_deck=count_in_deck,
+                    num_decks_with_count_or_less=count,
+                )
+            )
+    for deck_search_id, profile_id, name, weight in [
+        (1, 1, "First", 0.75),
+        (2, 1, "Second", 0.25),
+        (2, 2, "Other", 1.0),
+    ]:
+        deck_search.db.session.add(
+            deck_search.WeightedDeckSearch(
+                deck_search_id=deck_search_id,
+                profile_id=profile_id,
+                name=name,
+                weight=weight,
+            )
         )
+    deck_search.db.session.commit()
+
+
+def test_vectorised_play_counts_match_summing_each_deck_search(clean_db):
+    _add_weighted_deck_searches()
+    card_details = _make_base_values().card_details
+    card_copies = card_evaluation.card_value_table.CardValueTable.from_card_details(
+        card_details
     )
-    _ = sut.own_value
-    assert len(sut) == 3
+
+    looped_play_counts = np.zeros(len(card_copies))
+    for weighted in deck_search.get_weighted_deck_searches():
+        for card_count in weighted.deck_search.cards:
+            position = card_copies.get_positions(
+                [card_count.set_num], [card_count.card_num], [card_count.count_in_deck]
+            )[0]
+            looped_play_counts[position] += (
+                card_count.num_decks_with_count_or_less * weighted.weight
+            )
+
+    summed = deck_search.get_weighted_play_counts()
+    summed_play_counts = card_copies.sum_at_positions(
+        card_copies.get_positions(
+            summed.set_nums, summed.card_nums, summed.counts_in_deck
+        ),
+        summed.play_counts,
+    )
+
+    deck_search_vectors = card_evaluation.DeckSearchVectors.from_db(card_details)
+    weights = deck_search.get_default_weights()
+    weight_vector = np.array(
+        [weights[search_id] for search_id in deck_search_vectors.deck_search_ids]
+    )
+    vectorised_play_counts = deck_search_vectors.play_counts @ weight_vector
+
+    expected = [3.5, 1.5, 0, 0, 1.5, 0.25, 0, 0]
+    assert np.allclose(looped_play_counts, expected)
+    assert np.allclose(summed_play_counts, expected)
+    assert np.allclose(vectorised_play_counts, expected)
+
+
+def test_update_base_values_saves_summed_play_counts(clean_db, monkeypatch):
+    _add_weighted_deck_searches()
+    card_details = _make_base_values().card_details
+    monkeypatch.setattr(
+        card_evaluation.rewards, "DEFAULT_PLAYER_REWARD_RATE", _make_player_rewards(0.5)
+    )
+    monkeypatch.setattr(global_data, "all_cards", card_details)
+
+    card_evaluation.update_base_values()
+
+    saved = card_evaluation.BaseValueTable.from_db(
+        card_evaluation.card_base_value.get_latest_version(), card_details
+    )
+    assert np.allclose(
+        saved["num_decks_with_count_or_less"], [3.5, 1.5, 0, 0, 1.5, 0.25, 0, 0]
+    )
+    assert np.allclose(saved["findability"], 0.5)
+
+
+def test_base_values_for_user_use_their_deck_search_weights(clean_db, monkeypatch):
+    _add_weighted_deck_searches()
+    card_details = _make_base_values().card_details
+    monkeypatch.setattr(
+        rewards, "DEFAULT_PLAYER_REWARD_RATE", _make_player_rewards(0.5)
+    )
+    monkeypatch.setattr(card_evaluation, "_base_values_cache", {})
+    monkeypatch.setattr(card_evaluation, "_deck_search_vectors_cache", {})
+    user = User(id=1, name="")
+    clean_db.session.add(user)
+    clean_db.session.commit()
+
+    default_values = card_evaluation.BaseValueTable.get_for_user(user, card_details)
+    deck_search.set_weights_for_user(user, {1: 0, 2: 2})
+    sut = card_evaluation.BaseValueTable.get_for_user(user, card_details)
+
+    assert np.allclose(
+        default_values["num_decks_with_count_or_less"],
+        [3.5, 1.5, 0, 0, 1.5, 0.25, 0, 0],
+    )
+    assert np.allclose(sut["num_decks_with_count_or_less"], [2, 0, 0, 0, 3, 1, 0, 0])
+    assert not np.allclose(sut["play_value"], default_values["play_value"])
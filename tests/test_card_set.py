@@ -0,0 +1,39 @@
+import datetime
+
+import infiltrate.models.card_set as card_set
+
+
+def test_league_only_update_keeps_set_names(clean_db, monkeypatch):
+    clean_db.session.add(
+        card_set.CardSetName(set_num=1, name="First Set", num_in_league=0)
+    )
+    clean_db.session.add(
+        card_set.LeagueInfo(
+            id=card_set.LEAGUE_INFO_ID,
+            article_url="old_url",
+            fetched_at=datetime.datetime(2020, 1, 1),
+        )
+    )
+    clean_db.session.commit()
+    old_version = card_set.get_league_info_version()
+
+    def get_set_names(*args):
+        raise AssertionError("The set names should not be read.")
+
+    monkeypatch.setattr(
+        card_set.browsers, "get_texts_from_url_and_selector", get_set_names
+    )
+    monkeypatch.setattr(
+        card_set.dwd_news, "get_most_recent_league_article_url", lambda: "new_url"
+    )
+    monkeypatch.setattr(
+        card_set.dwd_news,
+        "get_league_article_packs_text",
+        lambda url: ["Packs: 3x First Set", "2x Other Set"],
+    )
+
+    card_set.update(league_only=True)
+
+    assert card_set.CardSetName.query.get(1).num_in_league == 3
+    assert card_set.get_league_article_url() == "new_url"
+    assert card_set.get_league_info_version() > old_version
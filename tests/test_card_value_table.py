@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+import infiltrate.card_frame_bases as card_frame_bases
+import infiltrate.card_value_table as card_value_table
+import infiltrate.models.card as card
+import infiltrate.models.rarity as rarity
+
+
+def _make_card_details():
+    return card_frame_bases.CardDetails(
+        [
+            {
+                "set_num": 0,
+                "card_num": 0,
+                "rarity": rarity.COMMON.name,
+                "image_url": "image_url",
+                "details_url": "details_url",
+                "is_in_draft_pack": True,
+            },
+            {
+                "set_num": 0,
+                "card_num": 1,
+                "rarity": rarity.LEGENDARY.name,
+                "image_url": "image_url",
+                "details_url": "details_url",
+                "is_in_draft_pack": True,
+            },
+        ]
+    )
+
+
+def test_from_card_details_has_each_copy():
+    sut = card_value_table.CardValueTable.from_card_details(_make_card_details())
+
+    assert len(sut) == 8
+    assert list(sut["count_in_deck"]) == [1, 2, 3, 4] * 2
+    assert list(sut["card_num"]) == [0] * 4 + [1] * 4
+    assert list(sut["rarity_code"]) == [0] * 4 + [3] * 4
+
+
+def test_from_card_details_rejects_unknown_rarity():
+    card_details = _make_card_details()
+    card_details[card_details.RARITY_NAME] = [rarity.COMMON.name, "Mythic"]
+
+    with pytest.raises(ValueError, match="Mythic"):
+        card_value_table.CardValueTable.from_card_details(card_details)
+
+
+def test_from_card_details_shares_card_columns_until_cards_update(monkeypatch):
+    card_details = _make_card_details()
+    first = card_value_table.CardValueTable.from_card_details(card_details)
+    first["value"] = np.arange(8.0)
+
+    sut = card_value_table.CardValueTable.from_card_details(card_details)
+
+    assert "value" not in sut
+    assert sut["set_num"] is first["set_num"]
+    assert sut.card_index is first.card_index
+    with pytest.raises(ValueError):
+        sut["set_num"][0] = 1
+    monkeypatch.setattr(card, "_cards_version", card.get_cards_version() + 1)
+    updated = card_value_table.CardValueTable.from_card_details(card_details)
+    assert updated["set_num"] is not first["set_num"]
+
+
+def test_get_positions_marks_missing_copies():
+    sut = card_value_table.CardValueTable.from_card_details(_make_card_details())
+
+    positions = sut.get_positions(
+        set_nums=[0, 0, 0, 5], card_nums=[1, 0, 0, 0], counts_in_deck=[2, 4, 5, 1]
+    )
+
+    assert list(positions) == [5, 3, -1, -1]
+
+
+def test_sum_at_positions_adds_repeated_rows():
+    sut = card_value_table.CardValueTable.from_card_details(_make_card_details())
+
+    summed = sut.sum_at_positions(np.array([1, 1, -1, 6]), [2.0, 3.0, 10.0, 1.0])
+
+    assert list(summed) == [0, 5, 0, 0, 0, 0, 1, 0]
+
+
+def test_with_columns_shares_arrays():
+    table = card_value_table.CardValueTable.from_card_details(_make_card_details())
+    values = np.arange(8.0)
+
+    sut = table.with_columns({"value": values})
+
+    assert "value" in sut
+    assert "value" not in table
+    assert np.shares_memory(sut["set_num"], table["set_num"])
+
+
+def test_setting_column_of_wrong_length_raises():
+    sut = card_value_table.CardValueTable.from_card_details(_make_card_details())
+
+    with pytest.raises(ValueError):
+        sut["value"] = np.zeros(3)
+
+
+def test_to_dataframe_includes_details():
+    table = card_value_table.CardValueTable.from_card_details(_make_card_details())
+    table["value"] = np.arange(8.0)
+
+    sut = table.to_dataframe()
+
+    assert sut.index.names == ["set_num", "card_num", "count_in_deck"]
+    assert list(sut.loc[(0, 1, 2), ["rarity", "value"]]) == [rarity.LEGENDARY.name, 5]
@@ -0,0 +1,12 @@
+import infiltrate.models.card as card
+import infiltrate.models.user.collection as collection
+
+
+def test_get_collection_delta_from_import():
+    card_import = "\n".join(
+        ["4 Torch (Set1 #6)", "1 Fire Sigil (Set1 #1)", "2 Torch (Set1 #6)", "Junk"]
+    )
+
+    delta = collection.get_collection_delta_from_import(card_import)
+
+    assert delta == {card.CardId(1, 6): 6, card.CardId(1, 1): 1}
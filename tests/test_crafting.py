@@ -0,0 +1,79 @@
+import pandas as pd
+
+import infiltrate.card_evaluation as card_evaluation
+import infiltrate.crafting as crafting
+from infiltrate.models.user import User
+
+
+def _make_own_values(play_values, craft_costs, owned_counts, findabilities=None):
+    findabilities = findabilities or [0] * len(play_values)
+    rows = [
+        {
+            "set_num": 1,
+            "card_num": card_num,
+            "count_in_deck": count_in_deck,
+            "play_value": card_play_values[count_in_deck - 1],
+            "craft_cost": craft_cost,
+            "is_owned": count_in_deck <= owned_count,
+            "findability": findability,
+        }
+        for card_num, (card_play_values, craft_cost, owned_count, findability) in (
+            enumerate(zip(play_values, craft_costs, owned_counts, findabilities))
+        )
+        for count_in_deck in range(1, 5)
+    ]
+    df = pd.DataFrame(rows)
+    df["num_decks_with_count_or_less"] = 0
+    df["play_rate"] = 0
+    df["play_craft_efficiency"] = (
+        (1 - df["findability"]) * df["play_value"] / df["craft_cost"]
+    )
+    df["sell_cost"] = 0
+    df["resell_value"] = 0
+    df["own_value"] = df["play_value"]
+    return card_evaluation.OwnValueFrame(User(id=0, name=""), df)
+
+
+def test_plan_crafting_follows_copy_order_within_budget():
+    own_values = _make_own_values(
+        play_values=[[10, 10, 1, 100], [8, 8, 8, 8]],
+        craft_costs=[10, 10],
+        owned_counts=[0, 1],
+    )
+
+    sut = crafting.plan_crafting(own_values, budget=40)
+
+    assert sut.spent == 40
+    assert list(zip(sut.crafts["card_num"], sut.crafts["count_in_deck"])) == [
+        (0, 1),
+        (0, 2),
+        (0, 3),
+        (0, 4),
+    ]
+
+
+def test_plan_crafting_prefers_a_single_valuable_copy_over_efficient_scraps():
+    own_values = _make_own_values(
+        play_values=[[2, 0, 0, 0], [50, 0, 0, 0]],
+        craft_costs=[1, 100],
+        owned_counts=[0, 0],
+    )
+
+    sut = crafting.plan_crafting(own_values, budget=100)
+
+    assert list(sut.crafts["card_num"]) == [1]
+    assert sut.play_value == 50
+
+
+def test_plan_crafting_ranks_by_play_craft_efficiency():
+    own_values = _make_own_values(
+        play_values=[[10, 0, 0, 0], [9, 0, 0, 0]],
+        craft_costs=[10, 10],
+        owned_counts=[0, 0],
+        findabilities=[0.9, 0],
+    )
+
+    sut = crafting.plan_crafting(own_values, budget=10)
+
+    assert list(sut.crafts["card_num"]) == [1]
+    assert sut.play_value == 9
@@ -1,5 +1,307 @@
-# from unittest import TestCase
-#
-#
-# class TestDeck(TestCase):
-#     pass
+import datetime
+import threading
+import types
+
+import sqlalchemy
+
+import infiltrate.models.card as card
+import infiltrate.models.deck as deck
+
+
+def _make_page_json(deck_id: str):
+    return {
+        "deck_id": deck_id,
+        "archetype": "Aggro Control",
+        "deck_type": "Standard",
+        "date_added_full": "2020-01-01T10:00:00.123",
+        "date_updated_full": "2020-01-02T10:00:00.123",
+        "description": "Description",
+        "patch": "1.0",
+        "username": "user",
+        "views": 3,
+        "rating": 2,
+        "deck_cards": [
+            {"set_number": 1, "eternal_id": 1, "count": 4},
+            {"set_number": 9, "eternal_id": 9, "count": 4},
+        ],
+        "sideboard_cards": [{"set_number": 1, "eternal_id": 2, "count": 1}],
+        "market_cards": [{"set_number": 1, "eternal_id": 1, "count": 1}],
+    }
+
+
+def _set_known_cards(monkeypatch):
+    known_cards = {card.CardId(1, 1), card.CardId(1, 2)}
+    monkeypatch.setattr(
+        deck.global_data,
+        "all_cards",
+        types.SimpleNamespace(card_exists=lambda card_id: card_id in known_cards),
+    )
+
+
+def test_parse_deck_details(monkeypatch):
+    _set_known_cards(monkeypatch)
+    page_json = _make_page_json("deck")
+
+    sut = deck.parse_deck_details(page_json)
+
+    assert sut.deck["id"] == "deck"
+    assert sut.deck["archetype"] == deck.Archetype.aggro_control
+    assert sut.deck["deck_type"] == deck.DeckType.standard
+    assert sut.deck["date_added"].day == 1
+    assert sorted(
+        (row["set_num"], row["card_num"], row["num_played"]) for row in sut.cards
+    ) == [(1, 1, 1), (1, 2, 1)]
+
+
+def test_deck_ingestion_record_failure_backs_off_then_gives_up():
+    now = datetime.datetime(2020, 1, 1)
+    sut = deck.DeckIngestion.make_pending("deck", scan_id=1, now=now)
+
+    sut.record_failure(ConnectionError("down"), now)
+    first_delay = sut.next_attempt_at - now
+    sut.record_failure(ConnectionError("down"), now)
+
+    assert sut.status == deck.IngestionStatus.pending
+    assert sut.next_attempt_at - now == 2 * first_delay
+    for _ in range(deck.MAX_FETCH_ATTEMPTS - 2):
+        sut.record_failure(ConnectionError("down"), now)
+    assert sut.status == deck.IngestionStatus.failed
+    assert sut.attempts == deck.MAX_FETCH_ATTEMPTS
+    assert deck.get_retry_delay(20) == deck.MAX_RETRY_DELAY
+
+
+def test_update_decks_retries_failed_fetch_and_saves_the_rest(clean_db, monkeypatch):
+    _set_known_cards(monkeypatch)
+    scan = deck.DeckListingScan.start()
+    now = datetime.datetime.utcnow()
+    deck_ids = ["first", "failing", "second", "malformed", "third"]
+    for deck_id in deck_ids:
+        clean_db.session.add(deck.DeckIngestion.make_pending(deck_id, scan.id, now))
+    clean_db.session.commit()
+
+    def get_json_from_url(url: str):
+        deck_id = url.split("deck_id=")[-1]
+        if deck_id == "failing":
+            raise ConnectionError(f"Got no content from {url}")
+        page_json = _make_page_json(deck_id)
+        if deck_id == "malformed":
+            page_json["deck_cards"] = None
+        return page_json
+
+    monkeypatch.setattr(deck.browsers, "get_json_from_url", get_json_from_url)
+    monkeypatch.setattr(
+        deck,
+        "_WarcryNewIdGetter",
+        lambda: types.SimpleNamespace(journal_new_ids=lambda max_decks: None),
+    )
+    monkeypatch.setattr(deck, "FETCHES_PER_SECOND", 1_000)
+    monkeypatch.setattr(deck, "COMMIT_BATCH_SIZE", 2)
+
+    deck.update_decks()
+
+    assert sorted(saved.id for saved in deck.Deck.query.all()) == [
+        "first",
+        "second",
+        "third",
+    ]
+    failed = deck.DeckIngestion.query.get("failing")
+    assert failed.status == deck.IngestionStatus.pending
+    assert failed.attempts == 1
+    assert failed.next_attempt_at > now
+    assert "ConnectionError" in failed.last_error
+    malformed = deck.DeckIngestion.query.get("malformed")
+    assert malformed.status == deck.IngestionStatus.pending
+    assert malformed.attempts == 1
+    assert "TypeError" in malformed.last_error
+    assert deck.get_due_ingestions() == []
+    assert {
+        ingestion.deck_id
+        for ingestion in deck.DeckIngestion.query.filter_by(
+            status=deck.IngestionStatus.fetched
+        )
+    } == {"first", "second", "third"}
+
+
+def _set_listing(monkeypatch, ids_by_page):
+    """Serves the ids of each listing page, recording the pages requested."""
+    requested_pages = []
+
+    def get_ids_from_page(self, page: int):
+        requested_pages.append(page)
+        return list(ids_by_page.get(page, []))
+
+    monkeypatch.setattr(deck._WarcryNewIdGetter, "get_ids_from_page", get_ids_from_page)
+    return requested_pages
+
+
+def _get_journaled_ids(scan):
+    return {
+        ingestion.deck_id
+        for ingestion in deck.DeckIngestion.query.filter_by(scan_id=scan.id)
+    }
+
+
+def test_journal_page_stops_at_saved_deck(clean_db):
+    clean_db.session.add(deck.Deck(id="saved"))
+    scan = deck.DeckListingScan.start()
+
+    is_at_known_id = deck._WarcryNewIdGetter.journal_page(
+        scan, ["new", "saved", "older"]
+    )
+    clean_db.session.commit()
+
+    assert is_at_known_id
+    assert _get_journaled_ids(scan) == {"new"}
+
+
+def test_journal_page_stops_at_id_of_other_scan(clean_db):
+    other_scan = deck.DeckListingScan.start()
+    clean_db.session.add(
+        deck.DeckIngestion.make_pending(
+            "other", other_scan.id, datetime.datetime(2020, 1, 1)
+        )
+    )
+    scan = deck.DeckListingScan.start()
+
+    is_at_known_id = deck._WarcryNewIdGetter.journal_page(
+        scan, ["new", "other", "older"]
+    )
+    clean_db.session.commit()
+
+    assert is_at_known_id
+    assert _get_journaled_ids(scan) == {"new"}
+    assert _get_journaled_ids(other_scan) == {"other"}
+
+
+def test_journal_page_passes_over_ids_of_same_scan(clean_db):
+    scan = deck.DeckListingScan.start()
+    deck._WarcryNewIdGetter.journal_page(scan, ["first", "second"])
+
+    # A deck added during the scan shifts second onto the next page.
+    is_at_known_id = deck._WarcryNewIdGetter.journal_page(scan, ["second", "third"])
+    clean_db.session.commit()
+
+    assert not is_at_known_id
+    assert _get_journaled_ids(scan) == {"first", "second", "third"}
+    assert deck.DeckIngestion.query.count() == 3
+
+
+def test_journal_new_ids_resumes_unfinished_scan(clean_db, monkeypatch):
+    clean_db.session.add(deck.Deck(id="saved"))
+    unfinished_scan = deck.DeckListingScan.start()
+    unfinished_scan.next_page = 2
+    clean_db.session.commit()
+    requested_pages = _set_listing(
+        monkeypatch,
+        {0: ["newest"], 1: ["old1"], 2: ["old2"], 3: ["old3", "saved"]},
+    )
+
+    deck._WarcryNewIdGetter().journal_new_ids(prefetch=False)
+
+    assert unfinished_scan.is_complete
+    assert unfinished_scan.next_page == 4
+    assert _get_journaled_ids(unfinished_scan) == {"old2", "old3"}
+    new_scan = deck.DeckListingScan.query.filter(
+        deck.DeckListingScan.id != unfinished_scan.id
+    ).one()
+    assert new_scan.is_complete
+    assert _get_journaled_ids(new_scan) == {"newest", "old1"}
+    assert requested_pages == [2, 3, 0, 1, 2]
+
+
+def test_journal_new_ids_leaves_scan_stopped_at_max_decks_unfinished(
+    clean_db, monkeypatch
+):
+    monkeypatch.setattr(deck._WarcryNewIdGetter, "ITEMS_PER_PAGE", 1)
+    _set_listing(monkeypatch, {page: [f"deck{page}"] for page in range(5)})
+
+    deck._WarcryNewIdGetter().journal_new_ids(max_decks=2, prefetch=False)
+
+    scan = deck.DeckListingScan.query.one()
+    assert not scan.is_complete
+    assert _get_journaled_ids(scan) == {"deck0", "deck1"}
+
+    deck._WarcryNewIdGetter().journal_new_ids(max_decks=10, prefetch=False)
+
+    assert scan.is_complete
+    assert _get_journaled_ids(scan) == {f"deck{page}" for page in range(5)}
+    assert deck.DeckIngestion.query.count() == 5
+
+
+def test_prune_ingestion_journal_forgets_old_finished_entries(clean_db):
+    old = datetime.datetime.utcnow() - deck.JOURNAL_RETENTION * 2
+    recent = datetime.datetime.utcnow()
+    old_scan = deck.DeckListingScan(started_at=old, next_page=1, is_complete=True)
+    pruned_scan = deck.DeckListingScan(started_at=old, next_page=1, is_complete=True)
+    clean_db.session.add_all([old_scan, pruned_scan])
+    clean_db.session.commit()
+    old_fetched = deck.DeckIngestion.make_pending("old_fetched", pruned_scan.id, old)
+    old_fetched.record_fetched()
+    old_pending = deck.DeckIngestion.make_pending("old_pending", old_scan.id, old)
+    recent_fetched = deck.DeckIngestion.make_pending(
+        "recent_fetched", old_scan.id, recent
+    )
+    recent_fetched.record_fetched()
+    clean_db.session.add_all([old_fetched, old_pending, recent_fetched])
+    clean_db.session.commit()
+
+    deck.prune_ingestion_journal()
+
+    assert {ingestion.deck_id for ingestion in deck.DeckIngestion.query} == {
+        "old_pending",
+        "recent_fetched",
+    }
+    assert [scan.id for scan in deck.DeckListingScan.query] == [old_scan.id]
+
+
+def test_journal_new_ids_prefetches_and_stops_at_known_page(clean_db, monkeypatch):
+    clean_db.session.add(deck.Deck(id="saved"))
+    clean_db.session.commit()
+    ids_by_page = {0: ["new1", "new2"], 1: ["new3", "saved"], 2: ["older"]}
+    is_requested = {page: threading.Event() for page in range(4)}
+
+    def get_json_from_url(url: str):
+        starting = int(url.split("starting=")[1].split("&")[0])
+        page = starting // deck._WarcryNewIdGetter.ITEMS_PER_PAGE
+        is_requested[page].set()
+        ids = ids_by_page.get(page, [])
+        return {"decks": [{"deck_id": deck_id} for deck_id in ids]}
+
+    monkeypatch.setattr(deck.browsers, "get_json_from_url", get_json_from_url)
+
+    checked_pages = []
+    selects_per_page = []
+    journal_page = deck._WarcryNewIdGetter.journal_page
+
+    def check_page(scan, ids):
+        page = len(checked_pages)
+        checked_pages.append(page)
+        assert is_requested[page + 1].wait(timeout=5), "next page not prefetched"
+        selects = []
+
+        def count_select(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("SELECT"):
+                selects.append(statement)
+
+        sqlalchemy.event.listen(clean_db.engine, "before_cursor_execute", count_select)
+        try:
+            is_at_known_id = journal_page(scan, ids)
+        finally:
+            sqlalchemy.event.remove(
+                clean_db.engine, "before_cursor_execute", count_select
+            )
+        selects_per_page.append(len(selects))
+        return is_at_known_id
+
+    monkeypatch.setattr(
+        deck._WarcryNewIdGetter, "journal_page", staticmethod(check_page)
+    )
+
+    deck._WarcryNewIdGetter().journal_new_ids()
+
+    scan = deck.DeckListingScan.query.one()
+    assert scan.is_complete
+    assert _get_journaled_ids(scan) == {"new1", "new2", "new3"}
+    assert checked_pages == [0, 1]
+    assert selects_per_page == [1, 1]
+    assert not is_requested[3].is_set()
@@ -1,6 +1,8 @@
 import pandas as pd
 
+import infiltrate.card_frame_bases as card_frame_bases
 import infiltrate.models.card as card
+import infiltrate.models.card.pool_size as pool_size
 import infiltrate.models.rarity as rarity
 import pytest
 
@@ -12,7 +14,7 @@ def all_cards():
             "set_num": [0, 0, 0],
             "card_num": [0, 1, 2],
             "name": ["0", "1", "2"],
-            "rarity": [rarity.COMMON, rarity.UNCOMMON, rarity.RARE,],
+            "rarity": [rarity.COMMON.name, rarity.UNCOMMON.name, rarity.RARE.name,],
             "image_url": [
                 "https://cards.eternalwarcry.com/cards/full/Kaleb's_Favor.png",
                 "https://cards.eternalwarcry.com/cards/full/Blazing_Renegade.png",
@@ -26,10 +28,31 @@ def all_cards():
             "is_in_draft_pack": [0, 0, 1],
         }
     )
-    return card.CardData(mock_all_cards_df)
+    return card_frame_bases.CardDetails(mock_all_cards_df)
 
 
 def test_card_exists(all_cards):
     assert all_cards.card_exists(card_id=card.CardId(0, 0))
     assert not all_cards.card_exists(card_id=card.CardId(1, 0))
     assert not all_cards.card_exists(card_id=card.CardId(0, 3))
+
+
+def test_get_card_row(all_cards):
+    assert all_cards.get_card_row(card.CardId(0, 2))["name"] == "2"
+    assert all_cards.get_card_row(card.CardId(1, 2)) is None
+
+
+def test_card_pool_sizes():
+    sut = pool_size.CardPoolSizes(
+        by_set_and_rarity={
+            (1, rarity.COMMON.name): 3,
+            (2, rarity.COMMON.name): 4,
+            (2, rarity.RARE.name): 1,
+        },
+        by_draft_pack_rarity={rarity.COMMON.name: 2},
+    )
+
+    assert sut.get_num_cards([1, 2], rarity.COMMON) == 7
+    assert sut.get_num_cards([1, 3], rarity.RARE) == 0
+    assert sut.get_num_draft_pack_cards(rarity.COMMON) == 2
+    assert sut.get_num_draft_pack_cards(rarity.RARE) == 0
@@ -0,0 +1,86 @@
+import tracemalloc
+
+import pytest
+
+import infiltrate.pipeline_stats as pipeline_stats
+
+
+@pytest.fixture(autouse=True)
+def clear_stats():
+    pipeline_stats.clear()
+    yield
+    pipeline_stats.clear()
+
+
+def test_stage_records_time_and_rows():
+    for rows in [10, 20, 30]:
+        with pipeline_stats.stage("test_stage") as stage:
+            stage.rows = rows
+
+    summary = pipeline_stats.get_summary()["test_stage"]
+
+    assert summary["count"] == 3
+    assert summary["rows"]["p50"] == 20
+    assert summary["seconds"]["p99"] >= 0
+
+
+def test_stage_records_run_when_raising():
+    with pytest.raises(ValueError):
+        with pipeline_stats.stage("failing_stage"):
+            raise ValueError
+
+    assert pipeline_stats.get_summary()["failing_stage"]["count"] == 1
+
+
+def test_nested_stages_are_recorded_separately():
+    with pipeline_stats.stage("outer"):
+        with pipeline_stats.stage("inner"):
+            pass
+
+    summary = pipeline_stats.get_summary()
+
+    assert summary["outer"]["count"] == 1
+    assert summary["inner"]["count"] == 1
+    assert summary["inner"]["rows"] is None
+
+
+@pytest.fixture
+def tracking_memory(monkeypatch):
+    monkeypatch.setattr(pipeline_stats, "TRACK_MEMORY", True)
+    yield
+    tracemalloc.stop()
+
+
+def test_stage_records_peak_allocation(tracking_memory):
+    if not hasattr(tracemalloc, "reset_peak"):
+        pytest.skip("tracemalloc.reset_peak is new in Python 3.9")
+
+    with pipeline_stats.stage("outer") as outer:
+        with pipeline_stats.stage("inner") as inner:
+            allocation = bytearray(1_000_000)
+            del allocation
+        with pipeline_stats.stage("small") as small:
+            pass
+
+    assert inner.peak_bytes >= 1_000_000
+    assert small.peak_bytes < 1_000_000
+    assert outer.peak_bytes >= inner.peak_bytes
+
+
+def test_stage_records_peak_allocation_without_reset_peak(
+    tracking_memory, monkeypatch
+):
+    monkeypatch.delattr(tracemalloc, "reset_peak", raising=False)
+    tracemalloc.start()
+    earlier_allocation = bytearray(4_000_000)
+    del earlier_allocation
+
+    with pipeline_stats.stage("outer") as outer:
+        with pipeline_stats.stage("inner") as inner:
+            allocation = bytearray(1_000_000)
+            del allocation
+
+    assert 1_000_000 <= inner.peak_bytes < 2_000_000
+    assert outer.peak_bytes >= inner.peak_bytes
+    summary = pipeline_stats.get_summary()["outer"]
+    assert summary["peak_bytes"]["p50"] == outer.peak_bytes
@@ -0,0 +1,74 @@
+import types
+
+import pandas as pd
+import pytest
+
+import infiltrate.models.deck_search as deck_search
+import infiltrate.models.user.reward_profile as reward_profile
+import infiltrate.rewards as rewards
+import infiltrate.views.purchases_view as purchases_view
+from infiltrate.models.user import User
+
+
+@pytest.fixture
+def purchase_values_calls(monkeypatch):
+    """Counts the purchase value calculations, without any cards."""
+    calls = []
+
+    def get_purchase_values(user, own_values):
+        calls.append(user)
+        return pd.DataFrame({"value": [1.0]})
+
+    monkeypatch.setattr(
+        purchases_view.purchases, "get_purchase_values", get_purchase_values
+    )
+    monkeypatch.setattr(
+        purchases_view.card_displays.CardDisplays,
+        "make_own_value_frame_for_user",
+        classmethod(
+            lambda cls, user: types.SimpleNamespace(
+                get_collection_hash=lambda: "collection"
+            )
+        ),
+    )
+    monkeypatch.setattr(
+        purchases_view.card_displays.CardDisplays,
+        "get_data_version",
+        staticmethod(lambda: (1, 1)),
+    )
+    monkeypatch.setattr(
+        rewards,
+        "get_player_rewards",
+        lambda **rates: types.SimpleNamespace(content_key=tuple(rates.values())),
+    )
+    monkeypatch.setattr(purchases_view, "_purchase_values_cache", {})
+    return calls
+
+
+def test_purchase_values_are_recalculated_for_new_reward_profile_and_weights(
+    clean_db, purchase_values_calls
+):
+    user = User(id=1, name="")
+    clean_db.session.add(user)
+    clean_db.session.add(deck_search.DeckSearch(id=1, maximum_age_days=10))
+    clean_db.session.add(deck_search.DeckSearch(id=2, maximum_age_days=10))
+    clean_db.session.commit()
+
+    purchases_view.get_purchase_values_for_user(user)
+    purchases_view.get_purchase_values_for_user(user)
+    assert len(purchase_values_calls) == 1
+
+    reward_profile.set_for_user(
+        user,
+        first_wins_per_week=7,
+        drafts_per_week=1,
+        ranked_wins_per_day=2,
+        unranked_wins_per_day=0,
+    )
+    purchases_view.get_purchase_values_for_user(user)
+    assert len(purchase_values_calls) == 2
+
+    deck_search.set_weights_for_user(user, {1: 1, 2: 3})
+    purchases_view.get_purchase_values_for_user(user)
+    purchases_view.get_purchase_values_for_user(user)
+    assert len(purchase_values_calls) == 3
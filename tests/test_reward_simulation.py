@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import infiltrate.models.card_set as card_set
+import infiltrate.models.rarity as rarity
+import infiltrate.reward_simulation as reward_simulation
+import infiltrate.rewards as rewards
+
+
+def _make_card_data():
+    return pd.DataFrame(
+        {
+            "set_num": [1] * 8,
+            "card_num": [1] * 4 + [2] * 4,
+            "count_in_deck": [1, 2, 3, 4] * 2,
+            "rarity": [rarity.COMMON.name] * 4 + [rarity.RARE.name] * 4,
+            "is_in_draft_pack": [False] * 8,
+            "is_owned": [True, False, False, False] + [True] * 4,
+            "own_value": [10, 8, 6, 4, 100, 100, 100, 100],
+            "resell_value": [1] * 4 + [50] * 4,
+        }
+    )
+
+
+def _make_reward(card_rarity, amount):
+    card_class = rewards.CardClass(card_rarity, sets=[card_set.CardSet(1)])
+    return rewards.Reward(
+        card_classes=[rewards.CardClassWithAmount(card_class, amount=amount)]
+    )
+
+
+def test_simulate_values_duplicates_as_further_copies():
+    sut = reward_simulation.RewardSimulator(_make_card_data())
+
+    result = sut.simulate(_make_reward(rarity.COMMON, 5), num_trials=10, seed=0)
+
+    assert np.allclose(result.values, 8 + 6 + 4 + 1 + 1)
+
+
+def test_simulate_fractional_amount_is_a_chance_of_a_drop():
+    sut = reward_simulation.RewardSimulator(_make_card_data())
+
+    result = sut.simulate(_make_reward(rarity.RARE, 0.25), num_trials=20000, seed=0)
+
+    assert set(np.unique(result.values)) == {0, 50}
+    assert result.mean == pytest.approx(0.25 * 50, rel=0.05)
+
+
+def test_simulate_is_reproducible_with_a_seed():
+    sut = reward_simulation.RewardSimulator(_make_card_data())
+    reward = _make_reward(rarity.RARE, 0.5)
+
+    first = sut.simulate(reward, num_trials=1000, seed=3)
+    second = sut.simulate(reward, num_trials=1000, seed=3)
+
+    assert np.array_equal(first.values, second.values)
@@ -1,6 +1,126 @@
-import rewards
+import types
 
+import numpy as np
+import pandas as pd
+import pytest
 
-def test_something():
-    rewards.DRAFT_PACK.get_value()
-    assert True
+import infiltrate.models.card as card
+import infiltrate.models.card_set as card_set
+import infiltrate.models.rarity as rarity
+import infiltrate.rewards as rewards
+
+
+def _card_class_with_amount_per_week(card_rarity, set_nums, chance):
+    card_class = types.SimpleNamespace(
+        rarity=card_rarity, sets=[card_set.CardSet(set_num) for set_num in set_nums]
+    )
+    return types.SimpleNamespace(
+        card_class=card_class, chance_of_specific_card_drop_per_week=chance
+    )
+
+
+def test_findability_table():
+    sut = rewards.FindabilityTable(
+        [
+            _card_class_with_amount_per_week(rarity.COMMON, [1, 2], 0.5),
+            _card_class_with_amount_per_week(rarity.COMMON, [2], 0.5),
+            _card_class_with_amount_per_week(rarity.RARE, [2], 0.1),
+        ]
+    )
+
+    common = rarity.RARITIES.index(rarity.COMMON)
+    rare = rarity.RARITIES.index(rarity.RARE)
+    findabilities = sut.get(
+        rarity_indices=np.array([common, common, common, rare, rare, common]),
+        set_nums=np.array([0, 1, 2, 2, 1, 1001]),
+    )
+
+    assert np.allclose(findabilities, [0.5, 0.5, 0.75, 0.1, 0, 0])
+
+
+def test_get_player_rewards_shares_equal_profiles():
+    first = rewards.get_player_rewards(7, 1, 2, 0)
+    second = rewards.get_player_rewards(
+        first_wins_per_week=7.0,
+        drafts_per_week=1.0,
+        ranked_wins_per_day=2.0,
+        unranked_wins_per_day=0.0,
+    )
+
+    assert first is second
+    assert rewards.get_player_rewards(7, 1, 3, 0) is not first
+
+
+def _make_card_data():
+    return pd.DataFrame(
+        {
+            "set_num": [1] * 8 + [2] * 4,
+            "card_num": [1] * 4 + [2] * 4 + [1] * 4,
+            "count_in_deck": [1, 2, 3, 4] * 3,
+            "rarity": [rarity.COMMON.name] * 8 + [rarity.RARE.name] * 4,
+            "is_in_draft_pack": [True] * 4 + [False] * 4 + [True] * 4,
+            "is_owned": [True, False, False, False] + [True] * 4 + [False] * 4,
+            "own_value": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12],
+            "resell_value": [0.5] * 12,
+        }
+    )
+
+
+def test_draft_pack_value_is_sum_of_draft_pool_drops():
+    card_data = _make_card_data()
+
+    # The next unowned common in draft packs is worth 2, the only rare 9,
+    # and the draft pools of other rarities are empty.
+    assert rewards.DRAFT_PACK.get_value(card_data) == pytest.approx(2 + 9)
+
+
+def test_findability_table_is_rebuilt_after_cards_update(monkeypatch):
+    monkeypatch.setattr(rewards, "FindabilityTable", lambda *args: object())
+    sut = rewards.PlayerRewards(7, 1, 2, 0)
+
+    table = sut.findability_table
+
+    assert sut.findability_table is table
+    monkeypatch.setattr(card, "_cards_version", card.get_cards_version() + 1)
+    assert sut.findability_table is not table
+
+
+def test_reward_value_index():
+    card_data = _make_card_data()
+
+    sut = rewards.get_reward_value_index(card_data)
+
+    assert rewards.get_reward_value_index(card_data) is sut
+    assert sut.get_value_for_set_and_rarity(
+        card_set.CardSet(1), rarity.COMMON
+    ) == pytest.approx((2 + 0.5) / 2)
+    assert sut.get_value_for_set_and_rarity(card_set.CardSet(2), rarity.COMMON) == 0
+    assert sut.get_value_for_draft_pack_rarity(rarity.RARE) == pytest.approx(9)
+
+
+def test_reward_matrix_values_rewards_like_get_value():
+    card_data = _make_card_data()
+    sets = [card_set.CardSet(1), card_set.CardSet(2)]
+    first = rewards.Reward(
+        card_classes=[
+            rewards.CardClassWithAmount(rewards.CardClass(rarity.COMMON, sets), 3),
+            rewards.CardClass(rarity.RARE, sets, is_premium=True),
+        ]
+    )
+    second = rewards.Reward(
+        card_classes=[
+            rewards.CardClassWithAmount(rewards.DraftPackCardClass(rarity.RARE))
+        ]
+    )
+
+    sut = rewards.RewardMatrix(
+        [first.slot_weights, rewards.get_slot_weights([(first, 2), (second, 0.5)])]
+    )
+
+    assert np.allclose(
+        sut.get_values(card_data),
+        [
+            first.get_value(card_data),
+            2 * first.get_value(card_data) + 0.5 * second.get_value(card_data),
+        ],
+    )
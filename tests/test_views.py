@@ -0,0 +1,38 @@
+import pytest
+
+from infiltrate import application
+from infiltrate.models.user import User
+
+BASE_URL = "https://localhost"
+
+
+@pytest.fixture
+def client(clean_db):
+    clean_db.session.add(User(id=1, name=""))
+    clean_db.session.commit()
+    return application.test_client()
+
+
+@pytest.fixture
+def logged_in_client(client):
+    with client.session_transaction(base_url=BASE_URL) as session:
+        session["_user_id"] = "1"
+    return client
+
+
+@pytest.mark.parametrize(
+    "method, url", [("get", "/crafting-plan/?budget=10"), ("post", "/what-if/")]
+)
+def test_per_user_views_require_login(client, method, url):
+    response = getattr(client, method)(url, base_url=BASE_URL)
+
+    assert response.status_code == 302
+
+
+@pytest.mark.parametrize(
+    "body", ["[1]", "not json", '{"scenarios": 3}', '{"scenarios": [1]}']
+)
+def test_what_if_rejects_bodies_other_than_scenarios(logged_in_client, body):
+    response = logged_in_client.post("/what-if/", base_url=BASE_URL, data=body)
+
+    assert response.status_code == 400